@@ -1,196 +1,869 @@
+import hashlib
 import time
-import io
+from contextlib import contextmanager
+from dataclasses import asdict
+
 import streamlit as st
-import numpy_financial as npf
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+# Seuls l'instrumentation et le démarrage sont importés ici (bibliothèque standard) : NumPy, pandas, Plotly
+# et les modules du moteur sont importés par les fonctions qui s'en servent, la page d'accueil s'affiche sans eux
+from sci_previsionnel import instrumentation, nb_workers_defaut, prechauffer
 
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Prévisionnel SCI à l'IS", layout="wide")
 st.title("🏠 Simulation Financière SCI à l'IS")
 
+# Début de l'exécution du script, pour mesurer la latence perçue de chaque interaction
+debut_execution = time.perf_counter()
+
+# Diagnostics : les étapes ne sont relevées que si l'option est cochée (aucun surcoût sinon)
+diagnostics = st.session_state.get('diagnostics', False)
+releve = instrumentation.demarrer_releve() if diagnostics else instrumentation.arreter_releve()
+# Profilage de cette exécution, demandé depuis le panneau de diagnostics
+profileur = None
+if st.session_state.pop('profilage_demande', False):
+    profileur = instrumentation.Profileur(st.session_state.get('mode_profilage', 'cprofile')).demarrer()
+
+# Délai (s) sans nouvelle saisie au-delà duquel une série de modifications est considérée comme terminée
+DELAI_DEBOUNCE = 0.3
+
 # --- FONCTIONS ---
-@st.cache_data  # Ajout de mise en cache pour améliorer les performances
-def calculer_tableau_amortissement(montant, taux_annuel, duree_annees):
-    """Calcule un tableau d'amortissement complet pour le prêt"""
-    mensualite_credit = npf.pmt(taux_annuel/12, duree_annees*12, -montant)
-
-    # Utilisation de la compréhension de liste pour plus d'efficacité
-    tableau = []
-    reste_a_payer = montant
-
-    for mois in range(1, duree_annees*12 + 1):
-        interet_mois = reste_a_payer * (taux_annuel/12)
-        capital_mois = mensualite_credit - interet_mois
-        reste_a_payer -= capital_mois
-
-        tableau.append({
-            'Mois': mois,
-            'Mensualité': mensualite_credit,
-            'Intérêts': interet_mois,
-            'Capital': capital_mois,
-            'Capital Restant': max(0, reste_a_payer)
-        })
-
-    return pd.DataFrame(tableau)
-
-@st.cache_data  # Ajout de mise en cache pour améliorer les performances
-def calculs_financiers(params_f):
-    """Effectue les calculs financiers année par année"""
-    # Calcul du tableau d'amortissement
-    tableau_amort = calculer_tableau_amortissement(params_f['emprunt'], params_f['taux_credit'], params_f['duree_credit'])
-
-    # Préparation des calculs année par année
-    resultats = []
-    premiere_annee_is = None
-
-    # Calcul de la valeur du bâti (hors terrain) pour l'amortissement
-    valeur_bati = params_f['prix_achat'] * (1 - params_f.get('pourcentage_terrain', 0.2)) + params_f['travaux']
-    duree_amortissement = params_f.get('duree_amortissement', 20)
-
-    for an in range(1, params_f['duree_projection'] + 1):
-        # Loyers avec revalorisation
-        loyer_annuel = params_f['loyers_mensuels'] * 12 * ((1 + params_f['revalorisation_loyers']) ** (an - 1))
-
-        # Charges avec indexation
-        charges_annuelles = sum([
-            params_f['taxe_fonciere'],
-            params_f['assurance'],
-            params_f['frais_gestion'],
-            params_f['entretien'],
-            params_f['frais_comptable']
-        ]) * ((1 + params_f['indexation_charges']) ** (an - 1))
-
-        # Calcul des intérêts et du capital remboursé cette année
-        debut_mois = (an-1) * 12 + 1
-        fin_mois = an * 12
-        amort_annuel = tableau_amort[(tableau_amort['Mois'] >= debut_mois) & (tableau_amort['Mois'] <= fin_mois)]
-
-        interets_annuels = amort_annuel['Intérêts'].sum()
-        capital_rembourse_annuel = amort_annuel['Capital'].sum()
-        credit_annuel = amort_annuel['Mensualité'].sum() if not amort_annuel.empty else 0
-
-        # Calcul amortissement comptable (uniquement sur le bâti, pas le terrain)
-        if an <= duree_amortissement:  # Amortissement sur la durée définie
-            amortissement_annuel = valeur_bati / duree_amortissement
+# Mise en cache par le cache partagé du moteur (clés normalisées, LRU borné, niveau disque optionnel)
+def calculer_tableau_amortissement(montant, taux_annuel, duree_annees, **options):
+    """Calcule un tableau d'amortissement complet pour le prêt (options : différé, in fine, assurance...)"""
+    from sci_previsionnel.cache import echeancier_en_cache  # pylint: disable=import-outside-toplevel
+    return echeancier_en_cache(montant, taux_annuel, duree_annees, **options).to_dataframe()
+
+# Au-delà de SEUIL_WEBGL points, une série est tracée en WebGL et réduite à POINTS_MAX_GRAPHIQUE points
+SEUIL_WEBGL = 1000
+POINTS_MAX_GRAPHIQUE = 2000
+
+def reduire_serie(x, y, nb_points_max=POINTS_MAX_GRAPHIQUE):
+    """Réduit une série longue en gardant le minimum et le maximum de chaque paquet de points"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    if len(y) <= nb_points_max:
+        return x, y
+    nb_paquets = nb_points_max // 2
+    taille_paquet = -(-len(y) // nb_paquets)
+    paquets = np.pad(y, (0, nb_paquets * taille_paquet - len(y)), mode='edge').reshape(nb_paquets, taille_paquet)
+    debuts = np.arange(nb_paquets) * taille_paquet
+    indices = np.concatenate([debuts + paquets.argmin(axis=1), debuts + paquets.argmax(axis=1), [0, len(y) - 1]])
+    indices = np.unique(np.minimum(indices, len(y) - 1))
+    return x[indices], y[indices]
+
+def trace_serie(x, y, **options):
+    """Trace d'une série : Scatter pour les séries courtes, Scattergl réduit pour les séries longues"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    if len(y) <= SEUIL_WEBGL:
+        return go.Scatter(x=x, y=y, **options)
+    x, y = reduire_serie(x, y)
+    return go.Scattergl(x=x, y=y, **options)
+
+def empreinte_tableau(df):
+    """Empreinte du contenu d'un tableau de résultats, clé des rendus mis en cache"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    contenu = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+    return hashlib.blake2b(contenu + "|".join(map(str, df.columns)).encode('utf-8'), digest_size=20).hexdigest()
+
+def rendu_en_cache(nom, cle, construire):
+    """Artefact de rendu (figure...) mis en cache dans le cache partagé sous l'empreinte du résultat"""
+    from sci_previsionnel.cache import cache_defaut, empreinte  # pylint: disable=import-outside-toplevel
+    return cache_defaut().obtenir(empreinte(nom, cle), construire)
+
+def tableau_affichage(df):
+    """Tableau de résultats formaté pour l'affichage (215 000 €, 4.53), colonne par colonne"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    affichage = df.copy()
+    for col in df.columns:
+        if col == "Année":
+            continue
+        if "(%)" in col:
+            affichage[col] = np.char.mod("%.2f", df[col].to_numpy(dtype=float))
         else:
-            amortissement_annuel = 0
-
-        # Résultats
-        resultat_comptable = loyer_annuel - charges_annuelles - interets_annuels - amortissement_annuel
-        resultat_reel = loyer_annuel - charges_annuelles - interets_annuels
-
-        # Calcul IS progressif
-        impot_societe = 0
-        if resultat_comptable > 0:
-            # Mise à jour des seuils selon la législation française actuelle
-            if resultat_comptable <= 42500:
-                taux_is = 0.15
-            else:
-                # Différenciation des tranches
-                impot_societe = 42500 * 0.15  # 15% sur les premiers 42 500€
-                taux_is = 0.25  # 25% sur le reste
-                impot_societe += (resultat_comptable - 42500) * taux_is
-                taux_is = impot_societe / resultat_comptable  # Taux effectif moyen
-
-            # Si on n'a pas encore calculé l'IS par tranches
-            if impot_societe == 0:
-                impot_societe = resultat_comptable * taux_is
-
-        # Mémoriser la première année où l'IS est payé
-        if premiere_annee_is is None and impot_societe > 0:
-            premiere_annee_is = an
-
-        # Cashflow annuel
-        cashflow_annuel = loyer_annuel - charges_annuelles - credit_annuel - impot_societe
-
-        # Cumuls
-        if an == 1:
-            cashflow_cumule = cashflow_annuel
-            capital_rembourse_cumule = capital_rembourse_annuel
+            # Séparateur des milliers : espace inséré devant chaque groupe de trois chiffres
+            entiers = df[col].astype("int64").astype(str)
+            affichage[col] = entiers.str.replace(r"\B(?=(\d{3})+$)", " ", regex=True) + " €"
+    return affichage
+
+def figure_projection(df):
+    """Construit la figure 2×2 de projection détaillée (cashflow, patrimoine, rendements, année 1)"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    from plotly.subplots import make_subplots  # pylint: disable=import-outside-toplevel
+    # Configuration des graphiques principales (sans le camembert qui cause l'erreur)
+    fig1 = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=("Évolution du Cashflow", "Évolution de la Valeur Patrimoniale",
+                       "Rendement sur fonds propres", ""),
+        specs=[[{"secondary_y": True}, {"secondary_y": False}],
+              [{"secondary_y": False}, {"type": "domain"}]],  # type "domain" pour le camembert
+        vertical_spacing=0.12,
+        horizontal_spacing=0.08
+    )
+
+    # Graphique 1: Cashflow et rendement
+    fig1.add_trace(go.Bar(
+        x=df["Année"],
+        y=df["Cashflow annuel"],
+        name="Cashflow annuel (€)",
+        marker_color='indianred'
+    ), row=1, col=1)
+
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Cashflow cumulé"],
+        name="Cashflow cumulé (€)",
+        mode='lines+markers',
+        line=dict(color='firebrick', width=3)
+    ), row=1, col=1)
+
+    # Graphique 2: Valeur patrimoniale
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Valeur du bien"],
+        name="Valeur bien (€)",
+        mode='lines',
+        line=dict(color='royalblue')
+    ), row=1, col=2)
+
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Capital restant dû"],
+        name="Capital restant dû (€)",
+        mode='lines',
+        line=dict(color='indianred')
+    ), row=1, col=2)
+
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Valeur nette"],
+        name="Valeur nette (€)",
+        mode='lines',
+        line=dict(color='mediumseagreen')
+    ), row=1, col=2)
+
+    # Graphique 3: Rendement
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Rendement / fonds propres (%)"],
+        name="Rendement/fonds propres (%)",
+        mode='lines+markers',
+        line=dict(color='green', width=3)
+    ), row=2, col=1)
+
+    fig1.add_trace(trace_serie(
+        df["Année"],
+        df["Rendement brut (%)"],
+        name="Rendement brut (%)",
+        mode='lines+markers',
+        line=dict(color='darkgreen', width=2, dash='dot')
+    ), row=2, col=1)
+
+    # Graphique 4: Décomposition première année (camembert)
+    # Création d'un graphique de type 'pie' qui doit être dans un subplot de type 'domain'
+    labels = ["Intérêts", "Charges", "IS", "Cashflow"]
+    values = [
+        df.iloc[0]["dont Intérêts"],
+        df.iloc[0]["Charges annuelles"],
+        df.iloc[0]["IS annuel"],
+        df.iloc[0]["Cashflow annuel"]
+    ]
+
+    fig1.add_trace(go.Pie(
+        labels=labels,
+        values=values,
+        name="Décomposition Année 1",
+        hole=.4,
+        title="Décomposition des charges"
+    ), row=2, col=2)  # Cette case a le type "domain" approprié pour un camembert
+
+    # Mise en forme
+    fig1.update_layout(
+        height=800,
+        title_text="Projection Financière Détaillée",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        separators=', '
+    )
+
+    fig1.update_yaxes(title_text="Euros (€)", row=1, col=1)
+    fig1.update_yaxes(title_text="Euros (€)", row=1, col=2)
+    fig1.update_yaxes(title_text="Rendement (%)", row=2, col=1)
+    fig1.update_xaxes(title_text="Années", row=2, col=1)
+
+    return fig1
+
+def figure_monte_carlo(mc):
+    """Construit les éventails P5 / P50 / P95 du cashflow cumulé et de la valeur nette"""
+    from plotly.subplots import make_subplots  # pylint: disable=import-outside-toplevel
+    fig_mc = make_subplots(rows=1, cols=2, subplot_titles=("Cashflow cumulé (P5 / P50 / P95)",
+                                                           "Valeur nette (P5 / P50 / P95)"))
+    for col, serie, couleur in [(1, mc.cashflow_cumule, 'firebrick'), (2, mc.valeur_nette, 'mediumseagreen')]:
+        fig_mc.add_trace(trace_serie(mc.annees, serie[2], mode='lines', line=dict(width=0),
+                                     showlegend=False, hoverinfo='skip'), row=1, col=col)
+        fig_mc.add_trace(trace_serie(mc.annees, serie[0], mode='lines', line=dict(width=0),
+                                     fill='tonexty', fillcolor='rgba(128, 128, 128, 0.3)',
+                                     name="Intervalle P5-P95", showlegend=col == 1), row=1, col=col)
+        fig_mc.add_trace(trace_serie(mc.annees, serie[1], mode='lines', line=dict(color=couleur, width=3),
+                                     name="Médiane"), row=1, col=col)
+    fig_mc.update_layout(height=450, separators=', ')
+    fig_mc.update_xaxes(title_text="Années")
+    fig_mc.update_yaxes(title_text="Euros (€)")
+    return fig_mc
+
+def figure_grille(grille, indicateur, params):
+    """Carte de chaleur d'un indicateur sur la grille de sensibilité, avec le point de la simulation"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.sensibilite import INDICATEURS_SENSIBILITE  # pylint: disable=import-outside-toplevel
+    libelle_x, libelle_y = LIBELLES_PARAMETRES[grille.parametre_x], LIBELLES_PARAMETRES[grille.parametre_y]
+    en_pct = indicateur in ('tri', 'rendement_fonds_propres_moyen')
+    fig = go.Figure(go.Heatmap(
+        x=grille.valeurs_x, y=grille.valeurs_y, z=grille.indicateurs[indicateur],
+        colorscale='RdYlGn', zmid=0, colorbar=dict(title="%" if en_pct else "€"),
+        hovertemplate=f"{libelle_x} : %{{x:,.4~g}}<br>{libelle_y} : %{{y:,.4~g}}<br>"
+                      f"{INDICATEURS_SENSIBILITE[indicateur]} : %{{z:,.{2 if en_pct else 0}f}}<extra></extra>"
+    ))
+    fig.add_trace(go.Scatter(x=[params[grille.parametre_x]], y=[params[grille.parametre_y]], mode='markers',
+                             marker=dict(symbol='x', size=12, color='black'), name="Simulation", hoverinfo='skip'))
+    fig.update_layout(height=550, separators=', ', xaxis_title=libelle_x, yaxis_title=libelle_y,
+                      title=INDICATEURS_SENSIBILITE[indicateur], showlegend=False)
+    return fig
+
+def figure_tornade(tornade, choc):
+    """Diagramme en tornade : effet des chocs bas et haut de chaque paramètre autour de la référence"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.sensibilite import INDICATEURS_SENSIBILITE  # pylint: disable=import-outside-toplevel
+    tableau = tornade.to_dataframe().iloc[::-1]
+    libelles = [LIBELLES_PARAMETRES[cle] for cle in tableau["Paramètre"]]
+    fig = go.Figure()
+    for colonne, nom, couleur in [("Indicateur (choc bas)", f"-{choc:.0%}", 'indianred'),
+                                  ("Indicateur (choc haut)", f"+{choc:.0%}", 'seagreen')]:
+        fig.add_trace(go.Bar(y=libelles, x=tableau[colonne] - tornade.reference, base=tornade.reference,
+                             orientation='h', name=nom, marker_color=couleur,
+                             hovertemplate="%{y} : %{x:,.2f}<extra>" + nom + "</extra>"))
+    fig.add_vline(x=tornade.reference, line_dash='dash', line_color='gray')
+    fig.update_layout(barmode='overlay', height=max(350, 28 * len(libelles)), separators=', ',
+                      xaxis_title=INDICATEURS_SENSIBILITE[tornade.indicateur])
+    return fig
+
+def figure_sortie(sortie):
+    """Revenu net des associés (barres) et TRI des fonds propres (courbe) selon l'année de revente"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    from plotly.subplots import make_subplots  # pylint: disable=import-outside-toplevel
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=sortie.annees, y=sortie.revenu_associes[0], name="Revenu net des associés",
+                         marker_color='steelblue', hovertemplate="Année %{x} : %{y:,.0f} €<extra></extra>"))
+    fig.add_trace(trace_serie(sortie.annees, sortie.tri[0], mode='lines+markers', name="TRI (%)",
+                              line=dict(color='darkorange', width=3),
+                              hovertemplate="Année %{x} : %{y:.2f} %<extra></extra>"), secondary_y=True)
+    fig.update_layout(height=450, separators=', ', xaxis_title="Année de revente")
+    fig.update_yaxes(title_text="Euros (€)", secondary_y=False)
+    fig.update_yaxes(title_text="TRI (%)", secondary_y=True)
+    return fig
+
+def figure_comparaison(comparaison, libelle, noms):
+    """Courbes d'une colonne de la projection pour plusieurs scénarios enregistrés"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    fig = go.Figure()
+    for identifiant in comparaison.columns:
+        fig.add_trace(trace_serie(comparaison.index.to_numpy(), comparaison[identifiant].to_numpy(),
+                                  mode='lines', name=f"{identifiant} – {noms.get(identifiant) or 'sans nom'}"))
+    fig.update_layout(height=450, separators=', ', xaxis_title="Années", yaxis_title=libelle)
+    return fig
+
+def figure_financement(financement):
+    """Objectif de chaque structure faisable selon l'apport, avec le front de Pareto et la meilleure structure"""
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.financement import OBJECTIFS_FINANCEMENT  # pylint: disable=import-outside-toplevel
+    objectifs = getattr(financement, financement.objectif)
+    libelle = OBJECTIFS_FINANCEMENT[financement.objectif]
+    textes = [f"{duree} ans, {LIBELLES_TYPES_PRET[type_pret].lower()}, amortissement {amortissement} ans"
+              for duree, type_pret, amortissement in zip(financement.durees_credit, financement.types_pret,
+                                                         financement.durees_amortissement)]
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=financement.apports, y=objectifs, mode='markers', name="Structures faisables",
+                               marker=dict(color='lightgray', size=5), text=textes,
+                               hovertemplate="Apport : %{x:,.0f} €<br>%{y:,.2f}<br>%{text}<extra></extra>"))
+    front = financement.pareto
+    fig.add_trace(go.Scatter(x=financement.apports[front], y=objectifs[front], mode='lines+markers',
+                             name="Front de Pareto", line=dict(color='seagreen', width=3),
+                             text=[textes[i] for i in front],
+                             hovertemplate="Apport : %{x:,.0f} €<br>%{y:,.2f}<br>%{text}<extra></extra>"))
+    if financement.meilleure >= 0:
+        fig.add_trace(go.Scatter(x=[financement.apports[financement.meilleure]],
+                                 y=[objectifs[financement.meilleure]], mode='markers', name="Meilleure structure",
+                                 marker=dict(symbol='star', size=16, color='gold', line=dict(color='black', width=1)),
+                                 hoverinfo='skip'))
+    fig.update_layout(height=500, separators=', ', xaxis_title="Apport (€)", yaxis_title=libelle)
+    return fig
+
+def formatter_euros(valeur):
+    """Formate un nombre en euros"""
+    return f"{valeur:,.0f} €".replace(",", " ")
+
+def mensualite_pret(montant, taux_annuel, duree_annees):
+    """Mensualité constante d'un prêt amortissable, par formule fermée (sans NumPy, avant tout calcul)"""
+    nb_mois = duree_annees * 12
+    if nb_mois <= 0:
+        return float('nan')
+    if taux_annuel == 0:
+        return montant / nb_mois
+    taux_mensuel = taux_annuel / 12
+    return montant * taux_mensuel / (1 - (1 + taux_mensuel) ** -nb_mois)
+
+# Formats d'export proposés : (extension, type MIME)
+FORMATS_EXPORT = {
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Options de structure du prêt recopiées dans les paramètres exportés : libellé -> clé de params
+LIBELLES_OPTIONS_PRET = {
+    "Taux assurance": 'taux_assurance',
+    "Assurance sur": 'assurance_sur',
+    "In fine": 'in_fine',
+    "Différé (mois)": 'differe_mois',
+    "Type de différé": 'type_differe',
+    "Remboursement anticipé (mois)": 'mois_remboursement_anticipe',
+    "Montant remboursé par anticipation": 'montant_remboursement_anticipe',
+    "Après remboursement anticipé": 'mode_remboursement_anticipe',
+}
+
+# Paramètres proposés dans l'analyse de sensibilité : clé de params -> libellé
+LIBELLES_PARAMETRES = {
+    'prix_achat': "Prix d'achat",
+    'frais_notaire': "Frais de notaire",
+    'travaux': "Travaux",
+    'pourcentage_terrain': "Part du terrain",
+    'loyers_mensuels': "Loyers mensuels",
+    'revalorisation_loyers': "Revalorisation des loyers",
+    'appreciation_immobilier': "Appréciation immobilière",
+    'indexation_charges': "Indexation des charges",
+    'duree_amortissement': "Durée d'amortissement",
+    'apport': "Apport",
+    'taux_credit': "Taux crédit",
+    'duree_credit': "Durée crédit",
+    'taxe_fonciere': "Taxe foncière",
+    'assurance': "Assurance PNO",
+    'frais_gestion': "Frais de gestion",
+    'entretien': "Entretien/Divers",
+    'frais_comptable': "Frais de comptable",
+}
+# Colonnes de la projection proposées à la comparaison des scénarios enregistrés
+COLONNES_COMPARAISON = ('cashflow', 'cashflow_cumule', 'valeur_nette', 'capital_restant', 'impot')
+# Types de prêt proposés à l'optimisation du financement : clé -> libellé
+LIBELLES_TYPES_PRET = {'amortissable': "Amortissable", 'in_fine': "In fine"}
+POINTS_APPORT = [21, 51, 101, 201]
+# Étendue de la grille pour un paramètre nul (l'amplitude relative ne s'applique pas) : [0, valeur]
+ETENDUES_PARAMETRE_NUL = {'revalorisation_loyers': 0.05, 'appreciation_immobilier': 0.05, 'indexation_charges': 0.05,
+                          'pourcentage_terrain': 0.5, 'taux_credit': 0.05}
+ETENDUE_MONTANT_NUL = 20000
+RESOLUTIONS_GRILLE = [25, 50, 100, 200]
+
+def valeurs_grille(params, cle, amplitude, resolution):
+    """Valeurs d'un axe de la grille : ± amplitude autour de la valeur simulée"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    valeur = float(params[cle])
+    if valeur == 0:
+        return np.linspace(0.0, ETENDUES_PARAMETRE_NUL.get(cle, ETENDUE_MONTANT_NUL), resolution)
+    return np.linspace(valeur * (1 - amplitude), valeur * (1 + amplitude), resolution)
+
+def export_excel_with_inputs(results_df, input_params_excel, format_sortie="xlsx", echeancier=False):
+    """
+    Export results_df with an additional sheet containing input_params_excel (and optionally the monthly
+    loan schedule). The file is written in constant-memory mode to a temporary file, then read back.
+    CSV and Parquet exports only contain results_df.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.export import exporter_en_octets  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.pret import options_pret  # pylint: disable=import-outside-toplevel
+    # Flatten input parameters dictionary into a DataFrame
+    flat_params = []
+    for section, parametres in input_params_excel.items():
+        for key, value in parametres.items():
+            flat_params.append({"Section": section, "Paramètre": key, "Valeur": value})
+
+    tableaux = {"Prévisionnel": results_df, "Paramètres": pd.DataFrame(flat_params)}
+    if echeancier:
+        financement = input_params_excel["Financement"]
+        options = options_pret({cle: financement[libelle] for libelle, cle in LIBELLES_OPTIONS_PRET.items()})
+        tableaux["Échéancier mensuel"] = calculer_tableau_amortissement(
+            financement["Emprunt"], financement["Taux crédit"], financement["Durée crédit"], **options
+        )
+    return exporter_en_octets(tableaux, format_sortie)
+
+@contextmanager
+def chronometre(etape):
+    """Mesure une étape d'affichage quand les diagnostics sont actifs (relevé et st.session_state['latences'])"""
+    if not st.session_state.get('diagnostics'):
+        yield
+        return
+    debut = time.perf_counter()
+    try:
+        with instrumentation.etape(f"affichage.{etape}"):
+            yield
+    finally:
+        st.session_state.setdefault('latences', {})[etape] = (time.perf_counter() - debut) * 1000
+
+def demander_profilage():
+    """Rappel du bouton de profilage : la prochaine exécution du script sera profilée"""
+    st.session_state['profilage_demande'] = True
+
+def afficher_diagnostics(releve_execution, duree_totale):
+    """Affiche les durées par étape, l'état du cache et le profilage à la demande"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    with st.expander(f"🩺 Diagnostics : {duree_totale:.0f} ms"):
+        resume = releve_execution.resume() if releve_execution is not None else {}
+        if resume:
+            st.markdown("**Étapes de cette exécution**")
+            st.dataframe(pd.DataFrame({
+                "Étape": list(resume),
+                "Appels": [ligne["appels"] for ligne in resume.values()],
+                "Durée (ms)": [round(ligne["duree_ms"], 2) for ligne in resume.values()],
+            }), hide_index=True)
+        latences = st.session_state.get('latences', {})
+        if latences:
+            st.caption("Dernier affichage de chaque section (relances de fragments comprises) : " + ", ".join(
+                f"{etape} {duree:.0f} ms" for etape, duree in latences.items()))
+        pipeline_courant = st.session_state.get('pipeline')
+        if pipeline_courant is not None:
+            st.caption("Étapes recalculées : " + (", ".join(pipeline_courant.recalculees) or "aucune"))
+
+        statistiques = instrumentation.statistiques_cache()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Taux de succès du cache", f"{statistiques['taux_succes'] * 100:.0f}%")
+        col2.metric("Succès mémoire / disque", f"{statistiques['succes_memoire']} / {statistiques['succes_disque']}")
+        col3.metric("Échecs", statistiques['echecs'])
+        col4.metric("Entrées / évictions", f"{statistiques['entrees_memoire']} / {statistiques['evictions_memoire']}")
+
+        col1, col2 = st.columns([1, 2])
+        col1.selectbox("Profileur", ["cprofile", "echantillonnage"], key='mode_profilage',
+                       format_func=lambda mode: {"cprofile": "cProfile", "echantillonnage": "Échantillonnage"}[mode])
+        col2.button("🔬 Profiler la prochaine exécution", on_click=demander_profilage)
+        if 'rapport_profil' in st.session_state:
+            st.code(st.session_state['rapport_profil'], language=None)
+
+def saisie_en_cours(params):
+    """Indique si les paramètres sont en train d'être modifiés (plusieurs changements rapprochés)
+
+    Chaque changement de paramètres est daté ; tant que deux changements se
+    suivent à moins de DELAI_DEBOUNCE et que le dernier est récent, les
+    sections coûteuses ne sont pas recalculées.
+    """
+    from sci_previsionnel.cache import empreinte  # pylint: disable=import-outside-toplevel
+    etat = st.session_state
+    cle = empreinte('parametres', params)
+    maintenant = time.time()
+    if etat.get('cle_parametres') != cle:
+        etat['saisie_precedente'] = etat.get('derniere_saisie', 0.0)
+        etat['derniere_saisie'] = maintenant
+        etat['cle_parametres'] = cle
+    return (maintenant - etat['derniere_saisie'] < DELAI_DEBOUNCE
+            and etat['derniere_saisie'] - etat['saisie_precedente'] < DELAI_DEBOUNCE)
+
+def relancer_apres_saisie():
+    """Relance l'application une fois la saisie stabilisée (fragment exécuté périodiquement)"""
+    if time.time() - st.session_state['derniere_saisie'] >= DELAI_DEBOUNCE:
+        st.rerun()
+    st.caption("⏳ Saisie en cours : les tableaux et graphiques seront mis à jour dès la fin de la saisie")
+
+# --- AFFICHAGE DES RÉSULTATS ---
+# Chaque section lourde est un fragment : ses propres widgets ne relancent qu'elle, pas tout le script
+def afficher_tableau_de_bord(df, first_is, params):
+    """Affiche les métriques principales et l'alerte IS"""
+    # --- TABLEAU DE BORD ---
+    st.header("📊 Tableau de bord")
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    # Valeurs pour les métriques
+    valeur_finale = df.iloc[-1]['Valeur du bien']
+    cashflow_cumule_final = df.iloc[-1]['Cashflow cumulé']
+    valeur_nette_finale = df.iloc[-1]['Valeur nette']
+    cashflow_moyen = int(df['Cashflow annuel'].mean())
+    rendement_moyen = round(df['Rendement / fonds propres (%)'].mean(), 2)
+    rendement_brut_moyen = round(df['Rendement brut (%)'].mean(), 2)
+
+    # Affichage des métriques principales
+    col1.metric("💰 Cashflow cumulé", formatter_euros(cashflow_cumule_final),
+               f"{'+' if cashflow_moyen > 0 else ''}{formatter_euros(cashflow_moyen)}/an")
+
+    col2.metric("🏠 Valeur finale", formatter_euros(valeur_finale),
+               f"+{formatter_euros(valeur_finale - params['prix_achat'])}")
+
+    col3.metric("📈 Valeur nette", formatter_euros(valeur_nette_finale),
+               f"+{formatter_euros(valeur_nette_finale - params['apport'])}")
+
+    # Seconde ligne de métriques
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    col1.metric("💹 Rendement/fonds propres", f"{rendement_moyen}%")
+    col2.metric("📊 Rendement brut", f"{rendement_brut_moyen}%")
+    col3.metric("⏱️ Durée du crédit", f"{params['duree_credit']} ans")
+
+    # Alerte sur l'IS
+    if first_is:
+        st.warning(f"⚠️ IS à payer à partir de l'année {first_is}")
+    else:
+        st.success("✅ Pas d'IS à payer sur toute la durée de projection")
+
+
+@st.fragment
+def afficher_resultats_detailles(df):
+    """Affiche les tableaux de résultats par thème sur les années clés"""
+    with chronometre("tableaux"):
+        # --- RÉSULTATS DÉTAILLÉS --
+        st.header("📑 Résultats détaillés")
+
+        # Filtrer pour les années clés pour l'affichage principal
+        duree_projection = len(df)
+        annees_cles = [1, 5, 10, 15, 20, 25, 30]
+        if duree_projection not in annees_cles:
+            annees_cles.append(duree_projection)
+        annees_cles = sorted([a for a in annees_cles if a <= duree_projection])
+        # Widget interne au fragment : le changer ne relance que cette section
+        annees_cles = sorted(st.multiselect("Années affichées", list(range(1, duree_projection + 1)),
+                                            default=annees_cles)) or annees_cles
+        df_display = df[df['Année'].isin(annees_cles)].copy()
+
+        if len(annees_cles) > 1:
+            st.subheader(f"📊 Résultats sur {', '.join(map(str, annees_cles[:-1]))} et {annees_cles[-1]} ans")
         else:
-            previous = resultats[-1]
-            cashflow_cumule = previous['Cashflow cumulé'] + cashflow_annuel
-            capital_rembourse_cumule = previous['Capital remboursé cumulé'] + capital_rembourse_annuel
+            st.subheader(f"📊 Résultats sur {annees_cles[0]} an{'s' if annees_cles[0] > 1 else ''}")
 
-        # Valeur nette
-        valeur_patrimoine = params_f['prix_achat'] * ((1 + params_f['appreciation_immobilier']) ** (an - 1))
-        valeur_nette = valeur_patrimoine - (params_f['emprunt'] - capital_rembourse_cumule)
+        tab1, tab2, tab3, tab4 = st.tabs(["💰 Résultats financiers", "📝 Comptabilité", "🏦 Crédit", "🏠 Patrimoine"])
 
-        # Rendement sur fonds propres
-        rendement_fonds_propres = (cashflow_annuel / params_f['apport']) * 100 if params_f['apport'] > 0 else 0
-        rendement_brut = (loyer_annuel / params_f['prix_achat']) * 100
+        with tab1:
+            # Affichage des résultats financiers
+            cols_financiers = ["Année", "Loyers annuels", "Charges annuelles",
+                                "Mensualités crédit", "IS annuel",
+                              "Cashflow annuel", "Cashflow cumulé",
+                                "Rendement / fonds propres (%)",
+                                "Rendement brut (%)"]
 
-        # Capital restant à rembourser
-        capital_restant = params_f['emprunt'] - capital_rembourse_cumule
+            st.dataframe(tableau_affichage(df_display[cols_financiers]), use_container_width=True)
 
-        resultats.append({
-            # Informations générales
-            "Année": an,
+        with tab2:
+            # Affichage des informations comptables
+            cols_compta = ["Année", "Loyers annuels", "Charges annuelles", "dont Intérêts", "Amortissement annuel",
+                         "Résultat fiscal annuel", "IS annuel"]
 
-            # Revenus
-            "Loyers annuels": int(loyer_annuel),
+            st.dataframe(tableau_affichage(df_display[cols_compta]), use_container_width=True)
 
-            # Charges
-            "Charges annuelles": int(charges_annuelles),
+        with tab3:
+            # Affichage des informations crédit
+            cols_credit = ["Année", "Mensualités crédit", "dont Intérêts", "dont Capital",
+                         "Capital remboursé cumulé", "Capital restant dû"]
 
-            # Crédit
-            "Mensualités crédit": int(credit_annuel),
-            "dont Intérêts": int(interets_annuels),
-            "dont Capital": int(capital_rembourse_annuel),
-            "Capital remboursé cumulé": int(capital_rembourse_cumule),
-            "Capital restant dû": int(capital_restant),
+            st.dataframe(tableau_affichage(df_display[cols_credit]), use_container_width=True)
 
-            # Comptabilité
-            "Amortissement annuel": int(amortissement_annuel),
-            "Résultat fiscal annuel": int(resultat_comptable),
-            "IS annuel": int(impot_societe),
+        with tab4:
+            # Affichage des informations patrimoine
+            cols_patrimoine = ["Année", "Valeur du bien", "Capital restant dû", "Valeur nette"]
 
-            # Résultats financiers
-            "Résultat réel annuel": int(resultat_reel),
-            "Cashflow annuel": int(cashflow_annuel),
-            "Cashflow cumulé": int(cashflow_cumule),
+            st.dataframe(tableau_affichage(df_display[cols_patrimoine]), use_container_width=True)
 
-            # Patrimoine
-            "Valeur du bien": int(valeur_patrimoine),
-            "Valeur nette": int(valeur_nette),
-            "Rendement / fonds propres (%)": round(rendement_fonds_propres, 2),
-            "Rendement brut (%)": round(rendement_brut, 2)
-        })
 
-    return pd.DataFrame(resultats), premiere_annee_is
+@st.fragment
+def afficher_graphiques(df):
+    """Affiche le graphique de projection détaillée"""
+    with chronometre("graphiques"):
+        # --- GRAPHIQUES ---
+        st.header("📈 Graphiques")
 
-def formatter_euros(valeur):
-    """Formate un nombre en euros"""
-    return f"{valeur:,.0f} €".replace(",", " ")
+        # Figure reconstruite uniquement quand les résultats changent
+        fig1 = rendu_en_cache('figure_projection', empreinte_tableau(df), lambda: figure_projection(df))
+        st.plotly_chart(fig1, use_container_width=True)
 
-def export_excel_with_inputs(results_df, input_params_excel):
-    """
-    Export results_df to Excel with an additional sheet containing input_params_excel.
-    """
-    # Flatten input parameters dictionary into a DataFrame
-    flat_params = []
-    for section, parametres in input_params_excel.items():
-        for key, value in parametres.items():
-            flat_params.append({"Section": section, "Paramètre": key, "Valeur": value})
-    params_df = pd.DataFrame(flat_params)
 
-    # Prepare BytesIO stream
-    output = io.BytesIO()
+@st.fragment
+def afficher_risque(params_mc, config_mc, nb_workers):
+    """Affiche l'analyse de risque Monte Carlo (éventails de quantiles)"""
+    from sci_previsionnel.cache import cache_defaut, empreinte  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.parallele import executer_monte_carlo  # pylint: disable=import-outside-toplevel
+    with chronometre("monte_carlo"):
+        st.header("🎲 Analyse de risque (Monte Carlo)")
+
+        # Résultat mis en cache : une trajectoire Monte Carlo n'est recalculée que si ses entrées changent
+        cle_mc = empreinte('monte_carlo', [params_mc, asdict(config_mc)])
+        mc = cache_defaut().obtenir(cle_mc, lambda: executer_monte_carlo(params_mc, config_mc, nb_workers))
+
+        col1, col2, col3 = st.columns([1, 1, 1])
+        col1.metric("📉 Probabilité de cashflow cumulé négatif", f"{mc.proba_cashflow_cumule_negatif * 100:.1f}%")
+        col2.metric("💰 Cashflow cumulé médian", formatter_euros(mc.cashflow_cumule[1, -1]))
+        col3.metric("📈 Valeur nette médiane", formatter_euros(mc.valeur_nette[1, -1]))
+
+        fig_mc = rendu_en_cache('figure_monte_carlo', cle_mc, lambda: figure_monte_carlo(mc))
+        st.plotly_chart(fig_mc, use_container_width=True)
+
+        with st.expander("🔎 Quantiles et probabilité de cashflow négatif par année"):
+            st.dataframe(mc.to_dataframe().round(1), use_container_width=True)
+
+
+@st.fragment
+def afficher_sensibilite(params):
+    """Affiche les cartes de sensibilité à deux paramètres et le diagramme en tornade"""
+    from sci_previsionnel.cache import cache_defaut, empreinte  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.sensibilite import (  # pylint: disable=import-outside-toplevel
+        INDICATEURS_SENSIBILITE, analyse_tornade, grille_sensibilite
+    )
+    st.header("🎚️ Analyse de sensibilité")
+    if not st.toggle("Afficher l'analyse de sensibilité", key='sensibilite_active'):
+        return
+    with chronometre("sensibilite"):
+        onglet_grille, onglet_tornade = st.tabs(["🗺️ Grille à deux paramètres", "🌪️ Tornade"])
+        cles = list(LIBELLES_PARAMETRES)
+
+        with onglet_grille:
+            col1, col2, col3, col4 = st.columns(4)
+            cle_x = col1.selectbox("Paramètre en abscisse", cles, index=cles.index('taux_credit'),
+                                   format_func=LIBELLES_PARAMETRES.get)
+            cles_y = [cle for cle in cles if cle != cle_x]
+            cle_y = col2.selectbox("Paramètre en ordonnée", cles_y, format_func=LIBELLES_PARAMETRES.get,
+                                   index=cles_y.index('loyers_mensuels') if 'loyers_mensuels' in cles_y else 0)
+            amplitude = col3.slider("Amplitude (± %)", 5, 100, 50, step=5) / 100
+            resolution = col4.select_slider("Points par axe", RESOLUTIONS_GRILLE, value=100)
+            valeurs_x = valeurs_grille(params, cle_x, amplitude, resolution)
+            valeurs_y = valeurs_grille(params, cle_y, amplitude, resolution)
+
+            # Toutes les cellules en un lot, mis en cache avec leurs entrées ; les trois cartes partagent le calcul
+            cle_grille = empreinte('grille_sensibilite', [params, cle_x, cle_y, amplitude, resolution])
+            grille = cache_defaut().obtenir(cle_grille, lambda: grille_sensibilite(
+                params, cle_x, valeurs_x, cle_y, valeurs_y, ('cashflow_cumule', 'valeur_nette', 'tri')))
+            indicateur = st.radio("Indicateur", ['cashflow_cumule', 'valeur_nette', 'tri'], horizontal=True,
+                                  format_func=INDICATEURS_SENSIBILITE.get)
+            fig = rendu_en_cache('figure_grille', [cle_grille, indicateur],
+                                 lambda: figure_grille(grille, indicateur, params))
+            st.plotly_chart(fig, use_container_width=True)
+
+        with onglet_tornade:
+            col1, col2 = st.columns(2)
+            choc = col1.slider("Choc appliqué à chaque paramètre (± %)", 1, 50, 10) / 100
+            indicateur_tornade = col2.selectbox("Indicateur", list(INDICATEURS_SENSIBILITE),
+                                                index=list(INDICATEURS_SENSIBILITE).index('cashflow_cumule'),
+                                                format_func=INDICATEURS_SENSIBILITE.get, key='indicateur_tornade')
+            cle_tornade = empreinte('tornade', [params, choc, indicateur_tornade])
+            tornade = cache_defaut().obtenir(cle_tornade, lambda: analyse_tornade(
+                params, choc, [cle for cle in cles if cle in params], indicateur_tornade))
+            fig = rendu_en_cache('figure_tornade', cle_tornade, lambda: figure_tornade(tornade, choc))
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"Référence : {tornade.reference:,.2f}".replace(",", " ")
+                       + ". L'emprunt suit le prix, les frais de notaire, les travaux et l'apport.")
+
+
+@st.fragment
+def afficher_sortie(params):
+    """Affiche le bilan d'une revente à chaque année de l'horizon et l'année de revente optimale"""
+    from sci_previsionnel.cache import cache_defaut, empreinte  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.sortie import analyser_sortie  # pylint: disable=import-outside-toplevel
+    with chronometre("sortie"):
+        st.header("🏁 Revente")
+        col1, col2, col3 = st.columns(3)
+        frais_vente = col1.number_input("Frais de vente (%)", value=5.0, min_value=0.0, max_value=20.0,
+                                        step=0.5, key='frais_vente') / 100
+        indemnites = col2.checkbox("Indemnités de remboursement anticipé", value=True, key='indemnites_sortie')
+        liquidation = col3.checkbox("Liquider la SCI (boni imposé à 30 %)", value=False, key='liquidation_sortie')
+
+        cle_sortie = empreinte('sortie', [params, frais_vente, indemnites, liquidation])
+        sortie = cache_defaut().obtenir(cle_sortie, lambda: analyser_sortie(
+            params, frais_vente, indemnites, 0.3 if liquidation else None))
+        annee = int(sortie.annee_optimale()[0])
+        if annee:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("📅 Année de revente optimale (TRI)", annee)
+            col2.metric("📈 TRI des fonds propres", f"{sortie.tri[0, annee - 1]:.2f} %")
+            col3.metric("💶 Revenu net des associés", formatter_euros(sortie.revenu_associes[0, annee - 1]))
+        else:
+            st.info("Le TRI des fonds propres n'est défini pour aucune année de revente.")
+
+        fig = rendu_en_cache('figure_sortie', cle_sortie, lambda: figure_sortie(sortie))
+        st.plotly_chart(fig, use_container_width=True)
+        with st.expander("🔎 Bilan de la revente par année"):
+            st.dataframe(sortie.to_dataframe().round(2), use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def afficher_financement(params):
+    """Cherche la structure de financement (apport, prêt, amortissement) qui maximise l'objectif choisi"""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.cache import cache_defaut, empreinte  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.financement import (  # pylint: disable=import-outside-toplevel
+        OBJECTIFS_FINANCEMENT, TYPES_PRET, optimiser_financement
+    )
+    st.header("🧮 Structure de financement")
+    if not st.toggle("Optimiser la structure de financement", key='financement_actif'):
+        return
+    with chronometre("financement"):
+        besoin = float(params['emprunt'] + params['apport'])
+        col1, col2, col3 = st.columns(3)
+        objectif = col1.radio("Objectif", list(OBJECTIFS_FINANCEMENT), format_func=OBJECTIFS_FINANCEMENT.get,
+                              horizontal=True)
+        apport_min, apport_max = col2.slider("Apport étudié (€)", 0, int(besoin), (0, int(besoin // 2)),
+                                             step=1000)
+        nb_apports = col3.select_slider("Apports testés", POINTS_APPORT, value=51)
+        col1, col2, col3 = st.columns(3)
+        durees_credit = col1.multiselect("Durées de crédit (ans)", list(range(5, 31)), default=[15, 20, 25])
+        types_pret = col2.multiselect("Types de prêt", list(TYPES_PRET), default=list(TYPES_PRET),
+                                      format_func=LIBELLES_TYPES_PRET.get)
+        durees_amortissement = col3.multiselect("Durées d'amortissement (ans)", list(range(10, 31)),
+                                                default=[int(params['duree_amortissement'])])
+        col1, col2 = st.columns(2)
+        cashflow_minimal = col1.number_input("Cashflow annuel minimal (€)", value=0.0, step=500.0)
+        mensualite_maximale = col2.number_input("Mensualité maximale (€)", value=None, step=100.0,
+                                                placeholder="Aucune")
+        if not (durees_credit and types_pret and durees_amortissement):
+            st.info("Choisissez au moins une durée de crédit, un type de prêt et une durée d'amortissement.")
+            return
+
+        apports = np.linspace(apport_min, apport_max, nb_apports)
+        cle_financement = empreinte('financement', [params, objectif, apport_min, apport_max, nb_apports,
+                                                    sorted(durees_credit), sorted(types_pret),
+                                                    sorted(durees_amortissement), cashflow_minimal,
+                                                    mensualite_maximale])
+        financement = cache_defaut().obtenir(cle_financement, lambda: optimiser_financement(
+            params, apports, sorted(durees_credit), types_pret, sorted(durees_amortissement), objectif,
+            cashflow_minimal, mensualite_maximale))
+
+        structure = financement.structure_optimale
+        if structure is None:
+            st.warning("Aucune structure ne respecte les contraintes.")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("💶 Apport", formatter_euros(structure['apports']))
+            col2.metric("🏦 Prêt", f"{structure['durees_credit']} ans, "
+                                  f"{LIBELLES_TYPES_PRET[structure['types_pret']].lower()}")
+            col3.metric("📉 Amortissement", f"{structure['durees_amortissement']} ans")
+            col4.metric(OBJECTIFS_FINANCEMENT[objectif], f"{structure['tri']:.2f} %" if objectif == 'tri'
+                        else formatter_euros(structure['valeur_nette']))
+            fig = rendu_en_cache('figure_financement', cle_financement, lambda: figure_financement(financement))
+            st.plotly_chart(fig, use_container_width=True)
+            with st.expander("🔎 Structures du front de Pareto"):
+                front = financement.to_dataframe(front=True)
+                front["Type de prêt"] = front["Type de prêt"].map(LIBELLES_TYPES_PRET)
+                st.dataframe(front.round(2), use_container_width=True, hide_index=True)
+        st.caption(f"{financement.nb_structures} structures possibles : {financement.nb_elaguees} écartées sans "
+                   f"projection par les contraintes, {financement.nb_evaluees} projections calculées.")
+
+
+@st.fragment
+def afficher_focus_annee1(df, input_params):
+    """Affiche le détail des revenus, dépenses et du crédit de la première année"""
+    charges = input_params["Charges annuelles"]
+    # --- Détail Année 1 ---
+    st.header("🔍 Focus Année 1")
+
+    annee1 = df[df['Année'] == 1].iloc[0]
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+
+    with col1:
+        st.markdown("### 💰 Revenus")
+        st.markdown(f"- Revenus locatifs : **{formatter_euros(annee1['Loyers annuels'])}**")
+        st.markdown(f"- Taux d'occupation : **{100 - input_params['Bien immobilier']['Vacance locative']*100:.0f}%**")
+
+    with col2:
+        st.markdown("### 📉 Dépenses")
+        st.markdown(f"- Taxe foncière : **-{formatter_euros(charges['Taxe foncière'])}**")
+        st.markdown(f"- Assurance PNO : **-{formatter_euros(charges['Assurance PNO'])}**")
+        st.markdown(f"- Frais de gestion : **-{formatter_euros(charges['Frais gestion'])}**")
+        st.markdown(f"- Entretien / Provision : **-{formatter_euros(charges['Entretien/Divers'])}**")
+        st.markdown(f"- Frais comptable : **-{formatter_euros(charges['Frais comptable'])}**")
+        st.markdown(f"- Intérêts d'emprunt : **-{formatter_euros(annee1['dont Intérêts'])}**")
+        st.markdown(f"- IS : **-{formatter_euros(annee1['IS annuel'])}**")
+
+    with col3:
+        st.markdown("### 🏦 Crédit")
+        st.markdown(f"- Mensualités totales : **{formatter_euros(annee1['Mensualités crédit'])}**")
+        st.markdown(f"- dont Intérêts : **{formatter_euros(annee1['dont Intérêts'])}**")
+        st.markdown(f"- dont Capital : **{formatter_euros(annee1['dont Capital'])}**")
+        st.markdown(f"- Capital restant dû : **{formatter_euros(annee1['Capital restant dû'])}**")
+
+    st.divider()
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown(f"### ➡️ **Cashflow net Année 1 : {formatter_euros(annee1['Cashflow annuel'])}**")
+        st.markdown(f"### 📊 **Rendement sur fonds propres : {annee1['Rendement / fonds propres (%)']:.2f}%**")
+
+    with col2:
+        st.markdown(f"### 🏠 **Valeur du bien : {formatter_euros(annee1['Valeur du bien'])}**")
+        st.markdown(f"### 📈 **Valeur nette estimée : {formatter_euros(annee1['Valeur nette'])}**")
+
+
+@st.fragment
+def afficher_donnees_et_export(df, input_params):
+    """Affiche toutes les données et propose leur export (Excel, CSV ou Parquet)"""
+    with chronometre("export"):
+        # --- Données complètes ---
+        with st.expander("🔎 Voir toutes les données année par année"):
+            st.dataframe(tableau_affichage(df), use_container_width=True)
 
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        results_df.to_excel(writer, sheet_name="Prévisionnel", index=False)
-        params_df.to_excel(writer, sheet_name="Paramètres", index=False)
+        # --- Exporter les données ---
+        # Le fichier n'est généré qu'au clic sur le bouton de téléchargement
+        col1, col2 = st.columns(2)
+        format_export = col1.radio("Format d'export", list(FORMATS_EXPORT), horizontal=True)
+        avec_echeancier = col2.checkbox("Inclure l'échéancier mensuel", value=False,
+                                        disabled=format_export != "Excel")
+        extension, mime = FORMATS_EXPORT[format_export]
+        st.download_button(
+            label=f"📥 Télécharger les données {format_export}",
+            data=lambda: export_excel_with_inputs(df, input_params, extension, avec_echeancier),
+            file_name=f"simulation_sci_is_{time.strftime('%Y%m%d_%H%M')}.{extension}",
+            mime=mime
+        )
 
-    return output.getvalue()
+@st.fragment
+def afficher_scenarios_enregistres(params, input_params):
+    """Enregistre la simulation dans la base de scénarios, puis filtre et compare les scénarios enregistrés"""
+    from sci_previsionnel.cache import projeter_en_cache  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.projection import COLONNES_PROJECTION  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.stockage import (  # pylint: disable=import-outside-toplevel
+        INDICATEURS_INDEXES, INDICATEURS_STOCKES, base_defaut
+    )
+    with chronometre("scenarios_enregistres"):
+        st.header("💾 Scénarios enregistrés")
+        base = base_defaut()
+        libelles_comparaison = {attribut: libelle for libelle, attribut, _ in COLONNES_PROJECTION
+                                if attribut in COLONNES_COMPARAISON}
+        col1, col2 = st.columns([3, 1])
+        nom = col1.text_input("Nom de la simulation", value=f"Simulation du {time.strftime('%d/%m/%Y %H:%M')}")
+        if col2.button("💾 Enregistrer la simulation", use_container_width=True):
+            identifiant = base.enregistrer(params, projeter_en_cache(params), nom=nom, saisie=input_params)
+            st.success(f"Simulation enregistrée (n° {identifiant})")
+
+        col1, col2, col3 = st.columns(3)
+        tri_minimal = col1.number_input("TRI minimal (%)", value=None, step=0.5, placeholder="Aucun")
+        cashflow_minimal = col2.number_input("Cashflow année 1 minimal (€)", value=None, step=500.0,
+                                             placeholder="Aucun")
+        ordre = col3.selectbox("Trier par", ['cree'] + INDICATEURS_INDEXES,
+                               format_func=lambda cle: INDICATEURS_STOCKES.get(cle, "Date d'enregistrement"))
+        # Filtres et tri sur des colonnes indexées : la requête ne lit que les scénarios retenus
+        tableau = base.rechercher({'tri': (tri_minimal, None), 'cashflow_annee_1': (cashflow_minimal, None)},
+                                  ordre=ordre, limite=1000)
+        if tableau.empty:
+            st.caption("Aucun scénario enregistré ne correspond aux filtres.")
+            return
+        st.dataframe(tableau[['nom', 'cree', *INDICATEURS_STOCKES]].round(dict.fromkeys(INDICATEURS_STOCKES, 2)).rename(
+            columns={'nom': "Nom", 'cree': "Enregistré le", **INDICATEURS_STOCKES}), use_container_width=True)
+
+        col1, col2 = st.columns([3, 1])
+        noms = tableau['nom'].to_dict()
+        selection = col1.multiselect("Scénarios à comparer", list(tableau.index), default=list(tableau.index[:2]),
+                                     max_selections=10, format_func=lambda i: f"{i} – {noms[i] or 'sans nom'}")
+        attribut = col2.selectbox("Colonne comparée", list(libelles_comparaison), index=1,
+                                  format_func=libelles_comparaison.get)
+        if selection:
+            # Seuls les détails annuels des scénarios sélectionnés sont décompressés
+            comparaison = base.comparer(selection, attribut)
+            st.plotly_chart(figure_comparaison(comparaison, libelles_comparaison[attribut], noms),
+                            use_container_width=True)
 
 # --- SIDEBAR AVEC TABS ---
 with st.sidebar:
     st.header("⚙️ Paramètres")
 
-    tabs = st.tabs(["📊 Général", "🏠 Bien", "🏦 Financement", "📄 Charges"])
+    tabs = st.tabs(["📊 Général", "🏠 Bien", "🏦 Financement", "📄 Charges", "🎲 Risque"])
 
     with tabs[0]:  # Paramètres généraux
         duree_projection = st.slider("Durée de projection (ans)", 1, 40, 20)
@@ -213,11 +886,21 @@ with st.sidebar:
         st.info(f"Montant de l'emprunt : {formatter_euros(emprunt)}")
         taux_credit = st.number_input("Taux crédit (%)", value=2.5, step=0.1) / 100
         duree_credit = st.number_input("Durée crédit (ans)", value=20, step=1)
-        mensualite_base = npf.pmt(taux_credit/12, duree_credit*12, -emprunt)
+        mensualite_base = mensualite_pret(emprunt, taux_credit, duree_credit)
         st.info(f"Mensualité : {formatter_euros(mensualite_base)}")
         taux_assurance = st.number_input("Taux assurance prêt (%)", value=0.36, step=0.01) / 100
+        assurance_sur = st.radio("Assurance calculée sur", ["Capital initial", "Capital restant dû"], horizontal=True)
         assurance_pret = emprunt * taux_assurance / 12
-        st.info(f"Assurance prêt mensuelle : {formatter_euros(assurance_pret)}")
+        st.info(f"Assurance prêt mensuelle : {formatter_euros(assurance_pret)}"
+                + (" la première année" if assurance_sur == "Capital restant dû" else ""))
+        type_pret = st.radio("Type de prêt", ["Amortissable", "In fine"], horizontal=True)
+        differe_mois = st.number_input("Différé (mois)", min_value=0, value=0, step=1)
+        type_differe = st.radio("Type de différé", ["Partiel", "Total"], horizontal=True,
+                                help="Partiel : intérêts payés pendant le différé ; total : intérêts capitalisés")
+        with st.expander("Remboursement anticipé"):
+            mois_anticipe = st.number_input("Mois du remboursement (0 : aucun)", min_value=0, value=0, step=12)
+            montant_anticipe = st.number_input("Montant remboursé (€)", min_value=0, value=0, step=5000)
+            mode_anticipe = st.radio("Après le remboursement", ["Réduire la mensualité", "Réduire la durée"])
 
     with tabs[3]:  # Charges annuelles
         taxe_fonciere = st.number_input("Taxe foncière (€)", value=1000, step=100)
@@ -227,10 +910,31 @@ with st.sidebar:
         frais_comptable = st.number_input("Frais de comptable (€)", value=1200, step=100)
         provision_travaux = st.number_input("Provision pour travaux (%)", value=0.5, step=0.1) / 100
 
-    lancer = st.button("🚀 Lancer la simulation", type="primary")
+    with tabs[4]:  # Analyse de risque Monte Carlo
+        mode_monte_carlo = st.checkbox("Activer la simulation Monte Carlo", value=False)
+        nb_chemins = st.select_slider("Nombre de trajectoires", options=[1000, 10000, 100000, 1000000], value=100000)
+        volatilite_loyers = st.number_input("Écart-type revalorisation loyers (%)", value=1.0, step=0.1) / 100
+        volatilite_immobilier = st.number_input("Écart-type appréciation immobilière (%)", value=3.0, step=0.1) / 100
+        volatilite_charges = st.number_input("Écart-type indexation charges (%)", value=0.5, step=0.1) / 100
+        vacance_max = st.slider("Vacance locative maximale (%)", 0, 30, 10, step=1) / 100
+        taux_variable = st.checkbox("Crédit à taux variable", value=False)
+        volatilite_taux = st.number_input("Écart-type variation annuelle du taux (%)", value=0.3, step=0.1) / 100
+        graine = st.number_input("Graine aléatoire", value=0, step=1)
+        nb_workers = st.number_input("Processus de calcul", min_value=1, value=nb_workers_defaut(), step=1)
+
+    mode_live = st.checkbox("⚡ Mode live", value=False,
+                            help="Recalcule les résultats à chaque modification, sans cliquer sur le bouton")
+    st.checkbox("🩺 Diagnostics", key='diagnostics',
+                help="Mesure la durée de chaque étape et permet de profiler une exécution")
+    lancer = st.button("🚀 Lancer la simulation", type="primary", disabled=mode_live)
 
 # --- MAIN ---
-if lancer:
+if lancer or mode_live:
+    # Moteur chargé à la première simulation seulement (déjà en mémoire si le préchauffage lancé depuis la
+    # page d'accueil est terminé)
+    from sci_previsionnel.incremental import PipelineIncremental
+    from sci_previsionnel.monte_carlo import ConfigMonteCarlo, Loi
+
     # Afficher un spinner pendant le calcul
     with st.spinner("Calcul en cours..."):
         # Préparation des paramètres
@@ -248,6 +952,14 @@ if lancer:
             'taux_credit': taux_credit,
             'duree_credit': duree_credit,
             'mensualite': mensualite_base + assurance_pret,  # Ajout de l'assurance prêt
+            'taux_assurance': taux_assurance,
+            'assurance_sur': 'restant' if assurance_sur == "Capital restant dû" else 'initial',
+            'in_fine': type_pret == "In fine",
+            'differe_mois': differe_mois,
+            'type_differe': type_differe.lower(),
+            'mois_remboursement_anticipe': mois_anticipe,
+            'montant_remboursement_anticipe': montant_anticipe,
+            'mode_remboursement_anticipe': 'duree' if mode_anticipe == "Réduire la durée" else 'mensualite',
             'taxe_fonciere': taxe_fonciere,
             'assurance': assurance,
             'frais_gestion': frais_gestion,
@@ -257,7 +969,10 @@ if lancer:
             'duree_amortissement': duree_amortissement
         }
 
-        df, first_is = calculs_financiers(params)
+        # Projection lue dans le cache partagé, sinon recalcul des seules étapes invalidées par la saisie
+        pipeline = st.session_state.setdefault('pipeline', PipelineIncremental())
+        projection = pipeline.calculer(params)
+        df, first_is = projection.to_dataframe(), projection.premiere_annee_is
 
         # Prepare input_params dictionary
         input_params = {
@@ -282,7 +997,8 @@ if lancer:
                 "Taux crédit": taux_credit,
                 "Durée crédit": duree_credit,
                 "Mensualité": mensualite_base,
-                "Assurance prêt": assurance_pret
+                "Assurance prêt": assurance_pret,
+                **{libelle: params[cle] for libelle, cle in LIBELLES_OPTIONS_PRET.items()}
             },
             "Charges annuelles": {
                 "Taxe foncière": taxe_fonciere,
@@ -294,263 +1010,45 @@ if lancer:
             }
         }
 
-        # --- TABLEAU DE BORD ---
-        st.header("📊 Tableau de bord")
+        # Le tableau de bord est toujours à jour ; les sections lourdes attendent la fin de la saisie
+        with chronometre("tableau_de_bord"):
+            afficher_tableau_de_bord(df, first_is, params)
 
-        col1, col2, col3 = st.columns([1, 1, 1])
-
-        # Valeurs pour les métriques
-        valeur_finale = df.iloc[-1]['Valeur du bien']
-        cashflow_cumule_final = df.iloc[-1]['Cashflow cumulé']
-        valeur_nette_finale = df.iloc[-1]['Valeur nette']
-        cashflow_moyen = int(df['Cashflow annuel'].mean())
-        rendement_moyen = round(df['Rendement / fonds propres (%)'].mean(), 2)
-        rendement_brut_moyen = round(df['Rendement brut (%)'].mean(), 2)
-
-        # Affichage des métriques principales
-        col1.metric("💰 Cashflow cumulé", formatter_euros(cashflow_cumule_final),
-                   f"{'+' if cashflow_moyen > 0 else ''}{formatter_euros(cashflow_moyen)}/an")
-
-        col2.metric("🏠 Valeur finale", formatter_euros(valeur_finale),
-                   f"+{formatter_euros(valeur_finale - prix_achat)}")
-
-        col3.metric("📈 Valeur nette", formatter_euros(valeur_nette_finale),
-                   f"+{formatter_euros(valeur_nette_finale - apport)}")
-
-        # Seconde ligne de métriques
-        col1, col2, col3 = st.columns([1, 1, 1])
-
-        col1.metric("💹 Rendement/fonds propres", f"{rendement_moyen}%")
-        col2.metric("📊 Rendement brut", f"{rendement_brut_moyen}%")
-        col3.metric("⏱️ Durée du crédit", f"{duree_credit} ans")
-
-        # Alerte sur l'IS
-        if first_is:
-            st.warning(f"⚠️ IS à payer à partir de l'année {first_is}")
+        rendu = (df, input_params, params)
+        if mode_live and saisie_en_cours(params) and 'dernier_rendu' in st.session_state:
+            rendu = st.session_state['dernier_rendu']
+            st.fragment(relancer_apres_saisie, run_every=DELAI_DEBOUNCE)()
         else:
-            st.success("✅ Pas d'IS à payer sur toute la durée de projection")
-
-        # --- RÉSULTATS DÉTAILLÉS --
-        st.header("📑 Résultats détaillés")
-
-        # Filtrer pour les années clés pour l'affichage principal
-        annees_cles = [1, 5, 10, 15, 20, 25, 30]
-        if duree_projection not in annees_cles:
-            annees_cles.append(duree_projection)
-        annees_cles = sorted([a for a in annees_cles if a <= duree_projection])
-        df_display = df[df['Année'].isin(annees_cles)].copy()
-
-        st.subheader(f"📊 Résultats sur {', '.join(map(str, annees_cles[:-1]))} et {annees_cles[-1]} ans")
-
-        tab1, tab2, tab3, tab4 = st.tabs(["💰 Résultats financiers", "📝 Comptabilité", "🏦 Crédit", "🏠 Patrimoine"])
-
-        with tab1:
-            # Affichage des résultats financiers
-            cols_financiers = ["Année", "Loyers annuels", "Charges annuelles",
-                                "Mensualités crédit", "IS annuel",
-                              "Cashflow annuel", "Cashflow cumulé",
-                                "Rendement / fonds propres (%)",
-                                "Rendement brut (%)"]
-
-            st.dataframe(df_display[cols_financiers].style.format({
-                col: "{:,} €".replace(",", " ") if col != "Année" and "(%)" not in col else "{}"
-                for col in cols_financiers
-            }).format({"Rendement / fonds propres (%)": "{:.2f}", "Rendement brut (%)": "{:.2f}"}), use_container_width=True)
-
-        with tab2:
-            # Affichage des informations comptables
-            cols_compta = ["Année", "Loyers annuels", "Charges annuelles", "dont Intérêts", "Amortissement annuel",
-                         "Résultat fiscal annuel", "IS annuel"]
-
-            st.dataframe(df_display[cols_compta].style.format({
-                col: "{:,} €".replace(",", " ") if col != "Année" else "{}"
-                for col in cols_compta
-            }), use_container_width=True)
-
-        with tab3:
-            # Affichage des informations crédit
-            cols_credit = ["Année", "Mensualités crédit", "dont Intérêts", "dont Capital",
-                         "Capital remboursé cumulé", "Capital restant dû"]
-
-            st.dataframe(df_display[cols_credit].style.format({
-                col: "{:,} €".replace(",", " ") if col != "Année" else "{}"
-                for col in cols_credit
-            }), use_container_width=True)
-
-        with tab4:
-            # Affichage des informations patrimoine
-            cols_patrimoine = ["Année", "Valeur du bien", "Capital restant dû", "Valeur nette"]
-
-            st.dataframe(df_display[cols_patrimoine].style.format({
-                col: "{:,} €".replace(",", " ") if col != "Année" else "{}"
-                for col in cols_patrimoine
-            }), use_container_width=True)
-
-        # --- GRAPHIQUES ---
-        st.header("📈 Graphiques")
-
-        # Configuration des graphiques principales (sans le camembert qui cause l'erreur)
-        fig1 = make_subplots(
-            rows=2, cols=2,
-            subplot_titles=("Évolution du Cashflow", "Évolution de la Valeur Patrimoniale",
-                           "Rendement sur fonds propres", ""),
-            specs=[[{"secondary_y": True}, {"secondary_y": False}],
-                  [{"secondary_y": False}, {"type": "domain"}]],  # type "domain" pour le camembert
-            vertical_spacing=0.12,
-            horizontal_spacing=0.08
-        )
-
-        # Graphique 1: Cashflow et rendement
-        fig1.add_trace(go.Bar(
-            x=df["Année"],
-            y=df["Cashflow annuel"],
-            name="Cashflow annuel (€)",
-            marker_color='indianred'
-        ), row=1, col=1)
-
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Cashflow cumulé"],
-            name="Cashflow cumulé (€)",
-            mode='lines+markers',
-            line=dict(color='firebrick', width=3)
-        ), row=1, col=1)
-
-        # Graphique 2: Valeur patrimoniale
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Valeur du bien"],
-            name="Valeur bien (€)",
-            mode='lines',
-            line=dict(color='royalblue')
-        ), row=1, col=2)
-
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Capital restant dû"],
-            name="Capital restant dû (€)",
-            mode='lines',
-            line=dict(color='indianred')
-        ), row=1, col=2)
-
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Valeur nette"],
-            name="Valeur nette (€)",
-            mode='lines',
-            line=dict(color='mediumseagreen')
-        ), row=1, col=2)
-
-        # Graphique 3: Rendement
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Rendement / fonds propres (%)"],
-            name="Rendement/fonds propres (%)",
-            mode='lines+markers',
-            line=dict(color='green', width=3)
-        ), row=2, col=1)
-
-        fig1.add_trace(go.Scatter(
-            x=df["Année"],
-            y=df["Rendement brut (%)"],
-            name="Rendement brut (%)",
-            mode='lines+markers',
-            line=dict(color='darkgreen', width=2, dash='dot')
-        ), row=2, col=1)
-
-        # Graphique 4: Décomposition première année (camembert)
-        # Création d'un graphique de type 'pie' qui doit être dans un subplot de type 'domain'
-        labels = ["Intérêts", "Charges", "IS", "Cashflow"]
-        values = [
-            df.iloc[0]["dont Intérêts"],
-            df.iloc[0]["Charges annuelles"],
-            df.iloc[0]["IS annuel"],
-            df.iloc[0]["Cashflow annuel"]
-        ]
-
-        fig1.add_trace(go.Pie(
-            labels=labels,
-            values=values,
-            name="Décomposition Année 1",
-            hole=.4,
-            title="Décomposition des charges"
-        ), row=2, col=2)  # Cette case a le type "domain" approprié pour un camembert
-
-        # Mise en forme
-        fig1.update_layout(
-            height=800,
-            title_text="Projection Financière Détaillée",
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-            separators=', '
-        )
-
-        fig1.update_yaxes(title_text="Euros (€)", row=1, col=1)
-        fig1.update_yaxes(title_text="Euros (€)", row=1, col=2)
-        fig1.update_yaxes(title_text="Rendement (%)", row=2, col=1)
-        fig1.update_xaxes(title_text="Années", row=2, col=1)
-
-        st.plotly_chart(fig1, use_container_width=True)
-
-        # --- Détail Année 1 ---
-        st.header("🔍 Focus Année 1")
-
-        annee1 = df[df['Année'] == 1].iloc[0]
-
-        col1, col2, col3 = st.columns([1, 1, 1])
-
-        with col1:
-            st.markdown("### 💰 Revenus")
-            st.markdown(f"- Revenus locatifs : **{formatter_euros(annee1['Loyers annuels'])}**")
-            st.markdown(f"- Taux d'occupation : **{100 - vacance_locative*100:.0f}%**")
-
-        with col2:
-            st.markdown("### 📉 Dépenses")
-            st.markdown(f"- Taxe foncière : **-{formatter_euros(taxe_fonciere)}**")
-            st.markdown(f"- Assurance PNO : **-{formatter_euros(assurance)}**")
-            st.markdown(f"- Frais de gestion : **-{formatter_euros(frais_gestion)}**")
-            st.markdown(f"- Entretien / Provision : **-{formatter_euros(entretien)}**")
-            st.markdown(f"- Frais comptable : **-{formatter_euros(frais_comptable)}**")
-            st.markdown(f"- Intérêts d'emprunt : **-{formatter_euros(annee1['dont Intérêts'])}**")
-            st.markdown(f"- IS : **-{formatter_euros(annee1['IS annuel'])}**")
-
-        with col3:
-            st.markdown("### 🏦 Crédit")
-            st.markdown(f"- Mensualités totales : **{formatter_euros(annee1['Mensualités crédit'])}**")
-            st.markdown(f"- dont Intérêts : **{formatter_euros(annee1['dont Intérêts'])}**")
-            st.markdown(f"- dont Capital : **{formatter_euros(annee1['dont Capital'])}**")
-            st.markdown(f"- Capital restant dû : **{formatter_euros(annee1['Capital restant dû'])}**")
-
-        st.divider()
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.markdown(f"### ➡️ **Cashflow net Année 1 : {formatter_euros(annee1['Cashflow annuel'])}**")
-            st.markdown(f"### 📊 **Rendement sur fonds propres : {annee1['Rendement / fonds propres (%)']:.2f}%**")
-
-        with col2:
-            st.markdown(f"### 🏠 **Valeur du bien : {formatter_euros(annee1['Valeur du bien'])}**")
-            st.markdown(f"### 📈 **Valeur nette estimée : {formatter_euros(annee1['Valeur nette'])}**")
-
-        # --- Données complètes ---
-        with st.expander("🔎 Voir toutes les données année par année"):
-            st.dataframe(df.style.format({
-                col: "{:,} €".replace(",", " ") if col != "Année" and "(%)" not in col else "{}"
-                for col in df.columns
-            }).format({"Rendement / fonds propres (%)": "{:.2f}", "Rendement brut (%)": "{:.2f}"}), use_container_width=True)
-
-        # --- Exporter les données ---
-        # Generate Excel with both sheets
-        excel_data = export_excel_with_inputs(df, input_params)
-        st.download_button(
-            label="📥 Télécharger les données Excel",
-            data=excel_data,
-            file_name=f"simulation_sci_is_{time.strftime('%Y%m%d_%H%M')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+            st.session_state['dernier_rendu'] = rendu
+        df_affiche, input_params_affiches, params_affiches = rendu
+
+        afficher_resultats_detailles(df_affiche)
+        afficher_graphiques(df_affiche)
+
+        if mode_monte_carlo:
+            config_mc = ConfigMonteCarlo(
+                revalorisation_loyers=Loi('normale', revalorisation_loyers, volatilite_loyers),
+                appreciation_immobilier=Loi('normale', appreciation_immobilier, volatilite_immobilier),
+                indexation_charges=Loi('normale', indexation_charges, volatilite_charges),
+                vacance_locative=Loi('triangulaire', vacance_locative, minimum=0.0,
+                                     maximum=max(vacance_max, vacance_locative)),
+                variation_taux=Loi('normale', 0.0, volatilite_taux) if taux_variable else None,
+                nb_chemins=nb_chemins,
+                graine=int(graine)
+            )
+            # La vacance est tirée chaque année : on repart des loyers hors vacance
+            afficher_risque({**params, 'loyers_mensuels': loyers_mensuels}, config_mc, int(nb_workers))
+
+        afficher_sensibilite(params_affiches)
+        afficher_sortie(params_affiches)
+        afficher_financement(params_affiches)
+        afficher_focus_annee1(df_affiche, input_params_affiches)
+        afficher_donnees_et_export(df_affiche, input_params_affiches)
+        afficher_scenarios_enregistres(params_affiches, input_params_affiches)
 
 else:
     # Affichage par défaut quand l'application démarre
-    st.info("👈 Configurez les paramètres dans le panneau de gauche puis cliquez sur 'Lancer la simulation'")
+    st.info("👈 Configurez les paramètres dans le panneau de gauche puis cliquez sur 'Lancer la simulation' (ou activez le mode live)")
 
     # Description de l'application
     st.markdown("""
@@ -563,7 +1061,15 @@ else:
     - Calcul du cashflow et de la rentabilité
     - Amortissement comptable du bien immobilier (hors terrain)
     - Prise en compte de l'IS avec taxation progressive
+    - Prêt amortissable ou in fine, différé, remboursement anticipé et assurance emprunteur
     - Valorisation du patrimoine et calcul de la valeur nette
+    - Analyse de risque Monte Carlo (éventails P5/P50/P95, taux variable)
+    - Sensibilité : cartes à deux paramètres (cashflow cumulé, valeur nette, TRI) et diagramme en tornade
+    - Revente : plus-value imposée à l'IS, remboursement du prêt et TRI pour chaque année de revente
+    - Structure de financement : apport, durée et type de prêt, amortissement optimaux sous contraintes
+    - Scénarios enregistrés : base locale des simulations, filtres sur les indicateurs clés et comparaison
+    - Mode live : résultats recalculés à chaque modification
+    - Diagnostics : durée de chaque étape, efficacité du cache et profilage à la demande
 
     #### Comment utiliser cet outil:
     1. Configurez les paramètres dans le panneau latéral
@@ -572,3 +1078,17 @@ else:
 
     Pour toute question ou suggestion d'amélioration, n'hésitez pas à nous contacter.
     """)
+
+    # Le moteur et ses dépendances se chargent en arrière-plan pendant la saisie des paramètres
+    # (une fois par processus), pour que la première simulation ne paie pas leur import
+    prechauffer()
+
+# --- DIAGNOSTICS ---
+duree_execution = (time.perf_counter() - debut_execution) * 1000
+if profileur is not None:
+    profileur.arreter()
+    st.session_state['rapport_profil'] = profileur.rapport()
+instrumentation.journaliser_evenement("execution", duree_ms=round(duree_execution, 3),
+                                      **instrumentation.statistiques_cache())
+if diagnostics:
+    afficher_diagnostics(instrumentation.arreter_releve(), duree_execution)
@@ -0,0 +1,13 @@
+"""Benchmarks reproductibles du moteur de calcul, des exports et du rendu de l'application
+
+Chaque cas est mesuré en temps (plusieurs répétitions), en pic mémoire et en
+allocations ; les résultats sont enregistrés en JSON et peuvent être
+comparés à une référence avec des seuils de régression configurables :
+
+    python -m benchmarks --rapide --sortie base.json
+    python -m benchmarks --rapide --reference base.json --seuil-temps 0.3
+
+Les benchmarks s'exécutent sans affichage ; le groupe « application » rend
+le script Streamlit avec streamlit.testing et est ignoré si ce module est
+absent.
+"""
@@ -0,0 +1,97 @@
+"""Point d'entrée : python -m benchmarks [--rapide] [--sortie resultats.json] [--reference base.json]"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .cas import GROUPES
+from .mesure import comparer, mesurer
+
+
+def _analyser_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Mesure le temps, le pic mémoire et les allocations du moteur, des exports et du rendu."
+    )
+    parser.add_argument('--groupes', default=','.join(GROUPES),
+                        help=f"groupes à exécuter, séparés par des virgules (défaut : {','.join(GROUPES)})")
+    parser.add_argument('--filtre', default='', help="n'exécute que les cas dont le nom contient ce texte")
+    parser.add_argument('--rapide', action='store_true',
+                        help="ignore les cas lourds (lots de 100k scénarios et plus, 100k trajectoires et plus...)")
+    parser.add_argument('--repetitions', type=int, default=5, help="nombre maximal d'échantillons par cas (défaut : 5)")
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help="temps (s) au-delà duquel un cas n'est plus répété (défaut : 2)")
+    parser.add_argument('--sortie', help="fichier JSON où enregistrer les résultats")
+    parser.add_argument('--reference', help="résultats JSON de référence auxquels comparer")
+    parser.add_argument('--seuil-temps', type=float, default=0.25,
+                        help="hausse relative du temps minimal tolérée avant régression (défaut : 0.25)")
+    parser.add_argument('--seuil-memoire', type=float, default=0.25,
+                        help="hausse relative du pic mémoire tolérée avant régression (défaut : 0.25)")
+    return parser.parse_args(argv)
+
+
+def _environnement():
+    """Description de la machine et des versions, enregistrée avec les résultats"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=False).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        "date": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plateforme": platform.platform(),
+        "processeurs": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    """Exécute les benchmarks ; renvoie 1 en cas de régression par rapport à la référence"""
+    args = _analyser_arguments(argv)
+    groupes = [groupe for groupe in args.groupes.split(',') if groupe]
+    inconnus = [groupe for groupe in groupes if groupe not in GROUPES]
+    if inconnus:
+        print(f"Groupes inconnus : {', '.join(inconnus)}", file=sys.stderr)
+        return 2
+
+    resultats = {}
+    for groupe in groupes:
+        for cas in GROUPES[groupe]():
+            if args.filtre not in cas.nom or (args.rapide and cas.lourd):
+                continue
+            resultats[cas.nom] = {"groupe": groupe,
+                                  **mesurer(cas.preparer(), args.repetitions, args.budget)}
+            mesure = resultats[cas.nom]
+            print(f"{cas.nom:<32} {mesure['temps_min_s'] * 1000:>10.2f} ms "
+                  f"{mesure['memoire_pic_octets'] / 2 ** 20:>9.1f} Mo "
+                  f"{mesure['allocations_blocs']:>9} blocs", file=sys.stderr)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump({"environnement": _environnement(), "resultats": resultats}, fichier, indent=2)
+
+    if not args.reference:
+        return 0
+    with open(args.reference, encoding='utf-8') as fichier:
+        reference = json.load(fichier)["resultats"]
+    lignes, regressions = comparer(resultats, reference, args.seuil_temps, args.seuil_memoire)
+    print(f"\n{'Cas':<32} {'Temps (ms)':>10} {'x réf.':>7} {'Pic (Mo)':>9} {'x réf.':>7}  Statut")
+    for nom, temps, ratio_temps, pic, ratio_memoire, statut in lignes:
+        ratio_temps = f"{ratio_temps:.2f}" if ratio_temps is not None else "-"
+        ratio_memoire = f"{ratio_memoire:.2f}" if ratio_memoire is not None else "-"
+        print(f"{nom:<32} {temps * 1000:>10.2f} {ratio_temps:>7} {pic / 2 ** 20:>9.1f} {ratio_memoire:>7}  {statut}")
+    if regressions:
+        print(f"\n{len(regressions)} régression(s) : {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""Cas de benchmark du moteur, des exports et du rendu de l'application
+
+Tous les cas sont déterministes : paramètres fixes et scénarios tirés avec
+une graine constante.
+"""
+import atexit
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+# Paramètres par défaut de l'application (voir le bloc principal de SciPrevisionnel.py)
+PARAMETRES_REFERENCE = {
+    'prix_achat': 200000, 'frais_notaire': 15000, 'travaux': 20000, 'pourcentage_terrain': 0.2,
+    'loyers_mensuels': 1200, 'revalorisation_loyers': 0.015, 'appreciation_immobilier': 0.01,
+    'indexation_charges': 0.02, 'apport': 20000, 'emprunt': 215000, 'taux_credit': 0.025,
+    'duree_credit': 20, 'taxe_fonciere': 1000, 'assurance': 200, 'frais_gestion': 500, 'entretien': 1300,
+    'frais_comptable': 1200, 'duree_projection': 20, 'duree_amortissement': 20
+}
+
+DUREES_CREDIT = [5, 10, 15, 20, 25, 30, 40]
+HORIZONS = [1, 5, 10, 20, 30, 40]
+TAILLES_LOT = [1, 100, 10000, 100000, 1000000]
+NB_CHEMINS = [1000, 10000, 100000, 1000000]
+TAILLES_EXPORT_LOT = [100, 1000, 10000]
+TAILLES_PORTEFEUILLE = [1, 50, 500, 5000]
+TAILLES_PRETS = [1000, 10000]
+TAILLES_OBJECTIF = [1, 1000, 10000]
+RESOLUTIONS_GRILLE = [50, 200]
+TAILLES_SORTIE = [1, 1000, 10000]
+TAILLES_STOCKAGE = [1000, 10000]
+# Grilles de sensibilité mesurées : (paramètre en abscisse, étendue, paramètre en ordonnée, étendue)
+GRILLES = [
+    ('taux_credit', (0.005, 0.06), 'loyers_mensuels', (600, 2000)),
+    ('apport', (0, 100000), 'duree_credit', (5, 30)),
+]
+# Grilles de structures de financement mesurées : (nombre d'apports, durées de crédit, durées d'amortissement)
+GRILLES_FINANCEMENT = [
+    (21, (15, 20, 25), (20,)),
+    (201, tuple(range(5, 31)), tuple(range(10, 31))),
+]
+# Recherches d'objectifs mesurées : (variable, indicateur, cible)
+OBJECTIFS = [
+    ('prix_achat', 'cashflow_annee_1', 0.0),
+    ('loyers_mensuels', 'rendement_fonds_propres_moyen', 5.0),
+    ('taux_credit', 'valeur_nette', 0.0),
+]
+
+# Au-delà de ces tailles, un cas est « lourd » et ignoré par --rapide
+LOT_LOURD = 100000
+CHEMINS_LOURDS = 100000
+EXPORT_LOURD = 10000
+PRETS_LOURDS = 10000
+OBJECTIFS_LOURDS = 10000
+SORTIES_LOURDES = 10000
+STOCKAGE_LOURD = 10000
+
+SCRIPT_APPLICATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'SciPrevisionnel.py')
+# Démarrages à froid mesurés, chacun dans un interpréteur neuf : (nom du cas, code exécuté)
+DEMARRAGES = [
+    ("demarrage_interpreteur", "pass"),
+    ("demarrage_import_moteur", "import sci_previsionnel"),
+    ("demarrage_prechauffage", "import sci_previsionnel; sci_previsionnel.prechauffer(attendre=True)"),
+    ("demarrage_page_accueil", f"""
+from streamlit.testing.v1 import AppTest
+application = AppTest.from_file({SCRIPT_APPLICATION!r}, default_timeout=600)
+application.run()
+assert not application.exception, application.exception
+"""),
+    ("demarrage_premiere_simulation", f"""
+from streamlit.testing.v1 import AppTest
+application = AppTest.from_file({SCRIPT_APPLICATION!r}, default_timeout=600)
+application.run()
+next(case for case in application.checkbox if 'Mode live' in case.label).check()
+application.run()
+assert not application.exception, application.exception
+"""),
+]
+
+
+@dataclass(frozen=True)
+class Cas:
+    """Cas de benchmark
+
+    preparer() construit les données du cas (hors mesure) et renvoie la
+    fonction sans argument à mesurer ; elle n'est appelée que pour les cas
+    sélectionnés.
+    """
+    groupe: str
+    nom: str
+    preparer: Callable[[], Callable]
+    lourd: bool = False
+
+
+def scenarios_aleatoires(nb_scenarios, graine=0):
+    """Scénarios autour des paramètres de référence, tirés avec une graine fixe"""
+    rng = np.random.default_rng(graine)
+    scenarios = {cle: np.full(nb_scenarios, float(valeur)) for cle, valeur in PARAMETRES_REFERENCE.items()}
+    scenarios['loyers_mensuels'] = rng.uniform(800, 1600, nb_scenarios)
+    scenarios['taux_credit'] = rng.uniform(0.01, 0.05, nb_scenarios)
+    scenarios['duree_credit'] = rng.choice(DUREES_CREDIT, nb_scenarios).astype(float)
+    scenarios['duree_projection'] = rng.integers(1, 41, nb_scenarios).astype(float)
+    return scenarios
+
+
+def _parametres(**modifications):
+    return {**PARAMETRES_REFERENCE, **modifications}
+
+
+def cas_echeancier():
+    """Échéancier mensuel du prêt (calculer_tableau_amortissement) pour chaque durée de crédit"""
+    from sci_previsionnel.pret import echeancier_pret  # pylint: disable=import-outside-toplevel
+
+    for duree in DUREES_CREDIT:
+        yield Cas("echeancier", f"echeancier_{duree}ans",
+                  lambda duree=duree: lambda: echeancier_pret(215000, 0.025, duree).to_dataframe())
+
+    def structures(taille):
+        """Prêts de structures variées : différés, in fine, taux révisés, assurance, remboursements anticipés"""
+        from sci_previsionnel.pret import flux_pret_general_annuels  # pylint: disable=import-outside-toplevel
+        rng = np.random.default_rng(0)
+        taux = 0.025 + np.cumsum(rng.normal(0, 0.002, (taille, 25)), axis=1)
+        options = {
+            'differe_mois': rng.integers(0, 24, taille),
+            'type_differe': rng.choice(['partiel', 'total'], taille),
+            'in_fine': rng.random(taille) < 0.1,
+            'taux_assurance': 0.0036,
+            'assurance_sur': rng.choice(['initial', 'restant'], taille),
+            'mois_remboursement_anticipe': rng.integers(0, 120, taille),
+            'montant_remboursement_anticipe': 30000.0,
+            'mode_remboursement_anticipe': rng.choice(['mensualite', 'duree'], taille),
+        }
+        durees = rng.choice(DUREES_CREDIT[:5], taille)
+        return lambda: flux_pret_general_annuels(215000, np.clip(taux, 0.001, None), durees, 40, **options)
+
+    for taille in TAILLES_PRETS:
+        yield Cas("echeancier", f"prets_structures_{taille}", lambda taille=taille: structures(taille),
+                  lourd=taille >= PRETS_LOURDS)
+
+
+def cas_projection():
+    """Projection annuelle (projeter, puis DataFrame) pour chaque horizon, sans cache"""
+    from sci_previsionnel.projection import projeter  # pylint: disable=import-outside-toplevel
+
+    for horizon in HORIZONS:
+        params = _parametres(duree_projection=horizon)
+        yield Cas("projection", f"projection_{horizon}ans",
+                  lambda params=params: lambda: projeter(params).to_dataframe())
+
+    def succes_cache():
+        from sci_previsionnel.cache import CacheResultats, projeter_en_cache  # pylint: disable=import-outside-toplevel
+        cache = CacheResultats()
+        params = _parametres()
+        projeter_en_cache(params, cache)
+        return lambda: projeter_en_cache(params, cache)
+
+    yield Cas("projection", "projection_cache_succes", succes_cache)
+
+
+def cas_lot():
+    """Simulation par lot pour chaque taille de lot"""
+    from sci_previsionnel.lot import simuler_lot  # pylint: disable=import-outside-toplevel
+
+    for taille in TAILLES_LOT:
+        def preparer(taille=taille):
+            scenarios = scenarios_aleatoires(taille)
+            return lambda: simuler_lot(scenarios)
+
+        yield Cas("lot", f"lot_{taille}", preparer, lourd=taille >= LOT_LOURD)
+
+
+def cas_monte_carlo():
+    """Simulation Monte Carlo pour chaque nombre de trajectoires"""
+    from sci_previsionnel.monte_carlo import (  # pylint: disable=import-outside-toplevel
+        ConfigMonteCarlo, Loi, simuler_monte_carlo
+    )
+
+    for nb_chemins in NB_CHEMINS:
+        config = ConfigMonteCarlo(
+            revalorisation_loyers=Loi('normale', 0.015, 0.01),
+            appreciation_immobilier=Loi('normale', 0.01, 0.03),
+            indexation_charges=Loi('normale', 0.02, 0.005),
+            vacance_locative=Loi('triangulaire', 0.0, minimum=0.0, maximum=0.1),
+            variation_taux=Loi('normale', 0.0, 0.003),
+            nb_chemins=nb_chemins
+        )
+        yield Cas("monte_carlo", f"monte_carlo_{nb_chemins}",
+                  lambda config=config: lambda: simuler_monte_carlo(_parametres(), config),
+                  lourd=nb_chemins >= CHEMINS_LOURDS)
+
+
+def cas_portefeuille():
+    """Portefeuille de lots acquis sur 30 ans, IS consolidé sur 40 ans, pour chaque nombre de lots"""
+    from sci_previsionnel.portefeuille import projeter_portefeuille  # pylint: disable=import-outside-toplevel
+
+    for taille in TAILLES_PORTEFEUILLE:
+        def preparer(taille=taille):
+            rng = np.random.default_rng(0)
+            lots = scenarios_aleatoires(taille)
+            lots['annee_acquisition'] = rng.integers(1, 31, taille).astype(float)
+            societe = {'duree_projection': 40, 'frais_comptable': 1200, 'indexation_charges': 0.02}
+            return lambda: projeter_portefeuille(lots, societe)
+
+        yield Cas("portefeuille", f"portefeuille_{taille}_lots", preparer)
+
+
+def cas_objectifs():
+    """Recherche d'objectifs (prix maximal, loyer minimal, taux limite) sur des lots de scénarios"""
+    from sci_previsionnel.objectifs import resoudre_objectif  # pylint: disable=import-outside-toplevel
+
+    for variable, indicateur, cible in OBJECTIFS:
+        for taille in TAILLES_OBJECTIF:
+            def preparer(taille=taille, variable=variable, indicateur=indicateur, cible=cible):
+                scenarios = scenarios_aleatoires(taille)
+                return lambda: resoudre_objectif(scenarios, variable, indicateur, cible)
+
+            yield Cas("objectifs", f"objectif_{variable}_{taille}", preparer, lourd=taille >= OBJECTIFS_LOURDS)
+
+
+def cas_sensibilite():
+    """Grilles de sensibilité à deux paramètres (un lot par grille) et tornade sur tous les paramètres"""
+    from sci_previsionnel.sensibilite import (  # pylint: disable=import-outside-toplevel
+        analyse_tornade, grille_sensibilite
+    )
+
+    for parametre_x, etendue_x, parametre_y, etendue_y in GRILLES:
+        for resolution in RESOLUTIONS_GRILLE:
+            def preparer(parametre_x=parametre_x, etendue_x=etendue_x, parametre_y=parametre_y, etendue_y=etendue_y,
+                         resolution=resolution):
+                valeurs_x = np.linspace(*etendue_x, resolution)
+                valeurs_y = np.linspace(*etendue_y, resolution)
+                return lambda: grille_sensibilite(_parametres(), parametre_x, valeurs_x, parametre_y, valeurs_y)
+
+            yield Cas("sensibilite", f"grille_{parametre_x}_{parametre_y}_{resolution}", preparer)
+    yield Cas("sensibilite", "tornade", lambda: lambda: analyse_tornade(_parametres(), 0.1, indicateur='tri'))
+
+
+def cas_sortie():
+    """Analyse de sortie (revente à chaque année de l'horizon, TRI compris) sur des lots de scénarios"""
+    from sci_previsionnel.sortie import analyser_sortie  # pylint: disable=import-outside-toplevel
+
+    for taille in TAILLES_SORTIE:
+        def preparer(taille=taille):
+            scenarios = scenarios_aleatoires(taille)
+            return lambda: analyser_sortie(scenarios, frais_vente=0.05, taux_boni=0.3)
+
+        yield Cas("sortie", f"sortie_{taille}", preparer, lourd=taille >= SORTIES_LOURDES)
+
+
+def cas_financement():
+    """Optimisation de la structure de financement, de la petite grille à la grille exhaustive (~220 000 structures)"""
+    from sci_previsionnel.financement import optimiser_financement  # pylint: disable=import-outside-toplevel
+
+    for nb_apports, durees_credit, durees_amortissement in GRILLES_FINANCEMENT:
+        nb_structures = nb_apports * len(durees_credit) * 2 * len(durees_amortissement)
+        for objectif in ('tri', 'valeur_nette'):
+            def preparer(nb_apports=nb_apports, durees_credit=durees_credit,
+                         durees_amortissement=durees_amortissement, objectif=objectif):
+                apports = np.linspace(0, 150000, nb_apports)
+                return lambda: optimiser_financement(_parametres(), apports, durees_credit,
+                                                     durees_amortissement=durees_amortissement, objectif=objectif)
+
+            yield Cas("financement", f"financement_{objectif}_{nb_structures}", preparer,
+                      lourd=nb_structures >= LOT_LOURD)
+
+
+def cas_stockage():
+    """Base de scénarios : enregistrement de lots, recherche indexée et comparaison de détails compressés"""
+    from sci_previsionnel.stockage import BaseScenarios  # pylint: disable=import-outside-toplevel
+    chemin = os.path.join(tempfile.gettempdir(), f'benchmark_sci_{os.getpid()}.sqlite')
+
+    def supprimer_base():
+        for suffixe in ('', '-wal', '-shm'):
+            if os.path.exists(chemin + suffixe):
+                os.remove(chemin + suffixe)
+
+    for taille in TAILLES_STOCKAGE:
+        def preparer(taille=taille):
+            scenarios = scenarios_aleatoires(taille)
+
+            def enregistrer():
+                base = BaseScenarios(chemin)
+                base.enregistrer_lot(scenarios)
+                base.fermer()
+                supprimer_base()
+            return enregistrer
+
+        yield Cas("stockage", f"stockage_enregistrer_{taille}", preparer, lourd=taille >= STOCKAGE_LOURD)
+
+    def base_remplie():
+        supprimer_base()
+        atexit.register(supprimer_base)
+        base = BaseScenarios(chemin)
+        return base, base.enregistrer_lot(scenarios_aleatoires(max(TAILLES_STOCKAGE)))
+
+    def recherche():
+        base, _ = base_remplie()
+        return lambda: base.rechercher({'tri': (5, None), 'premiere_annee_is': (None, 5)}, ordre='valeur_nette',
+                                       limite=100)
+
+    def comparaison():
+        base, identifiants = base_remplie()
+        return lambda: base.comparer(identifiants[::100], 'cashflow_cumule')
+
+    yield Cas("stockage", f"stockage_recherche_{max(TAILLES_STOCKAGE)}", recherche)
+    yield Cas("stockage", "stockage_comparaison_100", comparaison)
+
+
+def cas_export():
+    """Exports (export_excel_with_inputs) : une simulation dans chaque format, puis des lots en Excel"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.export import exporter_en_octets, exporter_excel  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.lot import simuler_lot  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.pret import echeancier_pret  # pylint: disable=import-outside-toplevel
+    from sci_previsionnel.projection import projeter  # pylint: disable=import-outside-toplevel
+
+    def export_simulation(format_sortie):
+        params = _parametres(duree_projection=40)
+        tableaux = {
+            "Prévisionnel": projeter(params).to_dataframe(),
+            "Paramètres": pd.DataFrame({"Paramètre": list(params), "Valeur": list(params.values())}),
+            "Échéancier mensuel": echeancier_pret(params['emprunt'], params['taux_credit'],
+                                                  params['duree_credit']).to_dataframe(),
+        }
+        return lambda: exporter_en_octets(tableaux, format_sortie)
+
+    for format_sortie in ('xlsx', 'csv', 'parquet'):
+        yield Cas("export", f"export_simulation_{format_sortie}",
+                  lambda format_sortie=format_sortie: export_simulation(format_sortie))
+
+    def export_lot(taille):
+        lot = simuler_lot(scenarios_aleatoires(taille), details=True)
+        chemin = os.path.join(tempfile.gettempdir(), f'benchmark_sci_{os.getpid()}.xlsx')
+
+        def exporter():
+            exporter_excel(chemin, {"Synthèse": lot.resume, "Détail": lot.blocs()})
+            os.remove(chemin)
+        return exporter
+
+    for taille in TAILLES_EXPORT_LOT:
+        yield Cas("export", f"export_lot_{taille}_xlsx", lambda taille=taille: export_lot(taille),
+                  lourd=taille >= EXPORT_LOURD)
+
+
+def _simulation_affichee():
+    """Application rendue dans AppTest (sans navigateur), résultats affichés en mode live"""
+    from streamlit.testing.v1 import AppTest  # pylint: disable=import-outside-toplevel
+
+    application = AppTest.from_file(SCRIPT_APPLICATION, default_timeout=600)
+    application.run()
+    # En mode live, chaque relance réaffiche les résultats (le bouton, lui, ne vaut que pour une exécution)
+    next(case for case in application.checkbox if 'Mode live' in case.label).check()
+    application.run()
+    if application.exception:
+        raise RuntimeError(f"Erreur dans l'application : {application.exception}")
+    return application
+
+
+def cas_application():
+    """Rendu complet de l'application sans navigateur (streamlit.testing), à froid puis en relance"""
+    try:
+        import streamlit.testing.v1  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return
+    from sci_previsionnel.cache import cache_defaut  # pylint: disable=import-outside-toplevel
+
+    def rendu_froid():
+        cache_defaut().vider()
+        return _simulation_affichee()
+
+    yield Cas("application", "application_rendu_froid", lambda: rendu_froid)
+    yield Cas("application", "application_relance", lambda: _simulation_affichee().run)
+
+
+def cas_demarrage():
+    """Démarrage à froid : import du moteur, préchauffage, page d'accueil et première simulation
+
+    Chaque mesure lance un nouvel interpréteur (dépendances jamais importées),
+    démarrage de Python compris : demarrage_interpreteur en donne la part. Le
+    préchauffage est désactivé dans l'application, pour mesurer une première
+    simulation lancée sans attendre. Le pic mémoire relevé est celui du
+    processus de mesure, pas de l'interpréteur lancé.
+    """
+    try:
+        import streamlit.testing.v1  # pylint: disable=import-outside-toplevel,unused-import
+        application = True
+    except ImportError:
+        application = False
+    racine = os.path.dirname(SCRIPT_APPLICATION)
+    base = os.path.join(tempfile.gettempdir(), f'benchmark_sci_demarrage_{os.getpid()}.sqlite')
+
+    def supprimer_base():
+        for suffixe in ('', '-wal', '-shm'):
+            if os.path.exists(base + suffixe):
+                os.remove(base + suffixe)
+
+    environnement = {**os.environ, 'SCI_BASE_SCENARIOS': base,
+                     'PYTHONPATH': os.pathsep.join(filter(None, [racine, os.environ.get('PYTHONPATH')]))}
+    for nom, code in DEMARRAGES:
+        if 'AppTest' in code and not application:
+            continue
+
+        def preparer(code=code):
+            atexit.register(supprimer_base)
+            variables = {**environnement, 'SCI_PRECHAUFFAGE': '0'} if 'AppTest' in code else environnement
+            return lambda: subprocess.run([sys.executable, '-c', code], cwd=racine, env=variables,
+                                          check=True, capture_output=True)
+
+        yield Cas("demarrage", nom, preparer)
+
+
+GROUPES = {
+    "echeancier": cas_echeancier,
+    "projection": cas_projection,
+    "lot": cas_lot,
+    "monte_carlo": cas_monte_carlo,
+    "portefeuille": cas_portefeuille,
+    "objectifs": cas_objectifs,
+    "sensibilite": cas_sensibilite,
+    "sortie": cas_sortie,
+    "financement": cas_financement,
+    "stockage": cas_stockage,
+    "export": cas_export,
+    "application": cas_application,
+    "demarrage": cas_demarrage,
+}
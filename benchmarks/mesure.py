@@ -0,0 +1,96 @@
+"""Mesure d'un cas de benchmark : temps, pic mémoire et allocations"""
+import gc
+import statistics
+import time
+import tracemalloc
+
+
+# Durée minimale d'un échantillon : les appels plus courts sont regroupés par lots (comme timeit)
+DUREE_ECHANTILLON = 0.01
+# En deçà de cet écart absolu (octets), une hausse du pic mémoire n'est pas une régression
+TOLERANCE_MEMOIRE = 64 * 2 ** 10
+
+
+def mesurer(fonction, repetitions=5, budget=2.0):
+    """Mesure fonction() et renvoie un dictionnaire de résultats sérialisable en JSON
+
+    Le temps est mesuré sans traçage mémoire sur au plus repetitions
+    échantillons (moins si le budget en secondes est dépassé) ; un échantillon
+    regroupe assez d'appels pour durer au moins DUREE_ECHANTILLON. Une
+    exécution supplémentaire sous tracemalloc relève le pic mémoire Python et
+    NumPy au-dessus de l'état initial, ainsi que le nombre de blocs et
+    d'octets alloués encore vivants à la fin de l'appel.
+    """
+    gc.collect()
+    appels = 1
+    while True:
+        debut = time.perf_counter()
+        for _ in range(appels):
+            fonction()
+        duree = time.perf_counter() - debut
+        if duree >= DUREE_ECHANTILLON or appels >= 10 ** 6:
+            break
+        appels *= 10
+
+    durees = [duree / appels]
+    debut_total = time.perf_counter()
+    while len(durees) < max(1, repetitions) and time.perf_counter() - debut_total < budget:
+        debut = time.perf_counter()
+        for _ in range(appels):
+            fonction()
+        durees.append((time.perf_counter() - debut) / appels)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        avant = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        memoire_initiale = tracemalloc.get_traced_memory()[0]
+        resultat = fonction()
+        pic = tracemalloc.get_traced_memory()[1] - memoire_initiale
+        apres = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    differences = apres.compare_to(avant, 'filename')
+    del resultat
+
+    return {
+        "repetitions": len(durees),
+        "appels_par_repetition": appels,
+        "temps_min_s": min(durees),
+        "temps_median_s": statistics.median(durees),
+        "temps_moyen_s": statistics.fmean(durees),
+        "temps_ecart_type_s": statistics.stdev(durees) if len(durees) > 1 else 0.0,
+        "memoire_pic_octets": pic,
+        "allocations_blocs": sum(max(stat.count_diff, 0) for stat in differences),
+        "allocations_octets": sum(max(stat.size_diff, 0) for stat in differences),
+    }
+
+
+def comparer(resultats, reference, seuil_temps=0.25, seuil_memoire=0.25):
+    """Compare des résultats à une référence ; renvoie les lignes du rapport et les régressions
+
+    Un cas régresse si son temps minimal (le moins sensible au bruit de la
+    machine) dépasse celui de la référence de plus de seuil_temps
+    (proportion), ou son pic mémoire de plus de seuil_memoire et de plus de
+    TOLERANCE_MEMOIRE octets. Les cas absents de la référence sont signalés
+    sans être comptés comme des régressions.
+    """
+    lignes, regressions = [], []
+    for nom, mesure in resultats.items():
+        base = reference.get(nom)
+        if base is None:
+            lignes.append((nom, mesure["temps_min_s"], None, mesure["memoire_pic_octets"], None, "nouveau"))
+            continue
+        ratio_temps = mesure["temps_min_s"] / base["temps_min_s"] if base["temps_min_s"] else 1.0
+        ratio_memoire = (mesure["memoire_pic_octets"] / base["memoire_pic_octets"]
+                         if base["memoire_pic_octets"] else 1.0)
+        statut = "ok"
+        hausse_memoire = mesure["memoire_pic_octets"] - base["memoire_pic_octets"]
+        if ratio_temps > 1 + seuil_temps or (ratio_memoire > 1 + seuil_memoire
+                                             and hausse_memoire > TOLERANCE_MEMOIRE):
+            statut = "RÉGRESSION"
+            regressions.append(nom)
+        lignes.append((nom, mesure["temps_min_s"], ratio_temps, mesure["memoire_pic_octets"], ratio_memoire,
+                       statut))
+    return lignes, regressions
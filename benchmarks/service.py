@@ -0,0 +1,121 @@
+"""Test de charge du service local : python -m benchmarks.service [--duree 5] [--clients 32]
+
+Démarre le service dans un sous-processus (port libre), puis des clients
+asyncio en keep-alive envoient des requêtes en boucle pendant la durée
+donnée. Pour chaque charge : débit (requêtes/s), latences p50/p95/p99 et
+nombre de refus (503).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .cas import PARAMETRES_REFERENCE, scenarios_aleatoires
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _analyser_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.service',
+        description="Mesure le débit et les latences du service HTTP local sous charge."
+    )
+    parser.add_argument('--duree', type=float, default=5.0, help="durée de chaque charge en secondes (défaut : 5)")
+    parser.add_argument('--clients', type=int, default=32, help="connexions simultanées (défaut : 32)")
+    parser.add_argument('--workers', type=int, default=None, help="processus de calcul du service (défaut : un par cœur)")
+    parser.add_argument('--file-max', type=int, default=16, help="file d'attente du pool du service (défaut : 16)")
+    parser.add_argument('--sortie', help="fichier JSON où enregistrer les résultats")
+    return parser.parse_args(argv)
+
+
+def _corps_lot(nb_scenarios, graine):
+    scenarios = scenarios_aleatoires(nb_scenarios, graine)
+    return json.dumps({"scenarios": {cle: valeurs.tolist() for cle, valeurs in scenarios.items()}}).encode()
+
+
+def _charges():
+    """Charges mesurées : nom -> (chemin, fonction renvoyant le corps de la n-ième requête)"""
+    projection = json.dumps(PARAMETRES_REFERENCE).encode()
+    lots_100 = [_corps_lot(100, graine) for graine in range(50)]
+    lots_5000 = [_corps_lot(5000, graine) for graine in range(8)]
+    return {
+        "projection_cache": ('/projection', lambda n: projection),
+        "projection_variee": ('/projection', lambda n: json.dumps(
+            {**PARAMETRES_REFERENCE, 'loyers_mensuels': 800 + n % 100000 / 100}).encode()),
+        # Corps variés mais réutilisés : mêlent calculs dans le pool et réponses en cache
+        "lot_100": ('/lot', lambda n: lots_100[n % len(lots_100)]),
+        "lot_5000": ('/lot', lambda n: lots_5000[n % len(lots_5000)]),
+    }
+
+
+async def _requete(lecteur, ecrivain, chemin, corps):
+    ecrivain.write((f"POST {chemin} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(corps)}\r\n\r\n").encode() + corps)
+    await ecrivain.drain()
+    statut = int((await lecteur.readline()).split()[1])
+    longueur = 0
+    while (entete := await lecteur.readline()) != b'\r\n':
+        nom, _, valeur = entete.decode('latin-1').partition(':')
+        if nom.lower() == 'content-length':
+            longueur = int(valeur)
+    await lecteur.readexactly(longueur)
+    return statut
+
+
+async def _client(port, chemin, corps, fin, compteur, latences, statuts):
+    lecteur, ecrivain = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < fin:
+            n = next(compteur)
+            debut = time.perf_counter()
+            statut = await _requete(lecteur, ecrivain, chemin, corps(n))
+            latences.append(time.perf_counter() - debut)
+            statuts[statut] = statuts.get(statut, 0) + 1
+    finally:
+        ecrivain.close()
+
+
+async def _charger(port, chemin, corps, nb_clients, duree):
+    """Exécute une charge et renvoie ses mesures"""
+    compteur = iter(range(10 ** 12))
+    latences, statuts = [], {}
+    debut = time.perf_counter()
+    await asyncio.gather(*(_client(port, chemin, corps, debut + duree, compteur, latences, statuts)
+                           for _ in range(nb_clients)))
+    ecoule = time.perf_counter() - debut
+    p50, p95, p99 = np.percentile(np.array(latences) * 1000, [50, 95, 99])
+    return {"requetes": len(latences), "debit_rps": len(latences) / ecoule, "p50_ms": p50, "p95_ms": p95,
+            "p99_ms": p99, "refus": statuts.get(503, 0), "statuts": statuts}
+
+
+def main(argv=None):
+    """Démarre le service, mesure chaque charge et affiche les résultats"""
+    args = _analyser_arguments(argv)
+    commande = [sys.executable, '-m', 'sci_previsionnel.service', '--port', '0', '--file-max', str(args.file_max)]
+    if args.workers:
+        commande += ['--workers', str(args.workers)]
+    service = subprocess.Popen(commande, cwd=RACINE, stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(service.stdout.readline().split('http://')[1].split()[0].rsplit(':', 1)[1])
+        resultats = {}
+        for nom, (chemin, corps) in _charges().items():
+            resultats[nom] = mesure = asyncio.run(_charger(port, chemin, corps, args.clients, args.duree))
+            print(f"{nom:<20} {mesure['debit_rps']:>9.1f} req/s  p50 {mesure['p50_ms']:>8.2f} ms  "
+                  f"p95 {mesure['p95_ms']:>8.2f} ms  p99 {mesure['p99_ms']:>8.2f} ms  {mesure['refus']:>6} refus",
+                  file=sys.stderr)
+    finally:
+        service.terminate()
+        service.wait()
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Moteur de calcul du prévisionnel d'une SCI à l'IS, indépendant de l'interface Streamlit
+
+L'import du paquet ne charge que la bibliothèque standard : chaque module
+(et NumPy avec lui) n'est importé qu'au premier accès à l'un de ses noms
+(PEP 562), pandas qu'à la construction des DataFrame. Une application peut
+ainsi afficher sa page d'accueil avant d'avoir chargé le moteur, que
+demarrage.prechauffer() importe en arrière-plan.
+"""
+from . import instrumentation
+from .demarrage import nb_workers_defaut, prechauffer
+
+# Noms exportés par le paquet, par module : importés à la demande
+_EXPORTS = {
+    'pret': (
+        'PARAMETRES_PRET', 'Echeancier', 'EcheancierGeneral', 'echeancier_depuis_params', 'echeancier_general',
+        'echeancier_pret', 'flux_pret_annuels', 'flux_pret_general_annuels', 'flux_pret_variable', 'options_pret',
+        'taux_indexes'
+    ),
+    'projection': (
+        'COLONNES_PROJECTION', 'SEUIL_IS', 'TAUX_IS_NORMAL', 'TAUX_IS_REDUIT', 'Projection', 'impot_societes',
+        'projeter', 'taux_rendement_interne'
+    ),
+    'lot': ('COLONNES_RESUME', 'PARAMETRES_DEFAUT', 'PARAMETRES_SCENARIO', 'ResultatLot', 'matrice_scenarios',
+            'options_scenarios', 'simuler_lot'),
+    'monte_carlo': ('ConfigMonteCarlo', 'HistogrammeQuantiles', 'Loi', 'ResultatMonteCarlo', 'simuler_monte_carlo'),
+    'portefeuille': ('PARAMETRES_LOT', 'ResultatPortefeuille', 'projeter_portefeuille'),
+    'objectifs': ('INDICATEURS_OBJECTIF', 'VARIABLES_OBJECTIF', 'ResultatObjectif', 'resoudre_objectif'),
+    'sensibilite': (
+        'INDICATEURS_SENSIBILITE', 'PARAMETRES_SENSIBILITE', 'ResultatGrille', 'ResultatTornade', 'analyse_tornade',
+        'evaluer_variantes', 'grille_sensibilite'
+    ),
+    'financement': ('COLONNES_FINANCEMENT', 'OBJECTIFS_FINANCEMENT', 'TYPES_PRET', 'ResultatFinancement',
+                    'front_pareto', 'optimiser_financement'),
+    'sortie': ('COLONNES_SORTIE', 'CRITERES_SORTIE', 'ResultatSortie', 'analyser_sortie'),
+    'incremental': ('ETAPES', 'PipelineIncremental'),
+    'cache': ('CacheResultats', 'cache_defaut', 'cle_projection', 'echeancier_en_cache', 'empreinte',
+              'projeter_en_cache'),
+    'stockage': ('INDICATEURS_INDEXES', 'INDICATEURS_STOCKES', 'BaseScenarios', 'base_defaut'),
+    'export': ('EcrivainResultats', 'exporter_en_octets', 'exporter_excel', 'exporter_tableau', 'format_fichier'),
+    'parallele': ('executer_lot', 'executer_monte_carlo'),
+    'service': ('ServiceSimulation',),
+}
+
+_IMPORTS_DIFFERES = {nom: module for module, noms in _EXPORTS.items() for nom in noms}
+
+__all__ = ['instrumentation', 'nb_workers_defaut', 'prechauffer', *_IMPORTS_DIFFERES]
+
+
+def __getattr__(nom):
+    """Importe à la demande le module qui définit un nom exporté (PEP 562)"""
+    if nom in _IMPORTS_DIFFERES:
+        import importlib  # pylint: disable=import-outside-toplevel
+        valeur = getattr(importlib.import_module(f'.{_IMPORTS_DIFFERES[nom]}', __name__), nom)
+        # Les accès suivants ne repassent plus par __getattr__
+        globals()[nom] = valeur
+        return valeur
+    raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,6 @@
+"""Point d'entrée : python -m sci_previsionnel"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
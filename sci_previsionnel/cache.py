@@ -0,0 +1,234 @@
+"""Cache de résultats à deux niveaux : LRU en mémoire et SQLite partagé sur disque
+
+Les entrées sont indexées par une empreinte canonique des paramètres
+normalisés (ordre des clés, types numériques, bruit d'arrondi), si bien que
+deux saisies équivalentes partagent le même résultat. L'échéancier du prêt est
+mis en cache séparément, sur la seule clé (montant, taux, durée), et réutilisé
+par toutes les projections qui partagent ce financement.
+
+Le niveau disque est facultatif : une base SQLite en mode WAL, partageable
+entre processus et répliques, dont la taille est bornée par éviction des
+entrées les moins récemment utilisées.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .lot import PARAMETRES_DEFAUT, PARAMETRES_SCENARIO
+from .pret import echeancier_general, echeancier_pret, options_pret
+from .projection import projeter
+
+# Marque d'une entrée absente (None est une valeur valide)
+_ABSENT = object()
+
+# Chiffres significatifs conservés pour l'empreinte : absorbe le bruit d'arrondi des saisies (2.5 / 100...)
+CHIFFRES_SIGNIFICATIFS = 12
+
+
+def normaliser(valeur):
+    """Ramène une valeur de paramètre à une forme canonique sérialisable en JSON"""
+    if isinstance(valeur, dict):
+        return {str(cle): normaliser(v) for cle, v in sorted(valeur.items())}
+    if isinstance(valeur, (list, tuple)):
+        return [normaliser(v) for v in valeur]
+    if isinstance(valeur, str) or valeur is None:
+        return valeur
+    # Entiers, flottants, booléens et scalaires NumPy : même empreinte pour 20, 20.0 et np.int64(20)
+    return float(f"{float(valeur):.{CHIFFRES_SIGNIFICATIFS}g}")
+
+
+def empreinte(espace, valeur):
+    """Empreinte canonique (hexadécimale) d'une valeur normalisée dans un espace de noms"""
+    contenu = json.dumps([espace, normaliser(valeur)], separators=(',', ':'))
+    return hashlib.blake2b(contenu.encode('utf-8'), digest_size=20).hexdigest()
+
+
+@dataclass
+class Statistiques:
+    """Compteurs d'utilisation du cache"""
+    succes_memoire: int = 0
+    succes_disque: int = 0
+    echecs: int = 0
+    evictions_memoire: int = 0
+    evictions_disque: int = 0
+
+    @property
+    def taux_succes(self):
+        """Part des lectures servies par le cache (mémoire ou disque)"""
+        total = self.succes_memoire + self.succes_disque + self.echecs
+        return (self.succes_memoire + self.succes_disque) / total if total else 0.0
+
+
+class CacheResultats:
+    """Cache LRU en mémoire, doublé d'un niveau SQLite optionnel partagé entre processus"""
+
+    def __init__(self, taille_max_memoire=64 * 2 ** 20, nb_max_entrees=10000,
+                 chemin_disque=None, taille_max_disque=1024 * 2 ** 20):
+        self.taille_max_memoire = taille_max_memoire
+        self.nb_max_entrees = nb_max_entrees
+        self.taille_max_disque = taille_max_disque
+        self.statistiques = Statistiques()
+        self._memoire = OrderedDict()
+        self._taille_memoire = 0
+        self._verrou = threading.RLock()
+        self._disque = None
+        if chemin_disque:
+            self._disque = sqlite3.connect(chemin_disque, timeout=30, check_same_thread=False,
+                                           isolation_level=None)
+            self._disque.execute("PRAGMA journal_mode=WAL")
+            self._disque.execute("PRAGMA synchronous=NORMAL")
+            self._disque.execute(
+                "CREATE TABLE IF NOT EXISTS resultats ("
+                "cle TEXT PRIMARY KEY, valeur BLOB NOT NULL, taille INTEGER NOT NULL, acces REAL NOT NULL)"
+            )
+            self._disque.execute("CREATE INDEX IF NOT EXISTS resultats_acces ON resultats (acces)")
+
+    def __len__(self):
+        return len(self._memoire)
+
+    def _stocker_memoire(self, cle, valeur, taille):
+        """Ajoute une entrée au niveau mémoire puis évince les plus anciennes au-delà des limites"""
+        if cle in self._memoire:
+            self._taille_memoire -= self._memoire.pop(cle)[1]
+        self._memoire[cle] = (valeur, taille)
+        self._taille_memoire += taille
+        while self._memoire and (self._taille_memoire > self.taille_max_memoire
+                                 or len(self._memoire) > self.nb_max_entrees):
+            _, (_, taille_evincee) = self._memoire.popitem(last=False)
+            self._taille_memoire -= taille_evincee
+            self.statistiques.evictions_memoire += 1
+
+    def _lire_disque(self, cle):
+        ligne = self._disque.execute("SELECT valeur FROM resultats WHERE cle = ?", (cle,)).fetchone()
+        if ligne is None:
+            return None
+        self._disque.execute("UPDATE resultats SET acces = ? WHERE cle = ?", (time.time(), cle))
+        return ligne[0]
+
+    def _ecrire_disque(self, cle, donnees):
+        self._disque.execute(
+            "INSERT OR REPLACE INTO resultats (cle, valeur, taille, acces) VALUES (?, ?, ?, ?)",
+            (cle, donnees, len(donnees), time.time())
+        )
+        taille_totale = self._disque.execute("SELECT COALESCE(SUM(taille), 0) FROM resultats").fetchone()[0]
+        while taille_totale > self.taille_max_disque:
+            ligne = self._disque.execute(
+                "SELECT cle, taille FROM resultats WHERE cle != ? ORDER BY acces LIMIT 1", (cle,)
+            ).fetchone()
+            if ligne is None:
+                break
+            self._disque.execute("DELETE FROM resultats WHERE cle = ?", (ligne[0],))
+            taille_totale -= ligne[1]
+            self.statistiques.evictions_disque += 1
+
+    def lire(self, cle, defaut=None):
+        """Valeur associée à cle (mémoire puis disque), ou defaut si elle est absente"""
+        with self._verrou:
+            if cle in self._memoire:
+                self._memoire.move_to_end(cle)
+                self.statistiques.succes_memoire += 1
+                return self._memoire[cle][0]
+            if self._disque is not None:
+                donnees = self._lire_disque(cle)
+                if donnees is not None:
+                    valeur = pickle.loads(donnees)
+                    self._stocker_memoire(cle, valeur, len(donnees))
+                    self.statistiques.succes_disque += 1
+                    return valeur
+            self.statistiques.echecs += 1
+        return defaut
+
+    def ecrire(self, cle, valeur):
+        """Enregistre la valeur de cle dans les deux niveaux"""
+        donnees = pickle.dumps(valeur, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._verrou:
+            self._stocker_memoire(cle, valeur, len(donnees))
+            if self._disque is not None:
+                self._ecrire_disque(cle, donnees)
+
+    def obtenir(self, cle, calcul):
+        """Renvoie la valeur associée à cle, en la calculant avec calcul() si elle est absente"""
+        valeur = self.lire(cle, _ABSENT)
+        if valeur is _ABSENT:
+            valeur = calcul()
+            self.ecrire(cle, valeur)
+        return valeur
+
+    def vider(self):
+        """Vide les deux niveaux du cache"""
+        with self._verrou:
+            self._memoire.clear()
+            self._taille_memoire = 0
+            if self._disque is not None:
+                self._disque.execute("DELETE FROM resultats")
+
+    def fermer(self):
+        """Ferme la base SQLite du niveau disque"""
+        with self._verrou:
+            if self._disque is not None:
+                self._disque.close()
+                self._disque = None
+
+
+_CACHE_DEFAUT = None
+
+
+def cache_defaut():
+    """Cache partagé du processus, configuré par variables d'environnement
+
+    SCI_CACHE_MEMOIRE_MO fixe la taille du niveau mémoire (64 Mo par défaut),
+    SCI_CACHE_DISQUE le chemin de la base SQLite partagée (pas de niveau disque
+    si absent) et SCI_CACHE_DISQUE_MO sa taille maximale (1 Go par défaut).
+    """
+    global _CACHE_DEFAUT  # pylint: disable=global-statement
+    if _CACHE_DEFAUT is None:
+        _CACHE_DEFAUT = CacheResultats(
+            taille_max_memoire=int(float(os.environ.get('SCI_CACHE_MEMOIRE_MO', 64)) * 2 ** 20),
+            chemin_disque=os.environ.get('SCI_CACHE_DISQUE') or None,
+            taille_max_disque=int(float(os.environ.get('SCI_CACHE_DISQUE_MO', 1024)) * 2 ** 20)
+        )
+    return _CACHE_DEFAUT
+
+
+def echeancier_en_cache(montant, taux_annuel, duree_annees, cache=None, **options):
+    """Échéancier du prêt, mis en cache sur la clé (montant, taux, durée) et ses options de structure
+
+    Sans option (différé, in fine, assurance, remboursement anticipé : voir
+    echeancier_general), c'est l'échéancier à annuités constantes.
+    """
+    if cache is None:
+        cache = cache_defaut()
+    # Durée brute dans la clé : les échéanciers comptent les mois au plus proche (20,5 ans : 246 mois)
+    if not options:
+        cle = empreinte('echeancier', [montant, taux_annuel, float(duree_annees)])
+        return cache.obtenir(cle, lambda: echeancier_pret(montant, taux_annuel, duree_annees))
+    cle = empreinte('echeancier', [montant, taux_annuel, float(duree_annees), options])
+    return cache.obtenir(cle, lambda: echeancier_general(montant, taux_annuel, duree_annees, **options))
+
+
+def cle_projection(params_f):
+    """Clé de la projection de params_f dans le cache, sur les seuls paramètres qui l'influencent"""
+    parametres = {cle: params_f.get(cle, PARAMETRES_DEFAUT.get(cle)) for cle in PARAMETRES_SCENARIO}
+    options = options_pret(params_f)
+    if options:
+        parametres['pret'] = options
+    return empreinte('projection', parametres)
+
+
+def projeter_en_cache(params_f, cache=None):
+    """Projection mise en cache sur les seuls paramètres qui l'influencent"""
+    if cache is None:
+        cache = cache_defaut()
+
+    def calcul():
+        echeancier = echeancier_en_cache(params_f['emprunt'], params_f['taux_credit'],
+                                         params_f['duree_credit'], cache, **options_pret(params_f))
+        return projeter(params_f, echeancier)
+
+    return cache.obtenir(cle_projection(params_f), calcul)
@@ -0,0 +1,95 @@
+"""Simulation par lot en ligne de commande, sans Streamlit
+
+Les scénarios sont lus par blocs depuis un fichier CSV ou Parquet (une ligne
+par scénario, colonnes nommées comme les clés du dictionnaire params), calculés
+bloc par bloc puis écrits au fil de l'eau : la mémoire utilisée dépend de la
+taille des blocs, pas du nombre de lignes du fichier. Les résultats peuvent
+aussi être écrits dans un classeur Excel, en mémoire constante.
+
+    python -m sci_previsionnel scenarios.csv resultats.parquet --colonnes id
+"""
+import argparse
+import sys
+
+from .export import EcrivainResultats, format_fichier
+from .lot import PARAMETRES_DEFAUT, PARAMETRES_SCENARIO
+
+
+def lire_blocs(chemin, taille_bloc):
+    """Lit un fichier de scénarios par blocs de taille_bloc lignes (DataFrame indexés en continu)"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    if format_fichier(chemin) == 'csv':
+        yield from pd.read_csv(chemin, chunksize=taille_bloc)
+        return
+
+    try:
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("La lecture Parquet nécessite pyarrow (pip install pyarrow)") from exc
+    debut = 0
+    for lot in pq.ParquetFile(chemin).iter_batches(batch_size=taille_bloc):
+        bloc = lot.to_pandas()
+        bloc.index = pd.RangeIndex(debut, debut + len(bloc))
+        debut += len(bloc)
+        yield bloc
+
+
+def _analyser_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m sci_previsionnel',
+        description="Calcule par lot des scénarios de SCI à l'IS depuis un fichier CSV ou Parquet."
+    )
+    parser.add_argument('entree', help="fichier de scénarios (.csv ou .parquet)")
+    parser.add_argument('sortie', help="fichier de résultats (.csv, .parquet ou .xlsx)")
+    parser.add_argument('--taille-bloc', type=int, default=100000,
+                        help="nombre de scénarios lus et calculés à la fois (défaut : 100000)")
+    parser.add_argument('--details', action='store_true',
+                        help="écrit le détail année par année au lieu de la synthèse par scénario")
+    parser.add_argument('--colonnes', default='',
+                        help="colonnes d'entrée à recopier dans la sortie, séparées par des virgules")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="nombre de processus de calcul (défaut : 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Point d'entrée de la ligne de commande ; renvoie le code de sortie"""
+    args = _analyser_arguments(argv)
+    colonnes_copiees = [colonne for colonne in args.colonnes.split(',') if colonne]
+
+    from .parallele import executer_lot  # pylint: disable=import-outside-toplevel
+
+    try:
+        if format_fichier(args.entree) == 'xlsx':
+            raise ValueError(f"Les scénarios doivent être fournis en CSV ou en Parquet : {args.entree}")
+        ecrivain = EcrivainResultats(args.sortie)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    nb_scenarios = 0
+    try:
+        for bloc in lire_blocs(args.entree, args.taille_bloc):
+            manquantes = [cle for cle in PARAMETRES_SCENARIO
+                          if cle not in bloc.columns and cle not in PARAMETRES_DEFAUT]
+            manquantes += [colonne for colonne in colonnes_copiees if colonne not in bloc.columns]
+            if manquantes:
+                print(f"Colonnes manquantes dans {args.entree} : {', '.join(manquantes)}", file=sys.stderr)
+                return 2
+
+            resultat = executer_lot(bloc, nb_workers=args.workers, details=args.details)
+            if args.details:
+                sortie = resultat.to_dataframe()
+                copie = bloc.loc[sortie['Scénario'], colonnes_copiees].reset_index(drop=True)
+            else:
+                sortie = resultat.resume.rename_axis('Scénario').reset_index()
+                copie = bloc[colonnes_copiees].reset_index(drop=True)
+            for position, colonne in enumerate(colonnes_copiees):
+                sortie.insert(1 + position, colonne, copie[colonne])
+            ecrivain.ecrire(sortie)
+            nb_scenarios += len(bloc)
+    finally:
+        ecrivain.fermer()
+
+    print(f"{nb_scenarios} scénarios calculés -> {args.sortie}", file=sys.stderr)
+    return 0
@@ -0,0 +1,76 @@
+"""Démarrage à froid : ce dont l'application a besoin avant toute simulation
+
+Comme instrumentation, le module n'importe que la bibliothèque standard :
+la page d'accueil et la barre latérale s'affichent sans charger NumPy,
+pandas ni Plotly. prechauffer() charge ensuite ces dépendances et le
+moteur dans un thread d'arrière-plan, et calcule une projection de
+référence, pendant que l'utilisateur saisit ses paramètres : la première
+simulation ne paie plus ces imports.
+"""
+import importlib
+import os
+import sys
+import threading
+
+from .instrumentation import etape
+
+# Dépendances de l'application chargées par le préchauffage (Plotly et pandas sont facultatifs pour le moteur)
+DEPENDANCES_PRECHAUFFEES = ('numpy', 'pandas', 'plotly.graph_objects', 'plotly.subplots')
+# Modules du moteur chargés par le préchauffage (constantes calculées à l'import comprises)
+MODULES_PRECHAUFFES = ('pret', 'projection', 'lot', 'monte_carlo', 'sensibilite', 'sortie', 'financement',
+                       'incremental', 'cache', 'stockage', 'export')
+# Bien de référence projeté au préchauffage (paramètres par défaut de l'application)
+PARAMETRES_PRECHAUFFAGE = {
+    'prix_achat': 200000, 'frais_notaire': 15000, 'travaux': 20000, 'pourcentage_terrain': 0.2,
+    'loyers_mensuels': 1200, 'revalorisation_loyers': 0.015, 'appreciation_immobilier': 0.01,
+    'indexation_charges': 0.02, 'apport': 20000, 'emprunt': 215000, 'taux_credit': 0.025,
+    'duree_credit': 20, 'taxe_fonciere': 1000, 'assurance': 200, 'frais_gestion': 500, 'entretien': 1300,
+    'frais_comptable': 1200, 'duree_projection': 20, 'duree_amortissement': 20
+}
+
+_PRECHAUFFAGE = None
+_VERROU = threading.Lock()
+
+
+def nb_workers_defaut():
+    """Nombre de processus par défaut : un par cœur disponible"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _prechauffer():
+    """Importe les dépendances et le moteur, puis projette le bien de référence jusqu'au DataFrame"""
+    with etape('prechauffage'):
+        for module in DEPENDANCES_PRECHAUFFEES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+        for module in MODULES_PRECHAUFFES:
+            importlib.import_module(f'.{module}', __package__)
+        # Premiers appels de NumPy et de pandas (chemins de code chargés à la demande), hors du cache
+        # de résultats pour ne pas fausser ses statistiques
+        projection = importlib.import_module('.projection', __package__)
+        resultat = projection.projeter(PARAMETRES_PRECHAUFFAGE)
+        if 'pandas' in sys.modules:
+            resultat.to_dataframe()
+
+
+def prechauffer(attendre=False):
+    """Lance le préchauffage une fois par processus, dans un thread d'arrière-plan, et renvoie ce thread
+
+    Les appels suivants renvoient le même thread. Avec attendre, l'appel
+    rend la main une fois le préchauffage terminé. SCI_PRECHAUFFAGE=0 le
+    désactive (None est alors renvoyé).
+    """
+    global _PRECHAUFFAGE  # pylint: disable=global-statement
+    if os.environ.get('SCI_PRECHAUFFAGE', '1') in ('', '0'):
+        return None
+    with _VERROU:
+        if _PRECHAUFFAGE is None:
+            _PRECHAUFFAGE = threading.Thread(target=_prechauffer, name='prechauffage', daemon=True)
+            _PRECHAUFFAGE.start()
+    if attendre:
+        _PRECHAUFFAGE.join()
+    return _PRECHAUFFAGE
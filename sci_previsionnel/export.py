@@ -0,0 +1,177 @@
+"""Export des résultats au fil de l'eau : Excel (mémoire constante), CSV et Parquet
+
+Les tableaux sont écrits bloc par bloc dans un fichier, sans jamais
+assembler le classeur complet en mémoire : xlsxwriter est utilisé en mode
+constant_memory (chaque ligne est écrite sur disque dès la suivante), le CSV
+est complété en mode ajout et le Parquet écrit par groupes de lignes.
+"""
+import os
+import tempfile
+
+from .instrumentation import instrumente
+
+# Nombre maximal de lignes d'une feuille Excel (en-tête compris)
+LIGNES_MAX_EXCEL = 1048576
+
+
+def format_fichier(chemin):
+    """Format d'un fichier d'après son extension ('csv', 'parquet' ou 'xlsx')"""
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    if extension == '.xlsx':
+        return 'xlsx'
+    raise ValueError(f"Format de fichier non reconnu : {chemin} (attendu .csv, .parquet ou .xlsx)")
+
+
+def _colonnes_python(bloc):
+    """Colonnes d'un DataFrame en listes de valeurs Python (None pour les valeurs manquantes)"""
+    colonnes = []
+    for nom in bloc.columns:
+        serie = bloc[nom]
+        valeurs = serie.tolist()
+        if serie.hasnans:
+            manquantes = serie.isna().tolist()
+            valeurs = [None if manque else v for v, manque in zip(valeurs, manquantes)]
+        colonnes.append(valeurs)
+    return colonnes
+
+
+class _FeuilleExcel:
+    """Feuille d'un classeur en mémoire constante, remplie ligne après ligne
+
+    Au-delà de la limite de lignes d'Excel, l'écriture se poursuit sur une
+    nouvelle feuille suffixée (« Résultats (2) »...) qui reprend l'en-tête.
+    """
+
+    def __init__(self, classeur, nom):
+        self.classeur = classeur
+        self.nom = nom[:31]
+        self._feuille = None
+        self._numero = 0
+        self._ligne = 0
+        self._entete = None
+
+    def _nouvelle_feuille(self):
+        self._numero += 1
+        suffixe = f" ({self._numero})" if self._numero > 1 else ""
+        self._feuille = self.classeur.add_worksheet(self.nom[:31 - len(suffixe)] + suffixe)
+        self._feuille.write_row(0, 0, self._entete)
+        self._ligne = 1
+
+    def ecrire(self, bloc):
+        """Ajoute les lignes d'un DataFrame à la feuille"""
+        if self._feuille is None:
+            self._entete = [str(colonne) for colonne in bloc.columns]
+            self._nouvelle_feuille()
+        for ligne in zip(*_colonnes_python(bloc)):
+            if self._ligne >= LIGNES_MAX_EXCEL:
+                self._nouvelle_feuille()
+            self._feuille.write_row(self._ligne, 0, ligne)
+            self._ligne += 1
+
+
+def _ouvrir_classeur(chemin):
+    """Classeur xlsxwriter en mode mémoire constante"""
+    try:
+        import xlsxwriter  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("L'export Excel nécessite xlsxwriter (pip install xlsxwriter)") from exc
+    return xlsxwriter.Workbook(chemin, {'constant_memory': True})
+
+
+class EcrivainResultats:
+    """Écrit les résultats bloc par bloc dans un fichier CSV, Parquet ou Excel"""
+
+    def __init__(self, chemin, feuille="Résultats"):
+        self.chemin = chemin
+        self.format = format_fichier(chemin)
+        self._parquet = None
+        self._classeur = None
+        self._feuille = None
+        self._premier_bloc = True
+        if self.format == 'xlsx':
+            self._classeur = _ouvrir_classeur(chemin)
+            self._feuille = _FeuilleExcel(self._classeur, feuille)
+
+    def ecrire(self, bloc):
+        """Ajoute un bloc de résultats au fichier"""
+        if self.format == 'csv':
+            bloc.to_csv(self.chemin, mode='w' if self._premier_bloc else 'a',
+                        header=self._premier_bloc, index=False, float_format='%.2f')
+        elif self.format == 'xlsx':
+            self._feuille.ecrire(bloc)
+        else:
+            import pyarrow as pa  # pylint: disable=import-outside-toplevel
+            import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+            table = pa.Table.from_pandas(bloc, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.chemin, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        self._premier_bloc = False
+
+    def fermer(self):
+        """Termine l'écriture (pied de fichier Parquet, archive du classeur Excel)"""
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._classeur is not None:
+            self._classeur.close()
+            self._classeur = None
+
+
+def _blocs(tableau):
+    """Un DataFrame seul ou un itérable de blocs, toujours vu comme une suite de blocs"""
+    return [tableau] if hasattr(tableau, 'columns') else tableau
+
+
+@instrumente()
+def exporter_excel(chemin, tableaux):
+    """Écrit un classeur Excel, une feuille par tableau, en mémoire constante
+
+    tableaux associe à chaque nom de feuille un DataFrame ou un itérable de
+    DataFrame (générateur de blocs, par exemple ResultatLot.blocs()) : les
+    blocs sont écrits et libérés un à un, dans l'ordre des feuilles.
+    """
+    classeur = _ouvrir_classeur(chemin)
+    try:
+        for nom, tableau in tableaux.items():
+            feuille = _FeuilleExcel(classeur, nom)
+            for bloc in _blocs(tableau):
+                feuille.ecrire(bloc)
+    finally:
+        classeur.close()
+
+
+@instrumente()
+def exporter_tableau(chemin, tableau):
+    """Écrit un tableau (DataFrame ou itérable de blocs) en CSV, Parquet ou Excel selon l'extension"""
+    ecrivain = EcrivainResultats(chemin)
+    try:
+        for bloc in _blocs(tableau):
+            ecrivain.ecrire(bloc)
+    finally:
+        ecrivain.fermer()
+
+
+def exporter_en_octets(tableaux, format_sortie='xlsx'):
+    """Contenu d'un export généré dans un fichier temporaire, pour un téléchargement
+
+    En Excel, toutes les feuilles de tableaux sont écrites ; en CSV et en
+    Parquet, seul le premier tableau l'est. Le fichier temporaire est supprimé
+    une fois relu.
+    """
+    descripteur, chemin = tempfile.mkstemp(suffix=f'.{format_sortie}')
+    os.close(descripteur)
+    try:
+        if format_sortie == 'xlsx':
+            exporter_excel(chemin, tableaux)
+        else:
+            exporter_tableau(chemin, next(iter(tableaux.values())))
+        with open(chemin, 'rb') as fichier:
+            return fichier.read()
+    finally:
+        os.remove(chemin)
@@ -0,0 +1,276 @@
+"""Optimisation de la structure de financement : apport, durée et type de prêt, durée d'amortissement
+
+Les structures candidates sont le produit des apports, des durées de
+crédit, des types de prêt et des durées d'amortissement proposés. Plutôt
+que de toutes les projeter, la recherche élague les branches infaisables :
+
+- la mensualité ne dépend que du prêt : la contrainte de mensualité
+  maximale est vérifiée par formule fermée, sans projection ;
+- à type, durée de crédit et durée d'amortissement fixés (une branche), le
+  cashflow annuel croît avec l'apport (un euro d'emprunt en moins réduit
+  l'échéance de plus que l'IS n'augmente) : l'apport minimal qui respecte la
+  contrainte de cashflow est trouvé par dichotomie sur la grille des
+  apports, toutes les branches avançant ensemble dans le noyau de calcul
+  par lot, et les apports inférieurs ne sont jamais projetés.
+
+Les structures restantes sont évaluées par blocs avec le noyau de calcul
+par lot (un échéancier par prêt distinct), réparties entre processus
+au-delà d'un seuil. Le front de Pareto compare l'objectif (TRI des fonds
+propres ou valeur nette à l'horizon) à l'apport mobilisé.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import etape, instrumente
+from .lot import PARAMETRES_DEFAUT, PARAMETRES_SCENARIO
+from .pret import _nb_mois, flux_pret_general_annuels, options_pret
+from .projection import _noyau_projection
+from .sensibilite import _lignes_distinctes, tri_fonds_propres
+
+TYPES_PRET = ('amortissable', 'in_fine')
+# Objectifs proposés : clé -> libellé
+OBJECTIFS_FINANCEMENT = {'tri': "TRI (%)", 'valeur_nette': "Valeur nette"}
+# Colonnes du tableau des structures : (libellé, attribut de ResultatFinancement)
+COLONNES_FINANCEMENT = [
+    ("Apport", "apports"),
+    ("Durée crédit", "durees_credit"),
+    ("Type de prêt", "types_pret"),
+    ("Durée d'amortissement", "durees_amortissement"),
+    ("Mensualité", "mensualites"),
+    ("Cashflow minimal", "cashflows_minimaux"),
+    ("TRI (%)", "tri"),
+    ("Valeur nette", "valeur_nette"),
+]
+# En dessous de ce nombre de structures à évaluer, le calcul reste dans le processus courant
+SEUIL_PARALLELE_FINANCEMENT = 20000
+
+
+@dataclass(frozen=True)
+class ResultatFinancement:
+    """Structures faisables évaluées (tableaux alignés), front de Pareto et compteurs de la recherche
+
+    pareto donne les positions des structures du front (objectif maximal
+    pour un apport donné), par apport croissant ; meilleure la position de
+    la structure qui maximise l'objectif (-1 si aucune n'est faisable).
+    """
+    objectif: str
+    apports: np.ndarray
+    durees_credit: np.ndarray
+    types_pret: np.ndarray
+    durees_amortissement: np.ndarray
+    mensualites: np.ndarray
+    cashflows_minimaux: np.ndarray
+    tri: np.ndarray
+    valeur_nette: np.ndarray
+    pareto: np.ndarray
+    meilleure: int
+    nb_structures: int
+    nb_evaluees: int
+    nb_elaguees: int
+
+    def to_dataframe(self, front=False):
+        """Tableau des structures faisables (ou du seul front de Pareto), de la meilleure à la moins bonne"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        tableau = pd.DataFrame({libelle: getattr(self, attribut) for libelle, attribut in COLONNES_FINANCEMENT})
+        if front:
+            return tableau.iloc[self.pareto].reset_index(drop=True)
+        libelle = OBJECTIFS_FINANCEMENT[self.objectif]
+        return tableau.sort_values([libelle, "Apport"], ascending=[False, True], kind='stable',
+                                   na_position='last').reset_index(drop=True)
+
+    @property
+    def structure_optimale(self):
+        """Meilleure structure sous forme de dictionnaire (None si aucune n'est faisable)"""
+        if self.meilleure < 0:
+            return None
+        return {attribut: getattr(self, attribut)[self.meilleure].item() for _, attribut in COLONNES_FINANCEMENT}
+
+
+def _mensualites(emprunt, taux_annuel, duree_annees, in_fine, taux_assurance=0.0):
+    """Mensualité hors différé (assurance sur le capital initial comprise), par formule fermée"""
+    taux_mensuel = np.asarray(taux_annuel, dtype=float) / 12
+    nb_mois = _nb_mois(duree_annees)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuite = np.where(taux_mensuel > 0, taux_mensuel / -np.expm1(-nb_mois * np.log1p(taux_mensuel)),
+                           1 / nb_mois)
+    return emprunt * (np.where(in_fine, taux_mensuel, annuite) + taux_assurance / 12)
+
+
+class _Recherche:
+    """Évaluation de structures (apport, durée de crédit, in fine, durée d'amortissement) d'un même bien"""
+
+    def __init__(self, params, options, taux_par_duree, taille_bloc):
+        self.base = np.array([float(params.get(cle, PARAMETRES_DEFAUT.get(cle))) for cle in PARAMETRES_SCENARIO])
+        # Besoin de financement : prix, frais de notaire et travaux, couverts par l'apport et l'emprunt
+        self.besoin = float(params['emprunt']) + float(params['apport'])
+        self.taux = float(params['taux_credit'])
+        self.taux_par_duree = taux_par_duree or {}
+        self.options = options
+        self.horizon = int(params['duree_projection'])
+        self.taille_bloc = taille_bloc
+
+    def taux_credit(self, durees_credit):
+        return np.array([float(self.taux_par_duree.get(int(duree), self.taux)) for duree in durees_credit])
+
+    def emprunts(self, apports):
+        return np.maximum(self.besoin - apports, 0.0)
+
+    def evaluer(self, structures):
+        """Indicateurs de structures (N, 4) : {'tri', 'valeur_nette', 'cashflow_minimal'}, tableaux (N,)"""
+        apports, durees_credit, in_fine, durees_amortissement = structures.T
+        matrice = np.tile(self.base, (len(structures), 1))
+        for cle, valeurs in [('apport', apports), ('emprunt', self.emprunts(apports)),
+                             ('taux_credit', self.taux_credit(durees_credit)), ('duree_credit', durees_credit),
+                             ('duree_amortissement', durees_amortissement)]:
+            matrice[:, PARAMETRES_SCENARIO.index(cle)] = valeurs
+        annees = np.arange(1, self.horizon + 1)
+        horizons = np.full(len(structures), self.horizon)
+
+        # Un échéancier par prêt distinct (emprunt, taux, durée, type), partagé entre durées d'amortissement
+        prets = np.column_stack([matrice[:, PARAMETRES_SCENARIO.index(cle)]
+                                 for cle in ('emprunt', 'taux_credit', 'duree_credit')] + [in_fine])
+        uniques, inverse = _lignes_distinctes(prets)
+        flux = flux_pret_general_annuels(prets[uniques, 0], prets[uniques, 1], prets[uniques, 2], self.horizon,
+                                         in_fine=prets[uniques, 3].astype(bool), **self.options)
+
+        resultats = {cle: np.empty(len(structures)) for cle in ('tri', 'valeur_nette', 'cashflow_minimal')}
+        for debut in range(0, len(structures), self.taille_bloc):
+            bloc = slice(debut, debut + self.taille_bloc)
+            params_bloc = {cle: matrice[bloc, j, None] for j, cle in enumerate(PARAMETRES_SCENARIO)}
+            credit, interets, capital, frais = (f[inverse[bloc]] for f in flux)
+            projection = _noyau_projection(params_bloc, annees, credit, interets, capital, frais_pret=frais)
+            resultats['tri'][bloc] = tri_fonds_propres(projection, params_bloc['apport'], horizons[bloc])
+            resultats['valeur_nette'][bloc] = projection.valeur_nette[:, -1]
+            resultats['cashflow_minimal'][bloc] = projection.cashflow.min(axis=1)
+        return resultats
+
+
+def _tache_structures(recherche, structures):
+    """Évalue une tranche de structures dans un processus fils"""
+    return recherche.evaluer(structures)
+
+
+def _evaluer_en_parallele(recherche, structures, nb_workers, seuil_parallele):
+    """Évalue les structures, réparties en tranches contiguës entre processus au-delà du seuil"""
+    if len(structures) < seuil_parallele:
+        return recherche.evaluer(structures)
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+    from .parallele import _contexte, _decouper, nb_workers_defaut
+    nb_workers = nb_workers or nb_workers_defaut()
+    if nb_workers <= 1:
+        return recherche.evaluer(structures)
+    with ProcessPoolExecutor(max_workers=nb_workers, mp_context=_contexte()) as executeur:
+        taches = [executeur.submit(_tache_structures, recherche, structures[debut:fin])
+                  for debut, fin in _decouper(len(structures), nb_workers)]
+        parties = [tache.result() for tache in taches]
+    return {cle: np.concatenate([partie[cle] for partie in parties]) for cle in parties[0]}
+
+
+# Écart d'objectif en deçà duquel deux structures sont à égalité (bruit d'arrondi du capital restant dû...)
+TOLERANCE_OBJECTIF = 1e-6
+
+
+def front_pareto(objectifs, apports, tolerance=TOLERANCE_OBJECTIF):
+    """Positions des points non dominés (objectif maximal, apport minimal), par apport croissant
+
+    Les objectifs NaN (TRI non défini) ne font jamais partie du front.
+    """
+    valides = np.flatnonzero(~np.isnan(objectifs))
+    ordre = valides[np.lexsort((-objectifs[valides], apports[valides]))]
+    # Un point est sur le front s'il fait mieux que tous les points d'apport inférieur ou égal
+    meilleurs_precedents = np.maximum.accumulate(np.concatenate([[-np.inf], objectifs[ordre][:-1]]))
+    return ordre[objectifs[ordre] > meilleurs_precedents + tolerance]
+
+
+@instrumente()
+def optimiser_financement(params, apports, durees_credit=(15, 20, 25), types_pret=TYPES_PRET,
+                          durees_amortissement=None, objectif='tri', cashflow_minimal=0.0, mensualite_maximale=None,
+                          taux_par_duree=None, nb_workers=None, seuil_parallele=SEUIL_PARALLELE_FINANCEMENT,
+                          taille_bloc=10000) -> ResultatFinancement:
+    """Cherche la structure de financement du bien de params qui maximise l'objectif sous contraintes
+
+    apports, durees_credit, types_pret (parmi TYPES_PRET) et
+    durees_amortissement (par défaut celle de params) définissent la grille
+    des structures ; l'emprunt couvre le reste du besoin (prix, frais de
+    notaire et travaux). cashflow_minimal est le cashflow annuel minimal
+    exigé sur tout l'horizon et mensualite_maximale la mensualité maximale
+    (None : pas de contrainte). taux_par_duree associe un taux à certaines
+    durées de crédit (le taux de params s'applique aux autres). Les options
+    de structure du prêt de params (différé, assurance...) s'appliquent à
+    toutes les structures.
+    """
+    if objectif not in OBJECTIFS_FINANCEMENT:
+        raise ValueError(f"Objectif inconnu : {objectif} (attendu : {', '.join(OBJECTIFS_FINANCEMENT)})")
+    inconnus = [type_pret for type_pret in types_pret if type_pret not in TYPES_PRET]
+    if inconnus:
+        raise ValueError(f"Types de prêt inconnus : {', '.join(inconnus)} (attendu : {', '.join(TYPES_PRET)})")
+    if durees_amortissement is None:
+        durees_amortissement = (params.get('duree_amortissement', PARAMETRES_DEFAUT['duree_amortissement']),)
+    options = {cle: valeur for cle, valeur in options_pret(params).items() if cle != 'in_fine'}
+    recherche = _Recherche(params, options, taux_par_duree, taille_bloc)
+    apports = np.unique(np.asarray(apports, dtype=float))
+
+    # Branches : (durée de crédit, in fine, durée d'amortissement), chacune parcourant la grille des apports
+    branches = np.array([(duree, type_pret == 'in_fine', amortissement) for duree in durees_credit
+                         for type_pret in types_pret for amortissement in durees_amortissement], dtype=float)
+    nb_branches, nb_apports = len(branches), len(apports)
+    nb_structures = nb_branches * nb_apports
+
+    # Contrainte de mensualité, par formule fermée : premier apport admissible de chaque branche
+    premiers = np.zeros(nb_branches, dtype=np.int64)
+    if mensualite_maximale is not None:
+        mensualites = _mensualites(recherche.emprunts(apports)[None, :], recherche.taux_credit(branches[:, 0])[:, None],
+                                   branches[:, :1], branches[:, 1:2].astype(bool), options.get('taux_assurance', 0.0))
+        # La mensualité décroît avec l'apport : les apports admissibles forment une fin de grille
+        premiers = np.where(mensualites <= mensualite_maximale, np.arange(nb_apports), nb_apports).min(axis=1)
+
+    # Contrainte de cashflow : dichotomie sur les apports, une structure par branche active à chaque pas
+    nb_evaluees = 0
+    bas, haut = premiers.copy(), np.full(nb_branches, nb_apports)
+    if cashflow_minimal is not None:
+        with etape('elagage_cashflow', branches=nb_branches, apports=nb_apports):
+            actives = np.flatnonzero(bas < haut)
+            while len(actives):
+                milieux = (bas[actives] + haut[actives]) // 2
+                structures = np.column_stack([apports[milieux], branches[actives]])
+                respecte = recherche.evaluer(structures)['cashflow_minimal'] >= cashflow_minimal
+                nb_evaluees += len(actives)
+                haut[actives] = np.where(respecte, milieux, haut[actives])
+                bas[actives] = np.where(respecte, bas[actives], milieux + 1)
+                actives = np.flatnonzero(bas < haut)
+        premiers = bas
+
+    # Évaluation complète des structures restantes
+    indices_branches, indices_apports = np.nonzero(np.arange(nb_apports)[None, :] >= premiers[:, None])
+    structures = np.column_stack([apports[indices_apports], branches[indices_branches].reshape(-1, 3)])
+    with etape('structures_faisables', structures=len(structures)):
+        resultats = _evaluer_en_parallele(recherche, structures, nb_workers, seuil_parallele)
+    nb_evaluees += len(structures)
+
+    objectifs = resultats[objectif]
+    definis = np.flatnonzero(~np.isnan(objectifs))
+    meilleure = -1
+    if len(definis):
+        # À objectif égal, la structure qui mobilise le moins d'apport
+        egalites = definis[objectifs[definis] >= objectifs[definis].max() - TOLERANCE_OBJECTIF]
+        meilleure = int(egalites[np.argmin(structures[egalites, 0])])
+    taux = recherche.taux_credit(structures[:, 1])
+    return ResultatFinancement(
+        objectif=objectif,
+        apports=structures[:, 0],
+        durees_credit=structures[:, 1].astype(np.int64),
+        types_pret=np.where(structures[:, 2] > 0, 'in_fine', 'amortissable'),
+        durees_amortissement=structures[:, 3].astype(np.int64),
+        mensualites=_mensualites(recherche.emprunts(structures[:, 0]), taux, structures[:, 1],
+                                 structures[:, 2] > 0, options.get('taux_assurance', 0.0)),
+        cashflows_minimaux=resultats['cashflow_minimal'],
+        tri=resultats['tri'],
+        valeur_nette=resultats['valeur_nette'],
+        pareto=front_pareto(objectifs, structures[:, 0]),
+        meilleure=meilleure,
+        nb_structures=nb_structures,
+        nb_evaluees=nb_evaluees,
+        nb_elaguees=nb_structures - len(structures),
+    )
@@ -0,0 +1,133 @@
+"""Recalcul incrémental de la projection guidé par un graphe de dépendances
+
+Chaque étape déclare les paramètres qu'elle lit et les étapes dont elle
+dépend. Lorsqu'un paramètre change, seules les étapes qui le lisent, et
+celles qui en dépendent en aval, sont recalculées ; les autres résultats
+sont réutilisés. Modifier la taxe foncière ne recalcule ainsi ni
+l'échéancier du prêt ni l'amortissement comptable.
+
+L'échéancier et la projection passent par le cache de résultats partagé
+(voir cache) : des paramètres déjà calculés par une autre session, ou une
+autre réplique avec le niveau disque, ne sont pas recalculés.
+"""
+import time
+
+import numpy as np
+
+from . import instrumentation
+from .cache import cache_defaut, cle_projection, echeancier_en_cache
+from .lot import PARAMETRES_DEFAUT
+from .pret import PARAMETRES_PRET, options_pret
+from .projection import _noyau_projection, amortissements_comptables
+
+
+def _annees(params_f):
+    """Années de la projection (1 à duree_projection)"""
+    return np.arange(1, int(params_f['duree_projection']) + 1)
+
+
+def _etape_echeancier(params_f):
+    """Échéancier mensuel du prêt, lu dans le cache partagé s'il y figure"""
+    return echeancier_en_cache(params_f['emprunt'], params_f['taux_credit'], params_f['duree_credit'],
+                               **options_pret(params_f))
+
+
+def _etape_flux_pret(params_f, echeancier):
+    """Mensualités, intérêts et capital agrégés sur l'horizon de projection"""
+    nb_annees = int(params_f['duree_projection'])
+    return (*echeancier.annuel(nb_annees), echeancier.frais_annuels(nb_annees))
+
+
+def _etape_amortissement(params_f):
+    """Amortissement comptable du bâti"""
+    return amortissements_comptables(params_f, _annees(params_f))
+
+
+def _indice(cle_taux):
+    """Étape calculant l'indice de progression géométrique associé à un taux annuel"""
+    def etape(params_f):
+        return (1 + params_f[cle_taux]) ** (_annees(params_f) - 1)
+    return etape
+
+
+def _etape_projection(params_f, flux_pret, amortissement, indice_loyers, indice_charges, indice_valeur):
+    """Loyers, charges, IS, cashflow, cumuls et patrimoine"""
+    credit, interets, capital, frais_pret = flux_pret
+    indices = {'loyers': indice_loyers, 'charges': indice_charges, 'valeur': indice_valeur}
+    return _noyau_projection(params_f, _annees(params_f), credit, interets, capital, indices, amortissement,
+                             frais_pret)
+
+
+# Graphe des étapes, dans un ordre topologique : (nom, fonction, paramètres lus, étapes amont)
+ETAPES = [
+    ("echeancier", _etape_echeancier, tuple(PARAMETRES_PRET), ()),
+    ("flux_pret", _etape_flux_pret, ('duree_projection',), ("echeancier",)),
+    ("amortissement", _etape_amortissement,
+     ('prix_achat', 'pourcentage_terrain', 'travaux', 'duree_amortissement', 'duree_projection'), ()),
+    ("indice_loyers", _indice('revalorisation_loyers'), ('revalorisation_loyers', 'duree_projection'), ()),
+    ("indice_charges", _indice('indexation_charges'), ('indexation_charges', 'duree_projection'), ()),
+    ("indice_valeur", _indice('appreciation_immobilier'), ('appreciation_immobilier', 'duree_projection'), ()),
+    ("projection", _etape_projection,
+     ('loyers_mensuels', 'taxe_fonciere', 'assurance', 'frais_gestion', 'entretien', 'frais_comptable',
+      'emprunt', 'apport', 'prix_achat', 'duree_projection'),
+     ("flux_pret", "amortissement", "indice_loyers", "indice_charges", "indice_valeur")),
+]
+
+
+class PipelineIncremental:
+    """Projection recalculée étape par étape, en ne refaisant que ce qui est invalidé
+
+    Après chaque appel à calculer(), recalculees liste les étapes refaites
+    (aucune si la projection était dans le cache partagé) et durees leur
+    temps de calcul en secondes.
+    """
+
+    def __init__(self, etapes=None):
+        self.etapes = etapes or ETAPES
+        self._entrees = {}
+        self._resultats = {}
+        self.recalculees = []
+        self.durees = {}
+
+    def invalider(self):
+        """Oublie tous les résultats intermédiaires"""
+        self._entrees.clear()
+        self._resultats.clear()
+
+    def dependances(self, cle):
+        """Étapes invalidées, directement ou en aval, par un changement du paramètre cle"""
+        invalidees = []
+        for nom, _, lus, amont in self.etapes:
+            if cle in lus or any(etape in invalidees for etape in amont):
+                invalidees.append(nom)
+        return invalidees
+
+    def calculer(self, params_f, etape_finale="projection"):
+        """Renvoie le résultat de etape_finale (la Projection par défaut) pour ces paramètres
+
+        La projection est d'abord cherchée dans le cache partagé, sous la
+        clé de projeter_en_cache ; en cas d'échec, elle y est enregistrée
+        une fois les étapes invalidées recalculées.
+        """
+        self.recalculees = []
+        self.durees = {}
+        if etape_finale != "projection":
+            return self._calculer(params_f, etape_finale)
+        return cache_defaut().obtenir(cle_projection(params_f), lambda: self._calculer(params_f, etape_finale))
+
+    def _calculer(self, params_f, etape_finale):
+        """Recalcule les étapes invalidées jusqu'à etape_finale et renvoie son résultat"""
+        for nom, fonction, lus, amont in self.etapes:
+            entrees = tuple(params_f.get(cle, PARAMETRES_DEFAUT.get(cle)) for cle in lus)
+            a_jour = (nom in self._resultats and self._entrees.get(nom) == entrees
+                      and not any(etape in self.recalculees for etape in amont))
+            if not a_jour:
+                debut = time.perf_counter()
+                with instrumentation.etape(f"pipeline.{nom}"):
+                    self._resultats[nom] = fonction(params_f, *(self._resultats[etape] for etape in amont))
+                self.durees[nom] = time.perf_counter() - debut
+                self._entrees[nom] = entrees
+                self.recalculees.append(nom)
+            if nom == etape_finale:
+                break
+        return self._resultats[etape_finale]
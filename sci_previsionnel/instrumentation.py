@@ -0,0 +1,269 @@
+"""Instrumentation des étapes de calcul : chronométrage, journal structuré et profilage
+
+Les fonctions du moteur sont découpées en étapes nommées (etape() ou le
+décorateur instrumente()). Une étape n'est mesurée que si un relevé est
+ouvert dans le contexte courant (demarrer_releve(), releve()) ou si le
+journal est activé (journaliser(), variable SCI_JOURNAL_ETAPES=1) ; sinon
+etape() renvoie un contexte vide partagé et le surcoût se limite à deux
+tests.
+
+Chaque étape journalisée produit une ligne JSON sur le logger
+sci_previsionnel.instrumentation, exploitable comme métrique :
+
+    {"evenement": "etape", "etape": "projeter", "duree_ms": 0.41, "annees": 20}
+
+Profileur capture le profil d'une exécution isolée, avec cProfile ou par
+échantillonnage de la pile (sans dépendance, moins intrusif).
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+_RELEVE = contextvars.ContextVar('releve_instrumentation', default=None)
+_JOURNAL = False
+_CONTEXTE_VIDE = contextlib.nullcontext()
+
+
+class Releve:
+    """Étapes mesurées pendant une exécution, dans l'ordre où elles se terminent"""
+
+    def __init__(self):
+        self.etapes = []
+        self.debut = time.perf_counter()
+
+    def ajouter(self, nom, duree, attributs):
+        """Enregistre une étape terminée (durée en secondes)"""
+        self.etapes.append({"etape": nom, "duree_ms": duree * 1000, **attributs})
+
+    def resume(self):
+        """Nombre d'appels et durée totale (ms) par étape, dans l'ordre de première apparition"""
+        resume = {}
+        for mesure in self.etapes:
+            ligne = resume.setdefault(mesure["etape"], {"appels": 0, "duree_ms": 0.0})
+            ligne["appels"] += 1
+            ligne["duree_ms"] += mesure["duree_ms"]
+        return resume
+
+    @property
+    def duree_ms(self):
+        """Temps écoulé depuis l'ouverture du relevé (ms)"""
+        return (time.perf_counter() - self.debut) * 1000
+
+
+class _Chronometre:
+    """Contexte mesurant une étape et la transmettant au relevé et au journal"""
+    __slots__ = ('nom', 'attributs', 'releve', 'debut')
+
+    def __init__(self, nom, attributs, courant):
+        self.nom = nom
+        self.attributs = attributs
+        self.releve = courant
+        self.debut = 0.0
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duree = time.perf_counter() - self.debut
+        if self.releve is not None:
+            self.releve.ajouter(self.nom, duree, self.attributs)
+        if _JOURNAL:
+            LOGGER.info(json.dumps({"evenement": "etape", "etape": self.nom, "duree_ms": round(duree * 1000, 3),
+                                    **self.attributs}, default=str))
+        return False
+
+
+def etape(nom, **attributs):
+    """Contexte mesurant l'étape nom (attributs : informations ajoutées au relevé et au journal)"""
+    courant = _RELEVE.get()
+    if courant is None and not _JOURNAL:
+        return _CONTEXTE_VIDE
+    return _Chronometre(nom, attributs, courant)
+
+
+def instrumente(nom=None):
+    """Décorateur mesurant chaque appel de la fonction comme une étape (nom de la fonction par défaut)"""
+    def decorateur(fonction):
+        nom_etape = nom or fonction.__name__
+
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            if _RELEVE.get() is None and not _JOURNAL:
+                return fonction(*args, **kwargs)
+            with _Chronometre(nom_etape, {}, _RELEVE.get()):
+                return fonction(*args, **kwargs)
+        return enveloppe
+    return decorateur
+
+
+def journaliser_evenement(evenement, **donnees):
+    """Écrit une ligne de journal JSON pour un événement ponctuel (si le journal est activé)"""
+    if _JOURNAL:
+        LOGGER.info(json.dumps({"evenement": evenement, **donnees}, default=str))
+
+
+def journaliser(actif=True):
+    """Active ou désactive les lignes de journal JSON pour tout le processus
+
+    Si le logger n'a encore aucune destination, les lignes sont écrites sur
+    la sortie d'erreur.
+    """
+    global _JOURNAL  # pylint: disable=global-statement
+    _JOURNAL = actif
+    if actif and not LOGGER.handlers:
+        destination = logging.StreamHandler()
+        destination.setFormatter(logging.Formatter('%(message)s'))
+        LOGGER.addHandler(destination)
+        LOGGER.setLevel(logging.INFO)
+
+
+if os.environ.get('SCI_JOURNAL_ETAPES', '') not in ('', '0'):
+    journaliser()
+
+
+def demarrer_releve():
+    """Ouvre un nouveau relevé dans le contexte courant (remplace le précédent) et le renvoie"""
+    courant = Releve()
+    _RELEVE.set(courant)
+    return courant
+
+
+def arreter_releve():
+    """Ferme le relevé du contexte courant et le renvoie (None s'il n'y en avait pas)"""
+    courant = _RELEVE.get()
+    _RELEVE.set(None)
+    return courant
+
+
+@contextlib.contextmanager
+def releve():
+    """Relève les étapes exécutées dans le bloc with"""
+    jeton = _RELEVE.set(Releve())
+    try:
+        yield _RELEVE.get()
+    finally:
+        _RELEVE.reset(jeton)
+
+
+def statistiques_cache(cache=None):
+    """Compteurs du cache de résultats (cache partagé par défaut), prêts à afficher ou journaliser
+
+    Tant que le module cache n'est pas chargé, aucun calcul n'a pu passer
+    par le cache partagé : les compteurs sont nuls et le moteur n'est pas
+    importé pour autant (page d'accueil de l'application).
+    """
+    if cache is None:
+        if f'{__package__}.cache' not in sys.modules:
+            return {"taux_succes": 0.0, "succes_memoire": 0, "succes_disque": 0, "echecs": 0,
+                    "evictions_memoire": 0, "evictions_disque": 0, "entrees_memoire": 0}
+        from .cache import cache_defaut  # pylint: disable=import-outside-toplevel
+        cache = cache_defaut()
+    statistiques = cache.statistiques
+    return {
+        "taux_succes": statistiques.taux_succes,
+        "succes_memoire": statistiques.succes_memoire,
+        "succes_disque": statistiques.succes_disque,
+        "echecs": statistiques.echecs,
+        "evictions_memoire": statistiques.evictions_memoire,
+        "evictions_disque": statistiques.evictions_disque,
+        "entrees_memoire": len(cache),
+    }
+
+
+class Profileur:
+    """Profil d'une exécution isolée : cProfile (déterministe) ou échantillonnage de la pile
+
+    En mode 'echantillonnage', un thread relève la pile du thread profilé
+    toutes les intervalle secondes ; le rapport donne, par fonction, la part
+    des échantillons où elle est en cours (cumulé) ou au sommet de la pile
+    (propre). S'utilise avec with ou demarrer()/arreter().
+    """
+
+    def __init__(self, mode='cprofile', intervalle=0.001):
+        if mode not in ('cprofile', 'echantillonnage'):
+            raise ValueError(f"Mode de profilage inconnu : {mode!r} (attendu 'cprofile' ou 'echantillonnage')")
+        self.mode = mode
+        self.intervalle = intervalle
+        self.duree = 0.0
+        self._profil = None
+        self._cumule = collections.Counter()
+        self._propre = collections.Counter()
+        self._nb_echantillons = 0
+        self._arret = threading.Event()
+        self._thread = None
+        self._debut = 0.0
+
+    def demarrer(self):
+        """Commence la capture sur le thread courant"""
+        self._debut = time.perf_counter()
+        if self.mode == 'cprofile':
+            import cProfile  # pylint: disable=import-outside-toplevel
+            self._profil = cProfile.Profile()
+            self._profil.enable()
+        else:
+            cible = threading.get_ident()
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._echantillonner, args=(cible,), daemon=True)
+            self._thread.start()
+        return self
+
+    def arreter(self):
+        """Termine la capture"""
+        if self.mode == 'cprofile':
+            self._profil.disable()
+        else:
+            self._arret.set()
+            self._thread.join()
+        self.duree = time.perf_counter() - self._debut
+        return self
+
+    def __enter__(self):
+        return self.demarrer()
+
+    def __exit__(self, *exc):
+        self.arreter()
+        return False
+
+    def _echantillonner(self, cible):
+        while not self._arret.wait(self.intervalle):
+            cadre = sys._current_frames().get(cible)  # pylint: disable=protected-access
+            if cadre is None:
+                continue
+            self._nb_echantillons += 1
+            vues = set()
+            sommet = True
+            while cadre is not None:
+                code = cadre.f_code
+                fonction = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+                if sommet:
+                    self._propre[fonction] += 1
+                    sommet = False
+                if fonction not in vues:
+                    self._cumule[fonction] += 1
+                    vues.add(fonction)
+                cadre = cadre.f_back
+
+    def rapport(self, nb_lignes=25):
+        """Rapport texte des fonctions les plus coûteuses"""
+        if self.mode == 'cprofile':
+            import io  # pylint: disable=import-outside-toplevel
+            import pstats  # pylint: disable=import-outside-toplevel
+            sortie = io.StringIO()
+            pstats.Stats(self._profil, stream=sortie).sort_stats('cumulative').print_stats(nb_lignes)
+            return sortie.getvalue()
+        total = max(self._nb_echantillons, 1)
+        lignes = [f"{self._nb_echantillons} échantillons en {self.duree:.3f} s (intervalle {self.intervalle * 1000:g} ms)",
+                  f"{'cumulé':>8} {'propre':>8}  fonction"]
+        for fonction, nombre in self._cumule.most_common(nb_lignes):
+            lignes.append(f"{nombre / total:>8.1%} {self._propre[fonction] / total:>8.1%}  {fonction}")
+        return "\n".join(lignes)
@@ -0,0 +1,201 @@
+"""Évaluation par lot de scénarios en tableaux 2-D (scénario × année)"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .instrumentation import instrumente
+from .pret import PARAMETRES_PRET_DEFAUT, flux_pret_annuels, flux_pret_general_annuels
+from .projection import COLONNES_PROJECTION, Projection, _noyau_projection
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Clés du dictionnaire params (voir le bloc principal) utilisées par la projection
+PARAMETRES_SCENARIO = [
+    'prix_achat', 'travaux', 'pourcentage_terrain', 'loyers_mensuels', 'revalorisation_loyers',
+    'appreciation_immobilier', 'indexation_charges', 'apport', 'emprunt', 'taux_credit',
+    'duree_credit', 'taxe_fonciere', 'assurance', 'frais_gestion', 'entretien', 'frais_comptable',
+    'duree_projection', 'duree_amortissement'
+]
+PARAMETRES_DEFAUT = {'pourcentage_terrain': 0.2, 'duree_amortissement': 20}
+
+# Indicateurs de synthèse par scénario (équivalents du tableau de bord)
+COLONNES_RESUME = [
+    "Cashflow année 1", "Cashflow cumulé", "Valeur du bien", "Valeur nette", "Cashflow moyen",
+    "Rendement / fonds propres moyen (%)", "Rendement brut moyen (%)", "Première année IS"
+]
+
+
+@dataclass(frozen=True)
+class ResultatLot:
+    """Résultat d'une simulation par lot : synthèse par scénario et, sur demande, le détail annuel"""
+    resume: 'pd.DataFrame'
+    horizons: np.ndarray
+    projection: Projection = None
+
+    def _detail(self, debut, fin):
+        """Détail année par année des scénarios debut à fin (format long)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        if self.projection is None:
+            raise ValueError("Le détail annuel n'a pas été calculé (details=False)")
+        valide = self.projection.annees <= self.horizons[debut:fin, None]
+        lignes, _ = np.nonzero(valide)
+        colonnes = {"Scénario": self.resume.index.to_numpy()[debut:fin][lignes]}
+        for libelle, attribut, fmt in COLONNES_PROJECTION:
+            valeurs = getattr(self.projection, attribut)
+            if valeurs.ndim == 2:
+                valeurs = valeurs[debut:fin]
+            valeurs = np.broadcast_to(valeurs, valide.shape)[valide]
+            if fmt == "pct":
+                colonnes[libelle] = np.round(valeurs, 2)
+            else:
+                colonnes[libelle] = np.trunc(valeurs).astype(np.int64)
+        return pd.DataFrame(colonnes)
+
+    def to_dataframe(self):
+        """Construit le détail année par année de tous les scénarios (format long)"""
+        return self._detail(0, len(self.horizons))
+
+    def blocs(self, taille_bloc=10000):
+        """Détail année par année par blocs de taille_bloc scénarios, pour un export au fil de l'eau"""
+        for debut in range(0, len(self.horizons), taille_bloc):
+            yield self._detail(debut, debut + taille_bloc)
+
+
+def matrice_scenarios(scenarios):
+    """Convertit une table de scénarios en matrice (S, paramètres) de flottants
+
+    Les colonnes suivent l'ordre de PARAMETRES_SCENARIO ; les paramètres
+    optionnels absents prennent leur valeur par défaut.
+    """
+    nb_scenarios = len(np.asarray(scenarios['duree_projection']))
+    matrice = np.empty((nb_scenarios, len(PARAMETRES_SCENARIO)))
+    for j, cle in enumerate(PARAMETRES_SCENARIO):
+        matrice[:, j] = np.asarray(scenarios[cle], dtype=float) if cle in scenarios else PARAMETRES_DEFAUT[cle]
+    return matrice
+
+
+def options_scenarios(scenarios, nb_scenarios=None):
+    """Options de structure du prêt d'une table de scénarios : {clé: tableau d'une valeur par scénario}
+
+    Seules les colonnes d'options (voir options_pret) dont une valeur au
+    moins diffère de la valeur par défaut sont retenues ; les valeurs
+    manquantes prennent la valeur par défaut. nb_scenarios vaut par défaut
+    la longueur de la colonne duree_projection.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    if nb_scenarios is None:
+        nb_scenarios = len(np.asarray(scenarios['duree_projection']))
+    options = {}
+    for cle, defaut in PARAMETRES_PRET_DEFAUT.items():
+        if cle not in scenarios:
+            continue
+        valeurs = np.broadcast_to(np.asarray(scenarios[cle], dtype=object), (nb_scenarios,))
+        valeurs = np.where(pd.isna(valeurs), defaut, valeurs)
+        if not isinstance(defaut, str):
+            valeurs = valeurs.astype(type(defaut))
+        if np.any(valeurs != defaut):
+            options[cle] = valeurs
+    return options
+
+
+def _projeter_bloc(matrice_bloc, annees, options=None):
+    """Projette un bloc de scénarios donné sous forme matricielle
+
+    options contient les colonnes d'options du prêt du bloc (voir
+    options_scenarios) : leurs échéanciers passent alors par
+    flux_pret_general_annuels, assurance et indemnités comprises.
+    """
+    params_bloc = {cle: matrice_bloc[:, j, None] for j, cle in enumerate(PARAMETRES_SCENARIO)}
+    if options:
+        credit, interets, capital, frais = flux_pret_general_annuels(
+            matrice_bloc[:, PARAMETRES_SCENARIO.index('emprunt')],
+            matrice_bloc[:, PARAMETRES_SCENARIO.index('taux_credit')],
+            matrice_bloc[:, PARAMETRES_SCENARIO.index('duree_credit')], len(annees), **options
+        )
+        return _noyau_projection(params_bloc, annees, credit, interets, capital, frais_pret=frais)
+    credit, interets, capital = flux_pret_annuels(
+        params_bloc['emprunt'], params_bloc['taux_credit'], params_bloc['duree_credit'], len(annees)
+    )
+    return _noyau_projection(params_bloc, annees, credit, interets, capital)
+
+
+def _resume_bloc(projection, horizons):
+    """Calcule les indicateurs de synthèse d'un bloc, chacun à l'horizon de son scénario"""
+    lignes = np.arange(len(horizons))
+    derniere = horizons - 1
+    valide = projection.annees <= horizons[:, None]
+
+    def moyenne(valeurs):
+        return np.where(valide, valeurs, 0.0).sum(axis=1) / horizons
+
+    annee_is = valide & (projection.impot > 0)
+    return {
+        "Cashflow année 1": projection.cashflow[:, 0],
+        "Cashflow cumulé": projection.cashflow_cumule[lignes, derniere],
+        "Valeur du bien": projection.valeur_bien[lignes, derniere],
+        "Valeur nette": projection.valeur_nette[lignes, derniere],
+        "Cashflow moyen": moyenne(projection.cashflow),
+        "Rendement / fonds propres moyen (%)": moyenne(projection.rendement_fonds_propres),
+        "Rendement brut moyen (%)": moyenne(projection.rendement_brut),
+        "Première année IS": np.where(annee_is.any(axis=1), annee_is.argmax(axis=1) + 1, 0)
+    }
+
+
+def _calculer_blocs(matrice, debut, fin, annees, taille_bloc, resume, details=None, options=None):
+    """Calcule les scénarios [debut, fin) par blocs et écrit les résultats en place
+
+    resume est une matrice (S, indicateurs) et details, s'il est fourni, un
+    tableau (colonnes, S, années) : les deux peuvent résider en mémoire partagée.
+    options, s'il est fourni, donne les options du prêt des seuls scénarios
+    [debut, fin).
+    """
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    options = options or {}
+    for debut_bloc in range(debut, fin, taille_bloc):
+        fin_bloc = min(debut_bloc + taille_bloc, fin)
+        options_bloc = {cle: valeurs[debut_bloc - debut:fin_bloc - debut] for cle, valeurs in options.items()}
+        projection = _projeter_bloc(matrice[debut_bloc:fin_bloc], annees, options_bloc)
+        indicateurs = _resume_bloc(projection, horizons[debut_bloc:fin_bloc])
+        for j, colonne in enumerate(COLONNES_RESUME):
+            resume[debut_bloc:fin_bloc, j] = indicateurs[colonne]
+        if details is not None:
+            for j, (_, attribut, _) in enumerate(COLONNES_PROJECTION[1:]):
+                details[j, debut_bloc:fin_bloc] = getattr(projection, attribut)
+
+
+def _resultat_lot(scenarios, horizons, annees, resume, details=None):
+    """Assemble le ResultatLot à partir des matrices de résultats"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    index = scenarios.index if isinstance(scenarios, pd.DataFrame) else pd.RangeIndex(len(horizons))
+    resume_df = pd.DataFrame(resume, columns=COLONNES_RESUME, index=index)
+    resume_df["Première année IS"] = resume_df["Première année IS"].astype("Int64").replace(0, pd.NA)
+
+    projection_lot = None
+    if details is not None:
+        colonnes = {attribut: details[j] for j, (_, attribut, _) in enumerate(COLONNES_PROJECTION[1:])}
+        projection_lot = Projection(annees=annees, **colonnes)
+    return ResultatLot(resume=resume_df, horizons=horizons, projection=projection_lot)
+
+
+@instrumente()
+def simuler_lot(scenarios, details=False, taille_bloc=10000):
+    """Évalue un lot de scénarios (une ligne par jeu de paramètres) en tableaux 2-D
+
+    scenarios est un DataFrame (ou un dictionnaire de colonnes) dont les clés
+    sont celles du dictionnaire params, options de structure du prêt
+    comprises (une valeur par scénario). Le calcul est découpé en blocs de
+    taille_bloc scénarios pour borner la mémoire ; le détail annuel (S × années)
+    n'est conservé que si details=True.
+    """
+    matrice = matrice_scenarios(scenarios)
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    annees = np.arange(1, int(horizons.max(initial=1)) + 1)
+
+    resume = np.empty((len(matrice), len(COLONNES_RESUME)))
+    detail = np.empty((len(COLONNES_PROJECTION) - 1, len(matrice), len(annees))) if details else None
+    _calculer_blocs(matrice, 0, len(matrice), annees, taille_bloc, resume, detail, options_scenarios(scenarios))
+    return _resultat_lot(scenarios, horizons, annees, resume, detail)
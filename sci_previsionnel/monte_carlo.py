@@ -0,0 +1,291 @@
+"""Simulation Monte Carlo par blocs vectorisés et quantiles en flux"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import instrumente
+from .pret import (
+    echeancier_depuis_params, flux_pret_annuels, flux_pret_general_annuels, flux_pret_variable, options_pret
+)
+from .projection import _noyau_projection
+
+
+@dataclass(frozen=True)
+class Loi:
+    """Loi de tirage annuelle d'un taux (revalorisation, appréciation, vacance...)
+
+    type vaut 'constante', 'normale', 'uniforme' ou 'triangulaire' (moyenne
+    sert alors de mode) ; les tirages sont ramenés dans [minimum, maximum].
+    """
+    type: str = 'normale'
+    moyenne: float = 0.0
+    ecart_type: float = 0.0
+    minimum: float = -np.inf
+    maximum: float = np.inf
+
+    def tirer(self, rng, taille):
+        """Tire un tableau de taux de la forme demandée"""
+        if self.type == 'constante':
+            tirages = np.full(taille, self.moyenne)
+        elif self.type == 'normale':
+            tirages = rng.normal(self.moyenne, self.ecart_type, taille)
+        elif self.type == 'uniforme':
+            tirages = rng.uniform(self.minimum, self.maximum, taille)
+        elif self.type == 'triangulaire':
+            tirages = rng.triangular(self.minimum, self.moyenne, self.maximum, taille)
+        else:
+            raise ValueError(f"Type de loi inconnu : {self.type}")
+        return np.clip(tirages, self.minimum, self.maximum)
+
+
+@dataclass(frozen=True)
+class ConfigMonteCarlo:
+    """Paramètres d'une simulation Monte Carlo
+
+    Les lois remplacent les valeurs ponctuelles des paramètres correspondants.
+    Si variation_taux est fournie, le taux du crédit suit une marche aléatoire
+    (variation annuelle tirée selon cette loi, bornée par plancher et plafond)
+    et la mensualité est recalculée chaque année.
+    """
+    revalorisation_loyers: Loi
+    appreciation_immobilier: Loi
+    indexation_charges: Loi
+    vacance_locative: Loi = Loi('constante', 0.0, minimum=0.0, maximum=1.0)
+    variation_taux: Loi = None
+    taux_plancher: float = 0.0
+    taux_plafond: float = np.inf
+    nb_chemins: int = 100000
+    taille_bloc: int = 20000
+    graine: int = 0
+    quantiles: tuple = (0.05, 0.5, 0.95)
+
+
+class HistogrammeQuantiles:
+    """Estimateur de quantiles en flux, année par année, à mémoire bornée
+
+    Chaque année dispose d'un histogramme de nb_classes classes centré sur
+    les premières valeurs reçues. Quand une valeur sort de l'intervalle, sa
+    demi-largeur double et les classes sont fusionnées deux à deux, si bien
+    que la mémoire ne dépend pas du nombre de chemins simulés.
+    """
+
+    def __init__(self, nb_annees, nb_classes=4096):
+        self.nb_classes = nb_classes - nb_classes % 4
+        self.centre = np.zeros(nb_annees)
+        self.demi_largeur = np.zeros(nb_annees)
+        self.comptes = np.zeros((nb_annees, self.nb_classes), dtype=np.int64)
+        self.effectif = 0
+        self.initialise = False
+
+    def copie_vide(self):
+        """Histogramme vide de même géométrie, pour agréger des blocs en parallèle"""
+        copie = HistogrammeQuantiles(len(self.centre), self.nb_classes)
+        copie.centre, copie.demi_largeur = self.centre.copy(), self.demi_largeur.copy()
+        copie.initialise = self.initialise
+        return copie
+
+    def _elargir(self, annee, facteur):
+        """Double facteur fois la demi-largeur d'une année en fusionnant ses classes"""
+        for _ in range(facteur):
+            fusion = self.comptes[annee].reshape(-1, 2).sum(axis=1)
+            self.comptes[annee] = 0
+            quart = self.nb_classes // 4
+            self.comptes[annee, quart:quart + len(fusion)] = fusion
+            self.demi_largeur[annee] *= 2
+
+    def ajouter(self, valeurs):
+        """Ajoute un bloc de valeurs de forme (chemins, années)"""
+        if not self.initialise:
+            minimum, maximum = valeurs.min(axis=0), valeurs.max(axis=0)
+            self.centre = (minimum + maximum) / 2
+            self.demi_largeur = np.maximum((maximum - minimum) * 0.75, 1.0)
+            self.initialise = True
+        ecart = np.abs(valeurs - self.centre).max(axis=0)
+        for annee in np.flatnonzero(ecart >= self.demi_largeur):
+            facteur = int(np.ceil(np.log2(ecart[annee] / self.demi_largeur[annee]) + 1e-12))
+            self._elargir(annee, max(facteur, 1))
+
+        largeur = 2 * self.demi_largeur / self.nb_classes
+        classes = ((valeurs - (self.centre - self.demi_largeur)) / largeur).astype(np.int64)
+        classes = np.clip(classes, 0, self.nb_classes - 1)
+        classes += np.arange(valeurs.shape[1]) * self.nb_classes
+        self.comptes += np.bincount(classes.ravel(), minlength=self.comptes.size).reshape(self.comptes.shape)
+        self.effectif += len(valeurs)
+
+    def fusionner(self, autre):
+        """Ajoute les comptes d'un autre histogramme de même géométrie initiale"""
+        if autre.effectif == 0:
+            return
+        if not self.initialise:
+            self.centre, self.demi_largeur = autre.centre.copy(), autre.demi_largeur.copy()
+            self.comptes, self.effectif = autre.comptes.copy(), autre.effectif
+            self.initialise = True
+            return
+        autre_comptes = autre.comptes.copy()
+        for annee in range(len(self.centre)):
+            if self.centre[annee] != autre.centre[annee]:
+                raise ValueError("Histogrammes de centres différents")
+            ratio = int(round(np.log2(autre.demi_largeur[annee] / self.demi_largeur[annee])))
+            if ratio > 0:
+                self._elargir(annee, ratio)
+            quart = self.nb_classes // 4
+            for _ in range(-ratio if ratio < 0 else 0):
+                fusion = autre_comptes[annee].reshape(-1, 2).sum(axis=1)
+                autre_comptes[annee] = 0
+                autre_comptes[annee, quart:quart + len(fusion)] = fusion
+        self.comptes += autre_comptes
+        self.effectif += autre.effectif
+
+    def quantiles(self, probabilites):
+        """Estime les quantiles demandés (interpolation linéaire dans la classe)"""
+        cumul = np.cumsum(self.comptes, axis=1)
+        largeur = 2 * self.demi_largeur / self.nb_classes
+        resultat = np.empty((len(probabilites), len(self.centre)))
+        for i, probabilite in enumerate(probabilites):
+            rang_cible = probabilite * self.effectif
+            for annee in range(len(self.centre)):
+                classe = min(int(np.searchsorted(cumul[annee], rang_cible)), self.nb_classes - 1)
+                avant = cumul[annee, classe - 1] if classe > 0 else 0
+                part = (rang_cible - avant) / max(self.comptes[annee, classe], 1)
+                borne = self.centre[annee] - self.demi_largeur[annee] + classe * largeur[annee]
+                resultat[i, annee] = borne + part * largeur[annee]
+        return resultat
+
+
+@dataclass(frozen=True)
+class ResultatMonteCarlo:
+    """Éventails de quantiles et probabilités issus d'une simulation Monte Carlo"""
+    annees: np.ndarray
+    quantiles: tuple
+    cashflow_cumule: np.ndarray
+    valeur_nette: np.ndarray
+    proba_cashflow_negatif: np.ndarray
+    proba_cashflow_cumule_negatif: float
+    nb_chemins: int
+
+    def to_dataframe(self):
+        """Tableau année par année des quantiles (P5/P50/P95...) et probabilités"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        colonnes = {"Année": self.annees}
+        for i, probabilite in enumerate(self.quantiles):
+            colonnes[f"Cashflow cumulé P{probabilite * 100:g}"] = self.cashflow_cumule[i]
+        for i, probabilite in enumerate(self.quantiles):
+            colonnes[f"Valeur nette P{probabilite * 100:g}"] = self.valeur_nette[i]
+        colonnes["Probabilité cashflow négatif (%)"] = self.proba_cashflow_negatif * 100
+        return pd.DataFrame(colonnes)
+
+
+def _indice_cumule(taux):
+    """Indice base 1 en année 1 à partir de taux annuels tirés (chemins, années)"""
+    indice = np.ones_like(taux)
+    np.cumprod(1 + taux[:, :-1], axis=1, out=indice[:, 1:])
+    return indice
+
+
+def _simuler_bloc(params_f, config, nb_chemins, graine_bloc):
+    """Simule un bloc de chemins et renvoie la projection correspondante"""
+    rng = np.random.default_rng(graine_bloc)
+    annees = np.arange(1, int(params_f['duree_projection']) + 1)
+    forme = (nb_chemins, len(annees))
+
+    revalorisation = config.revalorisation_loyers.tirer(rng, forme)
+    appreciation = config.appreciation_immobilier.tirer(rng, forme)
+    indexation = config.indexation_charges.tirer(rng, forme)
+    vacance = config.vacance_locative.tirer(rng, forme)
+    indices = {
+        'loyers': _indice_cumule(revalorisation) * (1 - vacance),
+        'charges': _indice_cumule(indexation),
+        'valeur': _indice_cumule(appreciation)
+    }
+
+    # Structure du prêt (différé, in fine, assurance...) : échéancier général, commun aux chemins à taux fixe
+    options = options_pret(params_f)
+    frais_pret = 0.0
+    if config.variation_taux is None and options:
+        echeancier = echeancier_depuis_params(params_f)
+        credit, interets, capital = echeancier.annuel(len(annees))
+        frais_pret = echeancier.frais_annuels(len(annees))
+    elif config.variation_taux is None:
+        credit, interets, capital = flux_pret_annuels(
+            params_f['emprunt'], params_f['taux_credit'], params_f['duree_credit'], len(annees)
+        )
+    else:
+        variations = config.variation_taux.tirer(rng, forme)
+        variations[:, 0] = 0
+        taux = np.clip(params_f['taux_credit'] + np.cumsum(variations, axis=1),
+                       config.taux_plancher, config.taux_plafond)
+        if options:
+            credit, interets, capital, frais_pret = flux_pret_general_annuels(
+                params_f['emprunt'], taux, params_f['duree_credit'], len(annees), **options
+            )
+        else:
+            credit, interets, capital = flux_pret_variable(
+                params_f['emprunt'], taux, params_f['duree_credit'], len(annees)
+            )
+    return _noyau_projection(params_f, annees, credit, interets, capital, indices, frais_pret=frais_pret)
+
+
+class AgregatMonteCarlo:
+    """Agrégats en flux d'une simulation : histogrammes de quantiles et comptages"""
+
+    def __init__(self, nb_annees):
+        self.cashflow_cumule = HistogrammeQuantiles(nb_annees)
+        self.valeur_nette = HistogrammeQuantiles(nb_annees)
+        self.cashflow_negatif = np.zeros(nb_annees, dtype=np.int64)
+        self.cumule_negatif = 0
+
+    def copie_vide(self):
+        """Agrégat vide partageant la géométrie des histogrammes"""
+        copie = AgregatMonteCarlo(len(self.cashflow_negatif))
+        copie.cashflow_cumule = self.cashflow_cumule.copie_vide()
+        copie.valeur_nette = self.valeur_nette.copie_vide()
+        return copie
+
+    def ajouter(self, projection):
+        """Ajoute les trajectoires d'un bloc simulé"""
+        self.cashflow_cumule.ajouter(projection.cashflow_cumule)
+        self.valeur_nette.ajouter(projection.valeur_nette)
+        self.cashflow_negatif += (projection.cashflow < 0).sum(axis=0)
+        self.cumule_negatif += int((projection.cashflow_cumule[:, -1] < 0).sum())
+
+    def fusionner(self, autre):
+        """Ajoute un agrégat calculé séparément (autre processus)"""
+        self.cashflow_cumule.fusionner(autre.cashflow_cumule)
+        self.valeur_nette.fusionner(autre.valeur_nette)
+        self.cashflow_negatif += autre.cashflow_negatif
+        self.cumule_negatif += autre.cumule_negatif
+
+    def resultat(self, config):
+        """Calcule les quantiles et probabilités finales"""
+        return ResultatMonteCarlo(
+            annees=np.arange(1, len(self.cashflow_negatif) + 1),
+            quantiles=tuple(config.quantiles),
+            cashflow_cumule=self.cashflow_cumule.quantiles(config.quantiles),
+            valeur_nette=self.valeur_nette.quantiles(config.quantiles),
+            proba_cashflow_negatif=self.cashflow_negatif / config.nb_chemins,
+            proba_cashflow_cumule_negatif=self.cumule_negatif / config.nb_chemins,
+            nb_chemins=config.nb_chemins
+        )
+
+
+def decouper_chemins(config):
+    """Tailles des blocs de chemins et graines associées (une par bloc)"""
+    tailles = [min(config.taille_bloc, config.nb_chemins - debut)
+               for debut in range(0, config.nb_chemins, config.taille_bloc)]
+    return tailles, np.random.SeedSequence(config.graine).spawn(len(tailles))
+
+
+@instrumente()
+def simuler_monte_carlo(params_f, config):
+    """Simule config.nb_chemins trajectoires par blocs vectorisés
+
+    params_f reprend les clés du dictionnaire params, avec loyers_mensuels
+    hors vacance : la vacance est tirée chaque année selon config. Chaque bloc
+    reçoit sa propre graine dérivée de config.graine (SeedSequence), si bien
+    que le résultat est reproductible. Les quantiles sont agrégés en flux,
+    la mémoire ne dépend que de config.taille_bloc.
+    """
+    agregat = AgregatMonteCarlo(int(params_f['duree_projection']))
+    for taille, graine_bloc in zip(*decouper_chemins(config)):
+        agregat.ajouter(_simuler_bloc(params_f, config, taille, graine_bloc))
+    return agregat.resultat(config)
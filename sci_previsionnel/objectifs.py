@@ -0,0 +1,245 @@
+"""Recherche d'objectifs : valeur d'un paramètre pour laquelle un indicateur atteint une cible
+
+Répond en une passe, pour un lot de scénarios, aux questions posées
+d'habitude à la main en relançant la simulation :
+
+- prix d'achat maximal pour un cashflow de l'année 1 positif ou nul ;
+- loyer minimal pour un rendement sur fonds propres donné ;
+- taux de crédit au-delà duquel la valeur nette devient négative.
+
+La recherche encadre la solution de chaque scénario et resserre tous les
+intervalles ensemble : à chaque itération, le noyau de calcul par lot
+projette les scénarios non encore résolus au point de fausse position de
+leur intervalle (ou au milieu, si l'itération précédente ne l'a pas divisé
+par deux, ce qui garantit la convergence d'une dichotomie). La valeur
+renvoyée est l'extrémité de l'intervalle final
+où l'objectif est atteint (indicateur >= cible, ou <= avec sens='<=') : le
+prix maximal, le loyer minimal... à la tolérance près. L'indicateur doit
+franchir la cible une seule fois dans l'intervalle de recherche.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import instrumente
+from .lot import PARAMETRES_SCENARIO, matrice_scenarios, options_scenarios, _projeter_bloc
+from .pret import PARAMETRES_PRET_DEFAUT
+
+# Intervalle de recherche et tolérance par défaut : variable -> (borne basse, borne haute, tolérance)
+VARIABLES_OBJECTIF = {
+    'prix_achat': (1.0, 1e7, 1.0),
+    'travaux': (0.0, 1e7, 1.0),
+    'loyers_mensuels': (0.0, 1e5, 0.01),
+    'apport': (0.0, 1e7, 1.0),
+    'taux_credit': (0.0, 0.3, 1e-6),
+    'revalorisation_loyers': (-0.2, 0.2, 1e-7),
+    'appreciation_immobilier': (-0.2, 0.2, 1e-7),
+}
+
+# Variation de l'emprunt pour une hausse d'un euro de la variable (emprunt = prix + frais + travaux - apport)
+EFFETS_SUR_EMPRUNT = {'prix_achat': 1.0, 'travaux': 1.0, 'apport': -1.0}
+
+STATUT_ATTEINT = "atteint"
+STATUT_TOUJOURS = "toujours atteint"
+STATUT_JAMAIS = "jamais atteint"
+
+
+def _a_horizon(valeurs, horizons):
+    return valeurs[np.arange(len(horizons)), horizons - 1]
+
+
+def _masque(valeurs, horizons, neutre):
+    return np.where(np.arange(1, valeurs.shape[1] + 1) <= horizons[:, None], valeurs, neutre)
+
+
+# Indicateurs cibles, calculés à l'horizon de chaque scénario : nom -> fonction (projection, horizons)
+INDICATEURS_OBJECTIF = {
+    'cashflow_annee_1': lambda projection, horizons: projection.cashflow[:, 0],
+    'cashflow_minimal': lambda projection, horizons: _masque(projection.cashflow, horizons, np.inf).min(axis=1),
+    'cashflow_moyen': lambda projection, horizons: _masque(projection.cashflow, horizons, 0.0).sum(axis=1) / horizons,
+    'cashflow_cumule': lambda projection, horizons: _a_horizon(projection.cashflow_cumule, horizons),
+    'valeur_nette': lambda projection, horizons: _a_horizon(projection.valeur_nette, horizons),
+    'valeur_nette_minimale': lambda projection, horizons: _masque(projection.valeur_nette, horizons,
+                                                                  np.inf).min(axis=1),
+    'rendement_fonds_propres_moyen': lambda projection, horizons: _masque(
+        projection.rendement_fonds_propres, horizons, 0.0).sum(axis=1) / horizons,
+    'rendement_brut_moyen': lambda projection, horizons: _masque(projection.rendement_brut, horizons,
+                                                                 0.0).sum(axis=1) / horizons,
+}
+
+
+@dataclass(frozen=True)
+class ResultatObjectif:
+    """Solution de la recherche d'objectif pour chaque scénario
+
+    valeurs vaut NaN lorsque l'indicateur ne franchit pas la cible dans
+    l'intervalle de recherche (statut « toujours atteint » ou « jamais
+    atteint ») ; indicateurs donne alors la valeur à la borne la plus
+    favorable.
+    """
+    variable: str
+    indicateur: str
+    index: np.ndarray
+    valeurs: np.ndarray
+    indicateurs: np.ndarray
+    statuts: np.ndarray
+    iterations: int
+
+    @property
+    def nb_atteints(self):
+        """Nombre de scénarios pour lesquels la cible est franchie dans l'intervalle"""
+        return int(np.count_nonzero(self.statuts == STATUT_ATTEINT))
+
+    def to_dataframe(self):
+        """Tableau des solutions : une ligne par scénario"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        return pd.DataFrame({self.variable: self.valeurs, self.indicateur: self.indicateurs, "Statut": self.statuts},
+                            index=self.index)
+
+
+def _colonnes_scenarios(scenarios):
+    """Scénarios en colonnes de même longueur (un dictionnaire params de scalaires donne un scénario)
+
+    Les options de structure du prêt présentes sont gardées, en colonnes d'objets.
+    """
+    if hasattr(scenarios, 'columns'):
+        return scenarios
+    colonnes = {cle: np.atleast_1d(np.asarray(scenarios[cle], dtype=float))
+                for cle in PARAMETRES_SCENARIO if cle in scenarios}
+    colonnes.update({cle: np.atleast_1d(np.asarray(scenarios[cle], dtype=object))
+                     for cle in PARAMETRES_PRET_DEFAUT if cle in scenarios})
+    return dict(zip(colonnes, np.broadcast_arrays(*colonnes.values())))
+
+
+def _bornes(variable, bornes, tolerance, nb_scenarios):
+    """Bornes (S,) et tolérance (S,) de la recherche, valeurs par défaut de la variable comprises"""
+    if bornes is None or tolerance is None:
+        if variable not in VARIABLES_OBJECTIF:
+            raise ValueError(f"Indiquez bornes et tolerance pour la variable {variable}")
+        basse, haute, tolerance_defaut = VARIABLES_OBJECTIF[variable]
+        bornes = (basse, haute) if bornes is None else bornes
+        tolerance = tolerance_defaut if tolerance is None else tolerance
+    basse, haute, tolerance = (np.broadcast_to(np.asarray(valeur, dtype=float), (nb_scenarios,))
+                               for valeur in (*bornes, tolerance))
+    if np.any(haute <= basse) or np.any(tolerance <= 0):
+        raise ValueError("Les bornes doivent vérifier basse < haute et la tolérance être strictement positive")
+    return basse, haute, tolerance
+
+
+def _resoudre_bloc(matrice, colonne, basse, haute, tolerance, objectif, iterations_max, effet_emprunt, options):
+    """Recherche sur un bloc de scénarios ; renvoie (valeurs, indicateurs, statuts, itérations)
+
+    objectif est le triplet (fonction indicateur, cibles du bloc, signe) :
+    signe vaut -1 lorsque l'objectif est atteint sous la cible. options
+    donne les options du prêt des scénarios du bloc (voir options_scenarios).
+    """
+    fonction_indicateur, cible, signe = objectif
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    annees = np.arange(1, int(horizons.max()) + 1)
+    colonne_emprunt = PARAMETRES_SCENARIO.index('emprunt')
+    initiales = matrice[:, colonne].copy()
+
+    def evaluer(lignes, valeurs):
+        """Écart signé à la cible (positif ou nul si l'objectif est atteint) et valeur de l'indicateur"""
+        sous_matrice = matrice[lignes]
+        sous_matrice[:, colonne] = valeurs
+        if effet_emprunt:
+            sous_matrice[:, colonne_emprunt] += effet_emprunt * (valeurs - initiales[lignes])
+        projection = _projeter_bloc(sous_matrice, annees, {cle: option[lignes] for cle, option in options.items()})
+        indicateur = fonction_indicateur(projection, horizons[lignes])
+        return signe * (indicateur - cible[lignes]), indicateur
+
+    tous = np.arange(len(matrice))
+    ecart_bas, indicateur_bas = evaluer(tous, basse)
+    ecart_haut, indicateur_haut = evaluer(tous, haute)
+    atteint_bas, atteint_haut = ecart_bas >= 0, ecart_haut >= 0
+
+    # Intervalle orienté : a (objectif atteint) et b (non atteint), pour les scénarios où la cible est franchie
+    franchit = atteint_bas != atteint_haut
+    a = np.where(atteint_bas, basse, haute)
+    b = np.where(atteint_bas, haute, basse)
+    indicateurs = np.where(ecart_bas >= ecart_haut, indicateur_bas, indicateur_haut)
+    statuts = np.where(franchit, STATUT_ATTEINT, np.where(atteint_bas, STATUT_TOUJOURS, STATUT_JAMAIS))
+
+    ecart_a = np.where(atteint_bas, ecart_bas, ecart_haut)
+    ecart_b = np.where(atteint_bas, ecart_haut, ecart_bas)
+    dichotomie = np.zeros(len(matrice), dtype=bool)
+
+    actifs = np.flatnonzero(franchit & (np.abs(b - a) > tolerance))
+    iterations = 0
+    while len(actifs) and iterations < iterations_max:
+        # Point de fausse position (milieu si l'itération précédente n'a pas divisé l'intervalle par deux),
+        # encadré par deux points distants d'une demi-tolérance : un indicateur linéaire est résolu en une itération
+        a_actifs, b_actifs, largeur = a[actifs], b[actifs], np.abs(b[actifs] - a[actifs])
+        position = np.where(dichotomie[actifs], 0.5, ecart_a[actifs] / (ecart_a[actifs] - ecart_b[actifs]))
+        demi_pas = np.sign(b_actifs - a_actifs) * tolerance[actifs] / 4
+        centre = a_actifs + position * (b_actifs - a_actifs)
+        points = np.concatenate([centre - demi_pas, centre + demi_pas])
+        ecarts, valeurs_indicateur = evaluer(np.tile(actifs, 2), points)
+
+        # Le point le plus proche de b d'abord : un point hors de l'intervalle mis à jour est ignoré
+        for moitie in (slice(len(actifs), None), slice(None, len(actifs))):
+            point, ecart, valeur = points[moitie], ecarts[moitie], valeurs_indicateur[moitie]
+            interieur = (point - a[actifs]) * (b[actifs] - point) > 0
+            vers_a, vers_b = interieur & (ecart >= 0), interieur & (ecart < 0)
+            a[actifs[vers_a]], ecart_a[actifs[vers_a]] = point[vers_a], ecart[vers_a]
+            indicateurs[actifs[vers_a]] = valeur[vers_a]
+            b[actifs[vers_b]], ecart_b[actifs[vers_b]] = point[vers_b], ecart[vers_b]
+
+        dichotomie[actifs] = np.abs(b[actifs] - a[actifs]) > largeur / 2
+        actifs = actifs[np.abs(b[actifs] - a[actifs]) > tolerance[actifs]]
+        iterations += 1
+    return np.where(franchit, a, np.nan), indicateurs, statuts, iterations
+
+
+@instrumente()
+def resoudre_objectif(scenarios, variable, indicateur, cible=0.0, sens='>=', bornes=None, tolerance=None,
+                      emprunt_lie=True, iterations_max=100, taille_bloc=10000) -> ResultatObjectif:
+    """Cherche, pour chaque scénario, la valeur de variable qui amène indicateur à la cible
+
+    scenarios est une table de scénarios (DataFrame ou dictionnaire de
+    colonnes, comme pour simuler_lot) ou un dictionnaire params ; cible,
+    bornes et tolerance sont des scalaires ou des tableaux (un élément par
+    scénario). indicateur est une clé de INDICATEURS_OBJECTIF et sens '>='
+    ou '<=' le sens dans lequel l'objectif est atteint. Avec emprunt_lie,
+    une variation du prix, des travaux ou de l'apport est reportée sur
+    l'emprunt, comme dans l'application. Les options de structure du prêt
+    (assurance, différé, in fine...) sont prises en compte.
+    """
+    if variable not in PARAMETRES_SCENARIO or variable == 'duree_projection':
+        raise ValueError(f"Variable non prise en charge : {variable}")
+    if indicateur not in INDICATEURS_OBJECTIF:
+        raise ValueError(f"Indicateur inconnu : {indicateur} (attendu : {', '.join(INDICATEURS_OBJECTIF)})")
+    if sens not in ('>=', '<='):
+        raise ValueError(f"Sens inconnu : {sens!r} (attendu '>=' ou '<=')")
+
+    # Un scénario unique est répété si plusieurs cibles ou bornes sont données
+    colonnes = _colonnes_scenarios(scenarios)
+    matrice = matrice_scenarios(colonnes)
+    formes = [np.shape(valeur) for valeur in (cible, *(bornes or ()), tolerance) if valeur is not None]
+    nb_scenarios = np.broadcast_shapes((len(matrice),), *formes)[0]
+    matrice = np.broadcast_to(matrice, (nb_scenarios, matrice.shape[1]))
+    options = {cle: np.broadcast_to(option, (nb_scenarios,)) for cle, option in options_scenarios(colonnes).items()}
+    basse, haute, tolerance = _bornes(variable, bornes, tolerance, nb_scenarios)
+    cible = np.broadcast_to(np.asarray(cible, dtype=float), (nb_scenarios,))
+    signe = 1.0 if sens == '>=' else -1.0
+    effet_emprunt = EFFETS_SUR_EMPRUNT.get(variable, 0.0) if emprunt_lie else 0.0
+    colonne = PARAMETRES_SCENARIO.index(variable)
+
+    valeurs, indicateurs = np.empty(nb_scenarios), np.empty(nb_scenarios)
+    statuts = np.empty(nb_scenarios, dtype=object)
+    iterations = 0
+    for debut in range(0, nb_scenarios, taille_bloc):
+        bloc = slice(debut, debut + taille_bloc)
+        valeurs[bloc], indicateurs[bloc], statuts[bloc], iterations_bloc = _resoudre_bloc(
+            matrice[bloc], colonne, basse[bloc], haute[bloc], tolerance[bloc],
+            (INDICATEURS_OBJECTIF[indicateur], cible[bloc], signe), iterations_max, effet_emprunt,
+            {cle: option[bloc] for cle, option in options.items()}
+        )
+        iterations = max(iterations, iterations_bloc)
+
+    index = np.arange(nb_scenarios)
+    if hasattr(scenarios, 'columns') and len(scenarios) == nb_scenarios:
+        index = np.asarray(scenarios.index)
+    return ResultatObjectif(variable=variable, indicateur=indicateur, index=index, valeurs=valeurs,
+                            indicateurs=indicateurs, statuts=statuts, iterations=iterations)
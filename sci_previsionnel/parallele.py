@@ -0,0 +1,147 @@
+"""Exécution multi-processus des simulations par lot et Monte Carlo
+
+Les scénarios d'un lot sont placés dans une matrice en mémoire partagée :
+chaque processus calcule une tranche contiguë et écrit ses indicateurs (et,
+sur demande, le détail annuel) directement dans des matrices partagées, sans
+sérialiser de DataFrame. Les tranches étant disjointes, le résultat ne
+dépend pas de l'ordre de fin des processus. Pour le Monte Carlo, chaque bloc
+garde sa graine propre et les agrégats partiels sont fusionnés dans l'ordre
+des blocs : le résultat est identique quel que soit le nombre de processus.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .demarrage import nb_workers_defaut
+from .instrumentation import instrumente
+from .lot import (
+    COLONNES_RESUME, PARAMETRES_SCENARIO, _calculer_blocs, _resultat_lot, matrice_scenarios, options_scenarios,
+    simuler_lot
+)
+from .monte_carlo import AgregatMonteCarlo, _simuler_bloc, decouper_chemins, simuler_monte_carlo
+from .projection import COLONNES_PROJECTION
+
+# En dessous de ce nombre de scénarios, le démarrage des processus coûte plus qu'il ne rapporte
+SEUIL_PARALLELE = 20000
+# Idem en nombre de chemins Monte Carlo (200 000 chemins : 1,5 s en série, 3,2 s sur 4 processus)
+SEUIL_PARALLELE_MONTE_CARLO = 500000
+
+
+def _creer_partage(forme):
+    """Alloue un tableau de flottants en mémoire partagée"""
+    taille = max(int(np.prod(forme)) * 8, 1)
+    memoire = shared_memory.SharedMemory(create=True, size=taille)
+    return memoire, np.ndarray(forme, dtype=np.float64, buffer=memoire.buf)
+
+
+def _attacher_partage(nom, forme):
+    """Attache un tableau partagé créé par le processus parent"""
+    # Les processus fils partagent le resource_tracker du parent, seul responsable de la libération
+    memoire = shared_memory.SharedMemory(name=nom)
+    return memoire, np.ndarray(forme, dtype=np.float64, buffer=memoire.buf)
+
+
+def _decouper(nb_elements, nb_parts):
+    """Découpe [0, nb_elements) en nb_parts tranches contiguës de tailles équilibrées"""
+    bornes = np.linspace(0, nb_elements, nb_parts + 1).astype(int)
+    return [(int(debut), int(fin)) for debut, fin in zip(bornes[:-1], bornes[1:]) if fin > debut]
+
+
+def _contexte():
+    """Contexte de création des processus ('spawn' : sûr depuis le serveur Streamlit multi-thread)"""
+    return multiprocessing.get_context('spawn')
+
+
+def _tache_lot(partages, debut, fin, nb_annees, taille_bloc, options):
+    """Calcule une tranche de scénarios dans un processus fils (options : celles de la tranche)"""
+    attaches = {cle: _attacher_partage(nom, forme) for cle, (nom, forme) in partages.items()}
+    try:
+        _calculer_blocs(
+            attaches['matrice'][1], debut, fin, np.arange(1, nb_annees + 1), taille_bloc,
+            attaches['resume'][1], attaches['details'][1] if 'details' in attaches else None, options
+        )
+    finally:
+        for memoire, _ in attaches.values():
+            memoire.close()
+
+
+@instrumente()
+def executer_lot(scenarios, nb_workers=None, details=False, taille_bloc=10000, seuil_parallele=SEUIL_PARALLELE):
+    """Équivalent multi-processus de simuler_lot
+
+    Les entrées et sorties transitent par mémoire partagée ; en dessous de
+    seuil_parallele scénarios (ou avec un seul processus) le calcul reste
+    dans le processus courant.
+    """
+    nb_workers = nb_workers or nb_workers_defaut()
+    if nb_workers <= 1 or len(np.asarray(scenarios['duree_projection'])) < seuil_parallele:
+        return simuler_lot(scenarios, details=details, taille_bloc=taille_bloc)
+
+    matrice = matrice_scenarios(scenarios)
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    annees = np.arange(1, int(horizons.max(initial=1)) + 1)
+    options = options_scenarios(scenarios)
+    formes = {'matrice': matrice.shape, 'resume': (len(matrice), len(COLONNES_RESUME))}
+    if details:
+        formes['details'] = (len(COLONNES_PROJECTION) - 1, len(matrice), len(annees))
+
+    memoires = {}
+    try:
+        tableaux = {}
+        for cle, forme in formes.items():
+            memoires[cle], tableaux[cle] = _creer_partage(forme)
+        tableaux['matrice'][:] = matrice
+        partages = {cle: (memoires[cle].name, forme) for cle, forme in formes.items()}
+
+        with ProcessPoolExecutor(max_workers=nb_workers, mp_context=_contexte()) as executeur:
+            taches = [executeur.submit(_tache_lot, partages, debut, fin, len(annees), taille_bloc,
+                                       {cle: valeurs[debut:fin] for cle, valeurs in options.items()})
+                      for debut, fin in _decouper(len(matrice), nb_workers)]
+            for tache in taches:
+                tache.result()
+
+        resume = tableaux['resume'].copy()
+        detail = tableaux['details'].copy() if details else None
+        del tableaux
+    finally:
+        for memoire in memoires.values():
+            memoire.close()
+            memoire.unlink()
+    return _resultat_lot(scenarios, horizons, annees, resume, detail)
+
+
+def _tache_monte_carlo(params_f, config, blocs, agregat):
+    """Simule une suite de blocs de chemins dans un processus fils"""
+    tailles, graines = decouper_chemins(config)
+    for indice in blocs:
+        agregat.ajouter(_simuler_bloc(params_f, config, tailles[indice], graines[indice]))
+    return agregat
+
+
+@instrumente()
+def executer_monte_carlo(params_f, config, nb_workers=None, seuil_parallele=SEUIL_PARALLELE_MONTE_CARLO):
+    """Équivalent multi-processus de simuler_monte_carlo
+
+    Le premier bloc est simulé dans le processus courant pour fixer la
+    géométrie des histogrammes ; les blocs suivants sont répartis en
+    tranches contiguës puis fusionnés dans l'ordre. En dessous de
+    seuil_parallele chemins (ou avec un seul processus ou un seul bloc) le
+    calcul reste dans le processus courant.
+    """
+    nb_workers = nb_workers or nb_workers_defaut()
+    tailles, graines = decouper_chemins(config)
+    if nb_workers <= 1 or len(tailles) <= 1 or config.nb_chemins < seuil_parallele:
+        return simuler_monte_carlo(params_f, config)
+
+    agregat = AgregatMonteCarlo(int(params_f['duree_projection']))
+    agregat.ajouter(_simuler_bloc(params_f, config, tailles[0], graines[0]))
+    tranches = _decouper(len(tailles) - 1, nb_workers)
+    with ProcessPoolExecutor(max_workers=nb_workers, mp_context=_contexte()) as executeur:
+        taches = [executeur.submit(_tache_monte_carlo, params_f, config,
+                                   range(debut + 1, fin + 1), agregat.copie_vide())
+                  for debut, fin in tranches]
+        for tache in taches:
+            agregat.fusionner(tache.result())
+    return agregat.resultat(config)
@@ -0,0 +1,204 @@
+"""Portefeuille d'une SCI : plusieurs lots acquis à des dates différentes, IS calculé au niveau de la société
+
+Chaque lot a son année d'acquisition, son prix, ses travaux, sa part de
+terrain et son prêt. Les lots sont calculés ensemble en tableaux (lot × année)
+sur le calendrier de la société (année 1 = première année de la
+projection), puis agrégés : le résultat fiscal consolidé est soumis une seule
+fois par an au barème progressif de l'IS, comme le fait l'administration. Le
+déficit d'un lot réduit donc le bénéfice des autres, et le taux réduit ne
+s'applique qu'une fois aux 42 500 premiers euros de la société.
+
+Les montants d'un lot (loyers, charges) sont exprimés à sa date
+d'acquisition et indexés à partir de celle-ci. Les options de structure du
+prêt (assurance, différé, in fine, remboursement anticipé) se donnent par
+lot, comme pour la projection d'un bien.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import instrumente
+from .lot import options_scenarios
+from .pret import flux_pret_annuels, flux_pret_general_annuels
+from .projection import Projection, impot_societes
+
+# Colonnes d'une table de lots (une ligne par lot)
+PARAMETRES_LOT = [
+    'annee_acquisition', 'prix_achat', 'travaux', 'pourcentage_terrain', 'duree_amortissement',
+    'loyers_mensuels', 'revalorisation_loyers', 'appreciation_immobilier', 'indexation_charges',
+    'taxe_fonciere', 'assurance', 'frais_gestion', 'entretien', 'apport', 'emprunt', 'taux_credit',
+    'duree_credit'
+]
+PARAMETRES_LOT_DEFAUT = {'annee_acquisition': 1, 'pourcentage_terrain': 0.2, 'duree_amortissement': 20}
+
+# Paramètres propres à la société (frais non rattachés à un lot)
+PARAMETRES_SOCIETE_DEFAUT = {'frais_comptable': 0.0, 'indexation_charges': 0.0}
+
+# Contributions de chaque lot, dans l'ordre du détail par lot : (libellé, attribut de ResultatPortefeuille)
+COLONNES_LOTS = [
+    ("Loyers annuels", "loyers"),
+    ("Charges annuelles", "charges"),
+    ("Mensualités crédit", "credit"),
+    ("dont Intérêts", "interets"),
+    ("dont Capital", "capital"),
+    ("Capital restant dû", "capital_restant"),
+    ("Amortissement annuel", "amortissement"),
+    ("Contribution au résultat fiscal", "contribution_fiscale"),
+    ("Valeur du bien", "valeur_bien"),
+]
+
+
+@dataclass(frozen=True)
+class ResultatPortefeuille:
+    """Projection consolidée de la société et contributions de chaque lot (tableaux lot × année)"""
+    societe: Projection
+    index: np.ndarray
+    annees_acquisition: np.ndarray
+    loyers: np.ndarray
+    charges: np.ndarray
+    credit: np.ndarray
+    interets: np.ndarray
+    capital: np.ndarray
+    capital_restant: np.ndarray
+    amortissement: np.ndarray
+    valeur_bien: np.ndarray
+
+    @property
+    def nb_lots(self):
+        """Nombre de lots du portefeuille"""
+        return len(self.index)
+
+    @property
+    def contribution_fiscale(self):
+        """Résultat fiscal de chaque lot avant frais de la société (loyers - charges - intérêts - amortissement)"""
+        return self.loyers - self.charges - self.interets - self.amortissement
+
+    def to_dataframe(self):
+        """Tableau de résultats de la société, dans le format de la projection d'un bien"""
+        return self.societe.to_dataframe()
+
+    def detail_lots(self):
+        """Contributions année par année de chaque lot, à partir de son acquisition (format long)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        possede = self.societe.annees >= self.annees_acquisition[:, None]
+        lignes, colonnes_annees = np.nonzero(possede)
+        colonnes = {"Lot": self.index[lignes], "Année": self.societe.annees[colonnes_annees]}
+        for libelle, attribut in COLONNES_LOTS:
+            colonnes[libelle] = np.trunc(getattr(self, attribut)[possede]).astype(np.int64)
+        return pd.DataFrame(colonnes)
+
+
+def _colonnes_lots(lots):
+    """Paramètres d'une table de lots en colonnes (L, 1), valeurs par défaut comprises"""
+    nb_lots = len(np.asarray(lots['prix_achat']))
+    colonnes = {}
+    for cle in PARAMETRES_LOT:
+        if cle in lots:
+            colonnes[cle] = np.asarray(lots[cle], dtype=float).reshape(-1, 1)
+        elif cle in PARAMETRES_LOT_DEFAUT:
+            colonnes[cle] = np.full((nb_lots, 1), float(PARAMETRES_LOT_DEFAUT[cle]))
+        else:
+            raise ValueError(f"Paramètre de lot manquant : {cle}")
+    acquisition = colonnes['annee_acquisition']
+    if np.any(acquisition < 1) or np.any(acquisition != np.floor(acquisition)):
+        raise ValueError("Les années d'acquisition doivent être des entiers supérieurs ou égaux à 1")
+    return colonnes
+
+
+@instrumente()
+def projeter_portefeuille(lots, societe) -> ResultatPortefeuille:
+    """Projette un portefeuille de lots et calcule l'IS sur le résultat consolidé de la société
+
+    lots est une table de lots (DataFrame ou dictionnaire de colonnes)
+    indexée par PARAMETRES_LOT, options de structure du prêt facultatives
+    (une valeur par lot, voir options_scenarios) ; societe fournit
+    duree_projection et, facultativement, les frais comptables annuels de la
+    société et leur indexation. Un lot acquis après l'horizon ne contribue à
+    aucune année.
+    """
+    params = _colonnes_lots(lots)
+    societe = {**PARAMETRES_SOCIETE_DEFAUT, **societe}
+    annees = np.arange(1, int(societe['duree_projection']) + 1)
+
+    # Rang de chaque année dans la vie du lot (0 l'année d'acquisition), masqué avant l'acquisition
+    rang = annees - params['annee_acquisition']
+    possede = rang >= 0
+    rang = np.maximum(rang, 0)
+
+    # Prêts calculés sur leur propre calendrier, puis décalés à l'année d'acquisition ; assurance
+    # emprunteur et indemnités de remboursement anticipé comptées dans les charges du lot
+    options = options_scenarios(lots, len(params['prix_achat']))
+    if options:
+        flux = flux_pret_general_annuels(params['emprunt'][:, 0], params['taux_credit'][:, 0],
+                                         params['duree_credit'][:, 0], len(annees), **options)
+    else:
+        flux = (*flux_pret_annuels(params['emprunt'], params['taux_credit'], params['duree_credit'], len(annees)),
+                np.zeros(possede.shape))
+    credit, interets, capital, frais_pret = (
+        np.where(possede, np.take_along_axis(f, rang.astype(np.intp), axis=1), 0.0) for f in flux
+    )
+    capital_restant = np.where(possede, params['emprunt'] - np.cumsum(capital, axis=1), 0.0)
+
+    loyers = np.where(possede, params['loyers_mensuels'] * 12 * (1 + params['revalorisation_loyers']) ** rang, 0.0)
+    charges_lot = params['taxe_fonciere'] + params['assurance'] + params['frais_gestion'] + params['entretien']
+    charges = np.where(possede, charges_lot * (1 + params['indexation_charges']) ** rang, 0.0) + frais_pret
+    valeur_bien = np.where(possede, params['prix_achat'] * (1 + params['appreciation_immobilier']) ** rang, 0.0)
+
+    valeur_bati = params['prix_achat'] * (1 - params['pourcentage_terrain']) + params['travaux']
+    duree_amortissement = params['duree_amortissement']
+    amortissement = np.where(possede & (rang < duree_amortissement), valeur_bati / duree_amortissement, 0.0)
+
+    # Consolidation : un seul résultat fiscal, donc un seul passage au barème de l'IS, par année
+    frais_societe = societe['frais_comptable'] * (1 + societe['indexation_charges']) ** (annees - 1)
+    loyers_societe = loyers.sum(axis=0)
+    charges_societe = charges.sum(axis=0) + frais_societe
+    credit_societe = credit.sum(axis=0)
+    interets_societe = interets.sum(axis=0)
+    capital_societe = capital.sum(axis=0)
+    amortissement_societe = amortissement.sum(axis=0)
+    resultat_fiscal = loyers_societe - charges_societe - interets_societe - amortissement_societe
+    impot = impot_societes(resultat_fiscal)
+    cashflow = loyers_societe - charges_societe - credit_societe - impot
+    capital_restant_societe = capital_restant.sum(axis=0)
+    valeur_societe = valeur_bien.sum(axis=0)
+
+    # Rendements rapportés aux apports et aux prix des lots détenus chaque année
+    apports = (params['apport'] * possede).sum(axis=0)
+    prix = (params['prix_achat'] * possede).sum(axis=0)
+    rendement_fonds_propres = np.divide(cashflow, apports, out=np.zeros_like(cashflow), where=apports > 0) * 100
+    rendement_brut = np.divide(loyers_societe, prix, out=np.zeros_like(loyers_societe), where=prix > 0) * 100
+
+    projection = Projection(
+        annees=annees,
+        loyers=loyers_societe,
+        charges=charges_societe,
+        credit=credit_societe,
+        interets=interets_societe,
+        capital=capital_societe,
+        capital_cumule=np.cumsum(capital_societe),
+        capital_restant=capital_restant_societe,
+        amortissement=amortissement_societe,
+        resultat_fiscal=resultat_fiscal,
+        impot=impot,
+        resultat_reel=loyers_societe - charges_societe - interets_societe,
+        cashflow=cashflow,
+        cashflow_cumule=np.cumsum(cashflow),
+        valeur_bien=valeur_societe,
+        valeur_nette=valeur_societe - capital_restant_societe,
+        rendement_fonds_propres=rendement_fonds_propres,
+        rendement_brut=rendement_brut
+    )
+    index = np.asarray(lots.index) if hasattr(lots, 'index') else np.arange(len(params['prix_achat']))
+    return ResultatPortefeuille(
+        societe=projection,
+        index=index,
+        annees_acquisition=params['annee_acquisition'][:, 0].astype(np.int64),
+        loyers=loyers,
+        charges=charges,
+        credit=credit,
+        interets=interets,
+        capital=capital,
+        capital_restant=capital_restant,
+        amortissement=amortissement,
+        valeur_bien=valeur_bien
+    )
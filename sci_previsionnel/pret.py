@@ -0,0 +1,433 @@
+"""Échéanciers de prêt vectorisés (annuités constantes, taux révisable, structures générales)"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import instrumente
+
+
+def _nb_mois(duree_annees):
+    """Nombre de mensualités d'une durée en années, arrondi au mois le plus proche (règle de tous les moteurs)"""
+    return np.rint(np.asarray(duree_annees, dtype=float) * 12).astype(np.int64)
+
+
+@dataclass(frozen=True)
+class Echeancier:
+    """Échéancier mensuel d'un prêt, stocké sous forme de tableaux NumPy"""
+    mensualite: float
+    interets: np.ndarray
+    capital: np.ndarray
+    capital_restant: np.ndarray
+
+    @property
+    def nb_mois(self):
+        """Nombre de mensualités du prêt"""
+        return len(self.interets)
+
+    def annuel(self, nb_annees=None):
+        """Agrège l'échéancier par année (mensualités, intérêts, capital)
+
+        Les mois sont remis en forme en un tableau années × 12 puis sommés
+        (dernière année incomplète si la durée n'est pas un nombre entier
+        d'années). Si nb_annees est fourni, le résultat est tronqué ou
+        complété par des zéros (années postérieures à la fin du prêt).
+        """
+        if nb_annees is None:
+            nb_annees = -(-self.nb_mois // 12)
+        mensualites = _par_annee(np.full(self.nb_mois, self.mensualite), nb_annees)
+        return mensualites, _par_annee(self.interets, nb_annees), _par_annee(self.capital, nb_annees)
+
+    def frais_annuels(self, nb_annees=None):
+        """Assurance et indemnités annuelles : aucune pour un prêt à annuités constantes simple"""
+        return np.zeros(-(-self.nb_mois // 12) if nb_annees is None else nb_annees)
+
+    @instrumente('Echeancier.to_dataframe')
+    def to_dataframe(self):
+        """Construit le tableau d'amortissement mensuel au format DataFrame"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        return pd.DataFrame({
+            'Mois': np.arange(1, self.nb_mois + 1),
+            'Mensualité': np.full(self.nb_mois, self.mensualite),
+            'Intérêts': self.interets,
+            'Capital': self.capital,
+            'Capital Restant': self.capital_restant
+        })
+
+
+@instrumente()
+def echeancier_pret(montant, taux_annuel, duree_annees):
+    """Calcule l'échéancier d'un prêt à annuités constantes sans boucle mensuelle
+
+    Le capital restant dû après k mois suit la formule fermée de l'annuité :
+    B(k) = M·(1+r)^k − m·((1+r)^k − 1)/r, évaluée en une passe vectorisée.
+    """
+    nb_mois = int(_nb_mois(duree_annees))
+    taux_mensuel = taux_annuel / 12
+    if nb_mois <= 0:
+        vide = np.zeros(0)
+        return Echeancier(0.0, vide, vide, vide)
+
+    k = np.arange(nb_mois + 1)
+    if taux_mensuel == 0:
+        mensualite_credit = montant / nb_mois
+        restant = montant - mensualite_credit * k
+    else:
+        # expm1/log1p évitent la perte de précision pour les taux très faibles
+        croissance = np.expm1(k * np.log1p(taux_mensuel))
+        mensualite_credit = float(montant * taux_mensuel * (1 + croissance[-1]) / croissance[-1])
+        restant = montant * (1 + croissance) - mensualite_credit * croissance / taux_mensuel
+
+    interets = restant[:-1] * taux_mensuel
+    capital = mensualite_credit - interets
+    return Echeancier(mensualite_credit, interets, capital, np.maximum(0, restant[1:]))
+
+
+def flux_pret_annuels(montant, taux_annuel, duree_annees, nb_annees):
+    """Calcule mensualités, intérêts et capital annuels d'un lot de prêts à annuités constantes
+
+    Le capital restant dû en fin d'année est obtenu par la formule fermée de
+    l'annuité, sans passer par l'échéancier mensuel. Les arguments peuvent être
+    des colonnes de forme (S, 1) ; le résultat est de forme (S, nb_annees).
+    """
+    montant = np.asarray(montant, dtype=float)
+    taux_mensuel = np.asarray(taux_annuel, dtype=float) / 12
+    nb_mois = _nb_mois(duree_annees)
+    mois_ecoules = np.minimum(12 * np.arange(nb_annees + 1), nb_mois)
+
+    # Taux nul : remboursement linéaire du capital ; les divisions sont protégées
+    taux_nul = taux_mensuel == 0
+    taux_sur = np.where(taux_nul, 1.0, taux_mensuel)
+    croissance = np.expm1(mois_ecoules * np.log1p(taux_mensuel))
+    croissance_totale = np.expm1(nb_mois * np.log1p(taux_mensuel))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mensualite = np.where(
+            taux_nul,
+            montant / np.maximum(nb_mois, 1),
+            montant * taux_sur * (1 + croissance_totale) / np.where(taux_nul, 1.0, croissance_totale)
+        )
+    mensualite = np.where(nb_mois > 0, mensualite, 0.0)
+    restant = np.where(
+        taux_nul,
+        montant - mensualite * mois_ecoules,
+        montant * (1 + croissance) - mensualite * croissance / taux_sur
+    )
+
+    capital = restant[..., :-1] - restant[..., 1:]
+    credit = mensualite * np.diff(mois_ecoules, axis=-1)
+    return credit, credit - capital, capital
+
+
+def flux_pret_variable(montant, taux_annuels, duree_annees, nb_annees):
+    """Flux annuels d'un prêt à taux révisable annuellement, vectorisés sur les chemins
+
+    taux_annuels est de forme (chemins, années) ; chaque année la mensualité
+    est recalculée sur le capital restant dû et la durée résiduelle (la
+    dernière année est incomplète si la durée n'est pas un nombre entier
+    d'années).
+    """
+    nb_chemins = taux_annuels.shape[0]
+    credit = np.zeros((nb_chemins, nb_annees))
+    capital = np.zeros((nb_chemins, nb_annees))
+    restant = np.full(nb_chemins, float(montant))
+    nb_mois = int(_nb_mois(duree_annees))
+    for annee in range(min(nb_annees, -(-nb_mois // 12))):
+        mois_restants = nb_mois - 12 * annee
+        mois_annee = min(12, mois_restants)
+        taux_mensuel = taux_annuels[:, annee] / 12
+        taux_nul = taux_mensuel == 0
+        taux_sur = np.where(taux_nul, 1.0, taux_mensuel)
+        croissance = np.expm1(mois_annee * np.log1p(taux_mensuel))
+        croissance_totale = np.expm1(mois_restants * np.log1p(taux_mensuel))
+        mensualite = np.where(
+            taux_nul,
+            restant / mois_restants,
+            restant * taux_sur * (1 + croissance_totale) / np.where(taux_nul, 1.0, croissance_totale)
+        )
+        nouveau_restant = np.where(
+            taux_nul,
+            restant - mois_annee * mensualite,
+            restant * (1 + croissance) - mensualite * croissance / taux_sur
+        )
+        credit[:, annee] = mois_annee * mensualite
+        capital[:, annee] = restant - nouveau_restant
+        restant = nouveau_restant
+    return credit, credit - capital, capital
+
+
+# Options de structure du prêt lues dans le dictionnaire params, avec leur valeur par défaut
+PARAMETRES_PRET_DEFAUT = {
+    'taux_assurance': 0.0,
+    'assurance_sur': 'initial',
+    'differe_mois': 0,
+    'type_differe': 'partiel',
+    'in_fine': False,
+    'mois_remboursement_anticipe': 0,
+    'montant_remboursement_anticipe': 0.0,
+    'mode_remboursement_anticipe': 'mensualite',
+}
+PARAMETRES_PRET = ['emprunt', 'taux_credit', 'duree_credit', *PARAMETRES_PRET_DEFAUT]
+
+# Indemnités de remboursement anticipé : six mois d'intérêts sur le capital remboursé, dans la limite de 3 % du capital dû
+MOIS_INDEMNITES = 6
+PLAFOND_INDEMNITES = 0.03
+
+
+def _par_annee(valeurs, nb_annees):
+    """Somme des valeurs mensuelles (dernier axe) par année, complétées par des zéros ou tronquées"""
+    nb_mois = 12 * nb_annees
+    largeur = valeurs.shape[-1]
+    if largeur < nb_mois:
+        valeurs = np.concatenate([valeurs, np.zeros(valeurs.shape[:-1] + (nb_mois - largeur,))], axis=-1)
+    return valeurs[..., :nb_mois].reshape(valeurs.shape[:-1] + (nb_annees, 12)).sum(axis=-1)
+
+
+@dataclass(frozen=True)
+class EcheancierGeneral:
+    """Échéanciers mensuels d'un lot de prêts de structures quelconques, de forme (prêts, mois)
+
+    Pour un prêt seul (arguments scalaires), les tableaux sont à une dimension.
+    Les intérêts sont ceux courus chaque mois ; pendant un différé total ils
+    sont capitalisés et le capital amorti est alors négatif.
+    """
+    mensualite: np.ndarray
+    interets: np.ndarray
+    capital: np.ndarray
+    assurance: np.ndarray
+    remboursement_anticipe: np.ndarray
+    indemnites: np.ndarray
+    capital_restant: np.ndarray
+
+    @property
+    def nb_mois(self):
+        """Nombre de mois de l'échéancier (celui du prêt le plus long)"""
+        return self.interets.shape[-1]
+
+    def annuel(self, nb_annees=None):
+        """Échéances (intérêts et capital, remboursement anticipé compris), intérêts et capital par année"""
+        if nb_annees is None:
+            nb_annees = -(-self.nb_mois // 12)
+        capital = _par_annee(self.capital + self.remboursement_anticipe, nb_annees)
+        interets = _par_annee(self.interets, nb_annees)
+        return interets + capital, interets, capital
+
+    def frais_annuels(self, nb_annees=None):
+        """Assurance emprunteur et indemnités de remboursement anticipé par année"""
+        if nb_annees is None:
+            nb_annees = -(-self.nb_mois // 12)
+        return _par_annee(self.assurance + self.indemnites, nb_annees)
+
+    @instrumente('EcheancierGeneral.to_dataframe')
+    def to_dataframe(self, pret=0):
+        """Tableau d'amortissement mensuel d'un prêt (le prêt d'indice pret pour un lot)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        def ligne(valeurs):
+            return valeurs[pret] if valeurs.ndim == 2 else valeurs
+
+        return pd.DataFrame({
+            'Mois': np.arange(1, self.nb_mois + 1),
+            'Mensualité': ligne(self.mensualite),
+            'Intérêts': ligne(self.interets),
+            'Capital': ligne(self.capital),
+            'Assurance': ligne(self.assurance),
+            'Remboursement anticipé': ligne(self.remboursement_anticipe),
+            'Indemnités': ligne(self.indemnites),
+            'Capital Restant': ligne(self.capital_restant)
+        })
+
+
+def _colonne(valeur, dtype=float):
+    """Argument par prêt mis en colonne (L, 1) ; un scalaire reste un scalaire"""
+    valeur = np.asarray(valeur, dtype=dtype)
+    return valeur.reshape(-1, 1) if valeur.ndim == 1 else valeur
+
+
+def taux_indexes(indice, marge, plancher=None, plafond=None):
+    """Barème de taux annuels d'un prêt indexé : indice de référence + marge, borné (prêt capé)
+
+    indice est de forme (années,) ou (prêts, années) ; le résultat s'utilise
+    comme taux_annuel de echeancier_general.
+    """
+    taux = np.atleast_2d(np.asarray(indice, dtype=float)) + _colonne(marge)
+    if plancher is not None or plafond is not None:
+        taux = np.clip(taux, plancher, plafond)
+    return taux
+
+
+def _valeur_du_mois(valeurs, colonne, forme=None):
+    """Valeur de chaque prêt au mois d'indice colonne (L, 1), valeurs étant diffusé à la forme (L, mois)"""
+    forme = valeurs.shape if forme is None else forme
+    return np.take_along_axis(np.broadcast_to(valeurs, forme),
+                              np.broadcast_to(colonne, forme[:-1] + (1,)), axis=-1)
+
+
+def _facteurs_solde(taux_mensuel, log_croissance, mois, fin, differe, differe_total, in_fine):
+    """Rapport du capital restant dû d'un mois sur le précédent, pour chaque prêt et chaque mois
+
+    L'échéance d'un prêt amortissable est recalculée chaque mois sur le
+    capital et la durée restants : à taux constant elle ne change pas, et
+    une révision du taux ou un remboursement anticipé sont pris en compte
+    sans boucle. Le capital restant dû est alors le produit cumulé de ces
+    facteurs, indépendants du capital lui-même. Les opérations sont faites
+    en place sur un seul tableau (prêts, mois).
+    """
+    restant = np.maximum(fin - mois, 1)
+    # Annuité par euro dû : r / (1 - (1+r)^-n), ou 1/n à taux nul
+    facteurs = np.multiply(restant, log_croissance)
+    np.negative(facteurs, out=facteurs)
+    np.expm1(facteurs, out=facteurs)
+    np.negative(facteurs, out=facteurs)
+    taux_nul = taux_mensuel == 0
+    if np.any(taux_nul):
+        np.copyto(facteurs, 1.0, where=taux_nul)
+        annuite_nulle = np.broadcast_to(1 / restant, facteurs.shape)
+    np.divide(taux_mensuel, facteurs, out=facteurs)
+    if np.any(taux_nul):
+        np.copyto(facteurs, annuite_nulle, where=taux_nul)
+    np.subtract(1 + taux_mensuel, facteurs, out=facteurs)
+
+    np.copyto(facteurs, 1.0, where=in_fine)
+    en_differe = mois < differe
+    np.copyto(facteurs, 1.0, where=en_differe)
+    np.copyto(facteurs, 1 + taux_mensuel, where=en_differe & differe_total)
+    # Dernière échéance : solde exact, sans résidu d'arrondi
+    np.copyto(facteurs, 0.0, where=mois >= fin - 1)
+    return facteurs
+
+
+@instrumente()
+def echeancier_general(montant, taux_annuel, duree_annees, differe_mois=0, type_differe='partiel', in_fine=False,
+                       taux_assurance=0.0, assurance_sur='initial', mois_remboursement_anticipe=0,
+                       montant_remboursement_anticipe=0.0, mode_remboursement_anticipe='mensualite',
+                       indemnites=True):
+    """Échéanciers mensuels d'un lot de prêts, calculés en tableaux (prêts, mois) sans boucle
+
+    Chaque argument est un scalaire ou un tableau d'une valeur par prêt.
+    taux_annuel peut aussi être un barème de forme (prêts, années) ou
+    (1, années) : taux par palier ou taux variable révisé chaque année (voir
+    taux_indexes), la dernière valeur s'appliquant jusqu'au terme.
+
+    - differe_mois : mois de différé au début du prêt, compris dans la durée ;
+      'partiel' (intérêts payés) ou 'total' (intérêts capitalisés).
+    - in_fine : seuls les intérêts sont payés, le capital l'est à la dernière échéance.
+    - taux_assurance : taux annuel de l'assurance emprunteur, sur le capital
+      'initial' ou 'restant' dû.
+    - remboursement anticipé du montant indiqué (np.inf : remboursement
+      total) à la fin du mois mois_remboursement_anticipe (0 : aucun),
+      suivi d'une baisse de la 'mensualite' ou de la 'duree' (arrondie au
+      mois supérieur) ; indemnites applique les indemnités légales.
+    """
+    montant = _colonne(montant)
+    duree_mois = _nb_mois(_colonne(duree_annees))
+    differe = _colonne(differe_mois, np.int64)
+    differe_total = _colonne(type_differe, object) == 'total'
+    in_fine = _colonne(in_fine, bool)
+    taux_assurance = _colonne(taux_assurance)
+    sur_restant = _colonne(assurance_sur, object) == 'restant'
+    mois_anticipe = _colonne(mois_remboursement_anticipe, np.int64)
+    montant_anticipe = _colonne(montant_remboursement_anticipe)
+    reduire_duree = _colonne(mode_remboursement_anticipe, object) == 'duree'
+
+    taux = np.asarray(taux_annuel, dtype=float)
+    bareme = taux.ndim == 2
+    taux = taux if bareme else _colonne(taux).reshape(-1, 1)
+    arguments = [montant, duree_mois, differe, differe_total, in_fine, taux_assurance, sur_restant,
+                 mois_anticipe, montant_anticipe, reduire_duree]
+    pret_seul = not bareme and all(np.ndim(argument) == 0 for argument in arguments) and taux.shape[0] == 1
+    if np.any(differe >= np.maximum(duree_mois, 1)):
+        raise ValueError("Le différé doit être plus court que la durée du prêt")
+
+    nb_mois = max(int(np.max(duree_mois)), 1)
+    mois = np.arange(nb_mois)
+    # Taux commun à tous les prêts : une seule ligne (1, mois), diffusée dans les calculs
+    taux_mensuel = taux[:, np.minimum(mois // 12, taux.shape[1] - 1)] / 12
+
+    # Capital restant dû en fin de mois : produit cumulé des facteurs mensuels
+    log_croissance = np.log1p(taux_mensuel)
+    facteurs = _facteurs_solde(taux_mensuel, log_croissance, mois, duree_mois, differe, differe_total, in_fine)
+    solde = montant * np.cumprod(facteurs, axis=-1)
+    solde_debut = np.concatenate([np.broadcast_to(montant, solde.shape[:-1] + (1,)), solde[..., :-1]], axis=-1)
+
+    # Remboursement anticipé en fin de mois mois_anticipe, après l'échéance du mois
+    anticipe = (mois_anticipe >= 1) & (mois_anticipe < duree_mois) & (montant_anticipe > 0)
+    colonne_anticipe = np.clip(mois_anticipe - 1, 0, nb_mois - 1)
+    du_avant = _valeur_du_mois(solde, colonne_anticipe)
+    rembourse = np.where(anticipe, np.minimum(montant_anticipe, du_avant), 0.0)
+    if np.any(anticipe):
+        du_apres = du_avant - rembourse
+        duree_reduite = anticipe & reduire_duree & ~in_fine & (mois_anticipe >= differe)
+        if np.any(duree_reduite):
+            # Nouvelle durée conservant l'échéance du mois du remboursement
+            taux_suivant = _valeur_du_mois(taux_mensuel, np.minimum(colonne_anticipe + 1, nb_mois - 1), solde.shape)
+            echeance = _valeur_du_mois(solde_debut * (1 + taux_mensuel) - solde, colonne_anticipe)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mois_restants = np.where(
+                    taux_suivant == 0, du_apres / echeance,
+                    -np.log1p(-du_apres * taux_suivant / echeance) / np.log1p(taux_suivant))
+            mois_restants = np.ceil(np.nan_to_num(mois_restants, nan=0.0, posinf=0.0) - 1e-9)
+            fin = np.where(duree_reduite & (mois >= mois_anticipe),
+                           mois_anticipe + mois_restants.astype(np.int64), duree_mois)
+            facteurs = _facteurs_solde(taux_mensuel, log_croissance, mois, fin, differe, differe_total, in_fine)
+            solde = montant * np.cumprod(facteurs, axis=-1)
+        rapport = np.divide(du_apres, du_avant, out=np.ones_like(du_avant), where=du_avant > 0)
+        solde = solde * np.where(anticipe & (mois >= colonne_anticipe), rapport, 1.0)
+        solde_debut = np.concatenate([solde_debut[..., :1], solde[..., :-1]], axis=-1)
+
+    mois_du_remboursement = anticipe & (mois == colonne_anticipe)
+    remboursement_anticipe = np.where(mois_du_remboursement, rembourse, 0.0)
+    interets = solde_debut * taux_mensuel
+    capital = solde_debut - solde - remboursement_anticipe
+    if indemnites:
+        taux_du_mois = _valeur_du_mois(taux_mensuel, colonne_anticipe, solde.shape)
+        plafond = np.minimum(rembourse * taux_du_mois * MOIS_INDEMNITES, du_avant * PLAFOND_INDEMNITES)
+        frais_anticipe = np.where(mois_du_remboursement, plafond, 0.0)
+    else:
+        frais_anticipe = np.zeros_like(interets)
+    assurance = np.where(sur_restant, solde_debut, montant) * taux_assurance / 12 * (solde_debut > 0)
+
+    resultat = EcheancierGeneral(
+        mensualite=interets + capital,
+        interets=interets,
+        capital=capital,
+        assurance=assurance,
+        remboursement_anticipe=remboursement_anticipe,
+        indemnites=frais_anticipe,
+        capital_restant=np.maximum(solde, 0.0)
+    )
+    if pret_seul:
+        resultat = EcheancierGeneral(**{nom: valeurs[0] for nom, valeurs in vars(resultat).items()})
+    return resultat
+
+
+def flux_pret_general_annuels(montant, taux_annuel, duree_annees, nb_annees, taille_bloc=2048, **options):
+    """Échéances, intérêts, capital et frais annuels d'un lot de prêts, de forme (prêts, nb_annees)
+
+    Les échéanciers mensuels sont calculés par blocs de taille_bloc prêts puis
+    agrégés par année : la mémoire dépend de la taille des blocs, pas du
+    nombre de prêts. Les arguments sont ceux de echeancier_general.
+    """
+    arguments = {'montant': montant, 'taux_annuel': taux_annuel, 'duree_annees': duree_annees, **options}
+    nb_prets = max([np.shape(valeur)[0] for valeur in arguments.values() if np.ndim(valeur) >= 1] or [1])
+    resultats = np.zeros((4, nb_prets, nb_annees))
+    for debut in range(0, nb_prets, taille_bloc):
+        fin = min(debut + taille_bloc, nb_prets)
+        bloc = {cle: valeur[debut:fin] if np.ndim(valeur) >= 1 and np.shape(valeur)[0] == nb_prets > 1 else valeur
+                for cle, valeur in arguments.items()}
+        echeancier = echeancier_general(**bloc)
+        resultats[:3, debut:fin] = np.reshape(echeancier.annuel(nb_annees), (3, -1, nb_annees))
+        resultats[3, debut:fin] = np.reshape(echeancier.frais_annuels(nb_annees), (-1, nb_annees))
+    return tuple(resultats)
+
+
+def options_pret(params_f):
+    """Options de structure du prêt de params_f qui diffèrent des valeurs par défaut"""
+    return {cle: params_f[cle] for cle, defaut in PARAMETRES_PRET_DEFAUT.items()
+            if params_f.get(cle, defaut) is not None and params_f.get(cle, defaut) != defaut}
+
+
+def echeancier_depuis_params(params_f):
+    """Échéancier du prêt décrit par params_f : annuités constantes simples, ou structure générale si besoin"""
+    options = options_pret(params_f)
+    if not options:
+        return echeancier_pret(params_f['emprunt'], params_f['taux_credit'], params_f['duree_credit'])
+    return echeancier_general(params_f['emprunt'], params_f['taux_credit'], params_f['duree_credit'], **options)
@@ -0,0 +1,243 @@
+"""Projection financière annuelle d'une SCI à l'IS"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import instrumente
+from .pret import echeancier_depuis_params
+
+
+# Barème de l'IS : taux réduit jusqu'au seuil, taux normal au-delà
+SEUIL_IS = 42500
+TAUX_IS_REDUIT = 0.15
+TAUX_IS_NORMAL = 0.25
+
+# Colonnes du tableau de résultats : (libellé, attribut de Projection, format)
+COLONNES_PROJECTION = [
+    # Informations générales
+    ("Année", "annees", "int"),
+    # Revenus
+    ("Loyers annuels", "loyers", "int"),
+    # Charges
+    ("Charges annuelles", "charges", "int"),
+    # Crédit
+    ("Mensualités crédit", "credit", "int"),
+    ("dont Intérêts", "interets", "int"),
+    ("dont Capital", "capital", "int"),
+    ("Capital remboursé cumulé", "capital_cumule", "int"),
+    ("Capital restant dû", "capital_restant", "int"),
+    # Comptabilité
+    ("Amortissement annuel", "amortissement", "int"),
+    ("Résultat fiscal annuel", "resultat_fiscal", "int"),
+    ("IS annuel", "impot", "int"),
+    # Résultats financiers
+    ("Résultat réel annuel", "resultat_reel", "int"),
+    ("Cashflow annuel", "cashflow", "int"),
+    ("Cashflow cumulé", "cashflow_cumule", "int"),
+    # Patrimoine
+    ("Valeur du bien", "valeur_bien", "int"),
+    ("Valeur nette", "valeur_nette", "int"),
+    ("Rendement / fonds propres (%)", "rendement_fonds_propres", "pct"),
+    ("Rendement brut (%)", "rendement_brut", "pct"),
+]
+
+
+@dataclass(frozen=True)
+class Projection:
+    """Projection financière année par année, stockée colonne par colonne"""
+    annees: np.ndarray
+    loyers: np.ndarray
+    charges: np.ndarray
+    credit: np.ndarray
+    interets: np.ndarray
+    capital: np.ndarray
+    capital_cumule: np.ndarray
+    capital_restant: np.ndarray
+    amortissement: np.ndarray
+    resultat_fiscal: np.ndarray
+    impot: np.ndarray
+    resultat_reel: np.ndarray
+    cashflow: np.ndarray
+    cashflow_cumule: np.ndarray
+    valeur_bien: np.ndarray
+    valeur_nette: np.ndarray
+    rendement_fonds_propres: np.ndarray
+    rendement_brut: np.ndarray
+
+    @property
+    def premiere_annee_is(self):
+        """Première année où l'IS est payé (None si jamais)"""
+        annees_is = np.flatnonzero(self.impot > 0)
+        return int(self.annees[annees_is[0]]) if len(annees_is) else None
+
+    @instrumente('Projection.to_dataframe')
+    def to_dataframe(self):
+        """Construit le tableau de résultats (euros tronqués, pourcentages arrondis)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        colonnes = {}
+        for libelle, attribut, fmt in COLONNES_PROJECTION:
+            valeurs = getattr(self, attribut)
+            if fmt == "pct":
+                # round() natif : arrondi exact, identique à l'affichage historique
+                colonnes[libelle] = [round(v, 2) for v in valeurs.tolist()]
+            else:
+                colonnes[libelle] = np.trunc(valeurs).astype(np.int64)
+        return pd.DataFrame(colonnes)
+
+
+def impot_societes(resultat_fiscal):
+    """Calcule l'IS progressif (15% jusqu'à 42 500 €, 25% au-delà) sur un tableau de résultats"""
+    resultat_fiscal = np.asarray(resultat_fiscal, dtype=float)
+    tranche_normale = (resultat_fiscal - SEUIL_IS) * TAUX_IS_NORMAL + SEUIL_IS * TAUX_IS_REDUIT
+    impot = np.where(resultat_fiscal <= SEUIL_IS, resultat_fiscal * TAUX_IS_REDUIT, tranche_normale)
+    return np.where(resultat_fiscal > 0, impot, 0.0)
+
+
+# Taux où la valeur actuelle nette est évaluée pour encadrer le taux de rendement interne
+GRILLE_TRI = np.array([-0.99, -0.9, -0.75, -0.5, -0.25, -0.1, 0.0, 0.05, 0.1, 0.2, 0.35, 0.5, 1.0, 2.0, 5.0, 10.0])
+
+
+def taux_rendement_interne(flux, tolerance=1e-10, iterations_max=100):
+    """Taux de rendement interne de séries de flux annuels (dernier axe : année 0, 1, 2...)
+
+    La racine de la valeur actuelle nette est encadrée sur GRILLE_TRI (la plus
+    proche de zéro si la série en a plusieurs, comme numpy_financial.irr),
+    puis affinée par la méthode de Newton vectorisée ; un pas qui sort de
+    l'encadrement est remplacé par une dichotomie. NaN pour les séries sans
+    racine entre -99 % et 1 000 % (aucun flux négatif, par exemple).
+    """
+    flux = np.asarray(flux, dtype=float)
+    forme = flux.shape[:-1]
+    flux = flux.reshape(-1, flux.shape[-1])
+    rangs = np.arange(flux.shape[1])
+
+    def valeur_actuelle(lignes, taux):
+        actualisation = (1 + taux[:, None]) ** -rangs
+        valeur = (flux[lignes] * actualisation).sum(axis=1)
+        derivee = -(flux[lignes] * rangs * actualisation).sum(axis=1) / (1 + taux)
+        return valeur, derivee
+
+    # Encadrement : intervalle de la grille où la valeur actuelle change de signe, le plus proche de zéro
+    signes = np.sign(flux @ ((1 + GRILLE_TRI[None, :]) ** -rangs[:, None]))
+    changements = signes[:, :-1] * signes[:, 1:] < 0
+    distances = np.where(changements, np.abs(GRILLE_TRI[:-1] + GRILLE_TRI[1:]), np.inf)
+    intervalle = distances.argmin(axis=1)
+    encadre = changements.any(axis=1)
+    bas, haut = GRILLE_TRI[intervalle], GRILLE_TRI[intervalle + 1]
+    signe_bas = signes[np.arange(len(flux)), intervalle]
+    taux = np.where(encadre, (bas + haut) / 2, np.nan)
+
+    # Racine exacte sur un point de la grille (valeur actuelle nulle), si elle est plus proche de zéro
+    exactes = np.where((signes == 0) & np.any(flux != 0, axis=1)[:, None], np.abs(GRILLE_TRI), np.inf)
+    racine_exacte = np.isfinite(exactes.min(axis=1)) & (exactes.min(axis=1) <= distances.min(axis=1) / 2)
+    taux[racine_exacte] = GRILLE_TRI[exactes.argmin(axis=1)][racine_exacte]
+    encadre &= ~racine_exacte
+
+    actifs = np.flatnonzero(encadre)
+    for _ in range(iterations_max):
+        if not len(actifs):
+            break
+        valeur, derivee = valeur_actuelle(actifs, taux[actifs])
+        # La racine reste encadrée : la borne du côté du signe de la valeur courante est déplacée
+        meme_signe_bas = np.sign(valeur) == signe_bas[actifs]
+        bas[actifs] = np.where(meme_signe_bas, taux[actifs], bas[actifs])
+        haut[actifs] = np.where(meme_signe_bas, haut[actifs], taux[actifs])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = taux[actifs] - valeur / derivee
+        hors_encadrement = ~((newton > bas[actifs]) & (newton < haut[actifs]))
+        nouveau = np.where(hors_encadrement, (bas[actifs] + haut[actifs]) / 2, newton)
+        converge = (np.abs(nouveau - taux[actifs]) <= tolerance * (1 + np.abs(nouveau))) | (valeur == 0)
+        taux[actifs] = np.where(valeur == 0, taux[actifs], nouveau)
+        actifs = actifs[~converge]
+    return taux.reshape(forme)
+
+
+def amortissements_comptables(params_f, annees):
+    """Amortissement comptable annuel, uniquement sur le bâti (pas le terrain)"""
+    valeur_bati = params_f['prix_achat'] * (1 - params_f.get('pourcentage_terrain', 0.2)) + params_f['travaux']
+    duree_amortissement = params_f.get('duree_amortissement', 20)
+    return np.where(annees <= duree_amortissement, valeur_bati / duree_amortissement, 0.0)
+
+
+def _noyau_projection(params_f, annees, credit, interets, capital, indices=None, amortissement=None, frais_pret=0.0):
+    """Noyau commun de la projection, vectorisé sur les années (dernier axe)
+
+    Les paramètres peuvent être des scalaires (un scénario) ou des colonnes
+    de forme (S, 1) : toutes les colonnes sont alors de forme (S, années).
+    indices peut fournir les indices annuels déjà calculés ('loyers',
+    'charges', 'valeur') à la place des progressions géométriques,
+    amortissement le tableau d'amortissement comptable déjà calculé et
+    frais_pret l'assurance emprunteur et les indemnités annuelles, ajoutées
+    aux charges.
+    """
+    rang = annees - 1
+    if indices is None:
+        indices = {
+            'loyers': (1 + params_f['revalorisation_loyers']) ** rang,
+            'charges': (1 + params_f['indexation_charges']) ** rang,
+            'valeur': (1 + params_f['appreciation_immobilier']) ** rang
+        }
+    indice_loyers, indice_charges, indice_valeur = indices['loyers'], indices['charges'], indices['valeur']
+
+    # Loyers avec revalorisation et charges avec indexation (progressions géométriques)
+    loyers = params_f['loyers_mensuels'] * 12 * indice_loyers
+    charges = sum([
+        params_f['taxe_fonciere'],
+        params_f['assurance'],
+        params_f['frais_gestion'],
+        params_f['entretien'],
+        params_f['frais_comptable']
+    ]) * indice_charges + frais_pret
+
+    # Amortissement comptable (uniquement sur le bâti, pas le terrain)
+    if amortissement is None:
+        amortissement = amortissements_comptables(params_f, annees)
+
+    # Résultats et IS
+    resultat_fiscal = loyers - charges - interets - amortissement
+    resultat_reel = loyers - charges - interets
+    impot = impot_societes(resultat_fiscal)
+    cashflow = loyers - charges - credit - impot
+
+    # Cumuls et patrimoine
+    capital_cumule = np.cumsum(capital, axis=-1)
+    capital_restant = params_f['emprunt'] - capital_cumule
+    valeur_bien = params_f['prix_achat'] * indice_valeur
+
+    # Rendement sur fonds propres (nul sans apport)
+    apport = params_f['apport']
+    rendement_fonds_propres = np.divide(cashflow, apport, out=np.zeros_like(cashflow), where=apport > 0) * 100
+
+    return Projection(
+        annees=annees,
+        loyers=loyers,
+        charges=charges,
+        credit=credit,
+        interets=interets,
+        capital=capital,
+        capital_cumule=capital_cumule,
+        capital_restant=capital_restant,
+        amortissement=amortissement,
+        resultat_fiscal=resultat_fiscal,
+        impot=impot,
+        resultat_reel=resultat_reel,
+        cashflow=cashflow,
+        cashflow_cumule=np.cumsum(cashflow, axis=-1),
+        valeur_bien=valeur_bien,
+        valeur_nette=valeur_bien - capital_restant,
+        rendement_fonds_propres=rendement_fonds_propres,
+        rendement_brut=(loyers / params_f['prix_achat']) * 100
+    )
+
+
+@instrumente()
+def projeter(params_f, echeancier=None):
+    """Calcule toutes les colonnes de la projection en une passe vectorisée"""
+    annees = np.arange(1, int(params_f['duree_projection']) + 1)
+    if echeancier is None:
+        echeancier = echeancier_depuis_params(params_f)
+
+    # Flux du crédit agrégés par année (zéro après la fin du prêt)
+    credit, interets, capital = echeancier.annuel(len(annees))
+    return _noyau_projection(params_f, annees, credit, interets, capital,
+                             frais_pret=echeancier.frais_annuels(len(annees)))
@@ -0,0 +1,226 @@
+"""Analyses de sensibilité : grilles à deux paramètres et diagramme en tornade
+
+Toutes les variantes d'une analyse (les cellules d'une grille, les chocs
+de la tornade) sont évaluées en un seul appel au noyau de calcul par lot,
+par blocs de scénarios. Les prêts ne sont calculés qu'une fois par
+combinaison distincte (emprunt, taux, durée) : une grille taux × loyers de
+200 × 200 ne calcule que 200 échéanciers. Les options de structure du prêt
+du dictionnaire params (différé, assurance...) s'appliquent à toutes les
+variantes.
+
+Comme dans l'application, l'emprunt finance le prix, les frais de notaire
+et les travaux au-delà de l'apport : faire varier l'un de ces montants fait
+varier l'emprunt d'autant.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import etape, instrumente
+from .lot import PARAMETRES_DEFAUT, PARAMETRES_SCENARIO
+from .objectifs import EFFETS_SUR_EMPRUNT, INDICATEURS_OBJECTIF
+from .pret import flux_pret_annuels, flux_pret_general_annuels, options_pret
+from .projection import _noyau_projection, taux_rendement_interne
+
+# Paramètres que l'on peut faire varier : ceux de la projection (hors horizon) et les frais de notaire
+PARAMETRES_SENSIBILITE = [cle for cle in PARAMETRES_SCENARIO if cle != 'duree_projection'] + ['frais_notaire']
+# Paramètres arrondis à l'entier après un choc
+PARAMETRES_ENTIERS = {'duree_credit', 'duree_amortissement'}
+
+# Indicateurs disponibles : clé -> libellé (montants à l'horizon, TRI des fonds propres en %)
+INDICATEURS_SENSIBILITE = {
+    'cashflow_annee_1': "Cashflow année 1",
+    'cashflow_moyen': "Cashflow moyen",
+    'cashflow_cumule': "Cashflow cumulé",
+    'valeur_nette': "Valeur nette",
+    'rendement_fonds_propres_moyen': "Rendement / fonds propres moyen (%)",
+    'tri': "TRI (%)",
+}
+
+_EFFETS_SUR_EMPRUNT = {**EFFETS_SUR_EMPRUNT, 'frais_notaire': 1.0}
+
+
+def tri_fonds_propres(projection, apport, horizons):
+    """TRI (%) des fonds propres : apport en année 0, cashflows, puis valeur nette récupérée à l'horizon"""
+    lignes = np.arange(len(horizons))
+    flux = np.zeros((len(horizons), projection.cashflow.shape[1] + 1))
+    flux[:, 0] = -np.broadcast_to(np.ravel(apport), len(horizons))
+    flux[:, 1:] = np.where(projection.annees <= horizons[:, None], projection.cashflow, 0.0)
+    flux[lignes, horizons] += projection.valeur_nette[lignes, horizons - 1]
+    return taux_rendement_interne(flux) * 100
+
+
+def _verifier_parametre(parametre):
+    if parametre not in PARAMETRES_SENSIBILITE:
+        raise ValueError(f"Paramètre non pris en charge : {parametre} (attendu : {', '.join(PARAMETRES_SENSIBILITE)})")
+
+
+def _lignes_distinctes(tableau):
+    """Indices d'une occurrence de chaque ligne distincte et, pour chaque ligne, le rang de sa ligne distincte
+
+    Chaque colonne est codée séparément (tris 1-D) et les codes sont combinés
+    colonne après colonne en une clé entière, renumérotée à chaque étape pour
+    rester inférieure au nombre de lignes : bien plus rapide que
+    np.unique(axis=0).
+    """
+    cle = np.zeros(len(tableau), dtype=np.int64)
+    for colonne in tableau.T:
+        valeurs, codes = np.unique(colonne, return_inverse=True)
+        cle = np.unique(cle * len(valeurs) + codes.ravel(), return_inverse=True)[1].ravel()
+    _, uniques = np.unique(cle, return_index=True)
+    return uniques, cle
+
+
+@instrumente()
+def evaluer_variantes(params, variations, indicateurs=('cashflow_cumule', 'valeur_nette', 'tri'), taille_bloc=10000):
+    """Évalue des variantes du dictionnaire params en un lot ; renvoie {indicateur: tableau (V,)}
+
+    variations associe à chaque paramètre modifié ses valeurs, une par
+    variante (les scalaires sont répétés). Les autres paramètres gardent leur
+    valeur de params.
+    """
+    for parametre in variations:
+        _verifier_parametre(parametre)
+    inconnus = [cle for cle in indicateurs if cle not in INDICATEURS_SENSIBILITE]
+    if inconnus:
+        raise ValueError(f"Indicateurs inconnus : {', '.join(inconnus)}")
+
+    nb_variantes = np.broadcast_shapes(*(np.shape(valeurs) for valeurs in variations.values()))
+    nb_variantes = nb_variantes[0] if nb_variantes else 1
+    base = np.array([float(params.get(cle, PARAMETRES_DEFAUT.get(cle))) for cle in PARAMETRES_SCENARIO])
+    matrice = np.tile(base, (nb_variantes, 1))
+    colonne_emprunt = PARAMETRES_SCENARIO.index('emprunt')
+    ecarts_emprunt = np.zeros(nb_variantes)
+    for parametre, valeurs in variations.items():
+        valeurs = np.broadcast_to(np.asarray(valeurs, dtype=float), (nb_variantes,))
+        if parametre in PARAMETRES_ENTIERS:
+            valeurs = np.maximum(np.round(valeurs), 1)
+        if parametre in PARAMETRES_SCENARIO:
+            matrice[:, PARAMETRES_SCENARIO.index(parametre)] = valeurs
+        if parametre in _EFFETS_SUR_EMPRUNT:
+            ecarts_emprunt += _EFFETS_SUR_EMPRUNT[parametre] * (valeurs - float(params.get(parametre, 0.0)))
+    # Reporté après toutes les affectations : un choc sur l'emprunt lui-même ne l'efface pas
+    matrice[:, colonne_emprunt] = np.maximum(matrice[:, colonne_emprunt] + ecarts_emprunt, 0.0)
+
+    horizon = int(params['duree_projection'])
+    annees = np.arange(1, horizon + 1)
+    horizons = np.full(nb_variantes, horizon)
+
+    # Un échéancier par combinaison distincte (emprunt, taux, durée), partagé par les variantes qui la reprennent
+    with etape('echeanciers_partages', variantes=nb_variantes):
+        colonnes_pret = [PARAMETRES_SCENARIO.index(cle) for cle in ('emprunt', 'taux_credit', 'duree_credit')]
+        uniques, inverse = _lignes_distinctes(matrice[:, colonnes_pret])
+        prets = matrice[uniques][:, colonnes_pret]
+        options = options_pret(params)
+        if options:
+            flux = flux_pret_general_annuels(prets[:, 0], prets[:, 1], prets[:, 2], horizon, **options)
+        else:
+            flux = (*flux_pret_annuels(prets[:, :1], prets[:, 1:2], prets[:, 2:], horizon),
+                    np.zeros((len(prets), horizon)))
+
+    resultats = {cle: np.empty(nb_variantes) for cle in indicateurs}
+    for debut in range(0, nb_variantes, taille_bloc):
+        bloc = slice(debut, debut + taille_bloc)
+        params_bloc = {cle: matrice[bloc, j, None] for j, cle in enumerate(PARAMETRES_SCENARIO)}
+        credit, interets, capital, frais = (f[inverse[bloc]] for f in flux)
+        projection = _noyau_projection(params_bloc, annees, credit, interets, capital, frais_pret=frais)
+        for cle in indicateurs:
+            if cle == 'tri':
+                resultats[cle][bloc] = tri_fonds_propres(projection, params_bloc['apport'], horizons[bloc])
+            else:
+                resultats[cle][bloc] = INDICATEURS_OBJECTIF[cle](projection, horizons[bloc])
+    return resultats
+
+
+@dataclass(frozen=True)
+class ResultatGrille:
+    """Indicateurs sur une grille de deux paramètres : tableaux (len(valeurs_y), len(valeurs_x))"""
+    parametre_x: str
+    valeurs_x: np.ndarray
+    parametre_y: str
+    valeurs_y: np.ndarray
+    indicateurs: dict
+
+    def to_dataframe(self, indicateur):
+        """Grille d'un indicateur : une ligne par valeur de y, une colonne par valeur de x"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        return pd.DataFrame(self.indicateurs[indicateur],
+                            index=pd.Index(self.valeurs_y, name=self.parametre_y),
+                            columns=pd.Index(self.valeurs_x, name=self.parametre_x))
+
+
+@instrumente()
+def grille_sensibilite(params, parametre_x, valeurs_x, parametre_y, valeurs_y,
+                       indicateurs=('cashflow_cumule', 'valeur_nette', 'tri')) -> ResultatGrille:
+    """Évalue les indicateurs sur toutes les combinaisons de valeurs_x × valeurs_y en un lot"""
+    if parametre_x == parametre_y:
+        raise ValueError("Les deux paramètres de la grille doivent être différents")
+    valeurs_x = np.asarray(valeurs_x, dtype=float)
+    valeurs_y = np.asarray(valeurs_y, dtype=float)
+    grille_x, grille_y = np.meshgrid(valeurs_x, valeurs_y)
+    resultats = evaluer_variantes(params, {parametre_x: grille_x.ravel(), parametre_y: grille_y.ravel()},
+                                  indicateurs)
+    forme = (len(valeurs_y), len(valeurs_x))
+    return ResultatGrille(parametre_x=parametre_x, valeurs_x=valeurs_x, parametre_y=parametre_y, valeurs_y=valeurs_y,
+                          indicateurs={cle: valeurs.reshape(forme) for cle, valeurs in resultats.items()})
+
+
+@dataclass(frozen=True)
+class ResultatTornade:
+    """Effet de chocs à la baisse et à la hausse de chaque paramètre sur un indicateur"""
+    indicateur: str
+    reference: float
+    parametres: list
+    valeurs_basses: np.ndarray
+    valeurs_hautes: np.ndarray
+    indicateurs_bas: np.ndarray
+    indicateurs_hauts: np.ndarray
+
+    @property
+    def amplitudes(self):
+        """Écart entre les deux chocs de chaque paramètre, en valeur absolue"""
+        return np.abs(self.indicateurs_hauts - self.indicateurs_bas)
+
+    def to_dataframe(self):
+        """Tableau de la tornade, du paramètre le plus influent au moins influent"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        ordre = np.argsort(-np.nan_to_num(self.amplitudes, nan=-1.0), kind='stable')
+        return pd.DataFrame({
+            "Paramètre": np.asarray(self.parametres)[ordre],
+            "Valeur basse": self.valeurs_basses[ordre],
+            "Valeur haute": self.valeurs_hautes[ordre],
+            "Indicateur (choc bas)": self.indicateurs_bas[ordre],
+            "Indicateur (choc haut)": self.indicateurs_hauts[ordre],
+            "Amplitude": self.amplitudes[ordre],
+        })
+
+
+@instrumente()
+def analyse_tornade(params, choc=0.1, parametres=None, indicateur='cashflow_cumule') -> ResultatTornade:
+    """Applique à chaque paramètre un choc relatif de -choc et +choc, toutes variantes évaluées en un lot
+
+    parametres vaut par défaut tous les paramètres de PARAMETRES_SENSIBILITE
+    présents dans params. Un paramètre nul reste nul : son effet est nul.
+    """
+    if parametres is None:
+        parametres = [cle for cle in PARAMETRES_SENSIBILITE if cle in params]
+    for parametre in parametres:
+        _verifier_parametre(parametre)
+    nb_parametres = len(parametres)
+
+    # Variante 0 : référence ; variantes 1 + 2i et 2 + 2i : chocs bas et haut du paramètre i
+    variations = {}
+    valeurs_basses, valeurs_hautes = np.empty(nb_parametres), np.empty(nb_parametres)
+    for i, parametre in enumerate(parametres):
+        valeur = float(params.get(parametre, PARAMETRES_DEFAUT.get(parametre, 0.0)))
+        valeurs_basses[i], valeurs_hautes[i] = valeur * (1 - choc), valeur * (1 + choc)
+        if parametre in PARAMETRES_ENTIERS:
+            valeurs_basses[i], valeurs_hautes[i] = max(round(valeurs_basses[i]), 1), max(round(valeurs_hautes[i]), 1)
+        colonne = np.full(1 + 2 * nb_parametres, valeur)
+        colonne[1 + 2 * i], colonne[2 + 2 * i] = valeurs_basses[i], valeurs_hautes[i]
+        variations[parametre] = colonne
+    resultats = evaluer_variantes(params, variations, (indicateur,))[indicateur]
+
+    return ResultatTornade(indicateur=indicateur, reference=float(resultats[0]), parametres=list(parametres),
+                           valeurs_basses=valeurs_basses, valeurs_hautes=valeurs_hautes,
+                           indicateurs_bas=resultats[1::2], indicateurs_hauts=resultats[2::2])
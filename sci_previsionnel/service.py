@@ -0,0 +1,482 @@
+"""Service local de simulation : API HTTP/JSON asynchrone, sans dépendance externe
+
+    python -m sci_previsionnel.service --port 8765 --workers 4
+
+Points d'entrée (corps et réponses en JSON) :
+
+- GET  /sante         état du service, file d'attente et statistiques du cache
+- POST /projection    un dictionnaire params -> tableau année par année (par colonne)
+- POST /lot           {"scenarios": [params, ...]} ou {"scenarios": {cle: [valeurs]}} -> synthèse par scénario
+- POST /portefeuille  {"lots": [...], "societe": {...}, "details": false} -> projection consolidée
+
+Les options de structure du prêt (assurance, différé, in fine, remboursement
+anticipé) sont acceptées par scénario et par lot. Le frontal asyncio traite
+les projections, courtes, dans la boucle d'événements ; les lots et
+portefeuilles, quelle que soit leur taille, sont décodés, validés et calculés
+dans un pool borné de processus. Au-delà de nb_workers + file_max calculs en
+cours, les requêtes sont refusées immédiatement (503 et Retry-After) plutôt
+que mises en attente sans limite. Les projections passent par le cache de
+résultats partagé (et son niveau SQLite s'il est configuré), les réponses des
+lots et portefeuilles y sont conservées sous l'empreinte de leur corps.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import instrumentation
+from .cache import cache_defaut, projeter_en_cache
+from .lot import COLONNES_RESUME, PARAMETRES_DEFAUT, PARAMETRES_SCENARIO, _calculer_blocs, options_scenarios
+from .parallele import _contexte, nb_workers_defaut
+from .portefeuille import PARAMETRES_LOT, PARAMETRES_LOT_DEFAUT, projeter_portefeuille
+from .pret import PARAMETRES_PRET_DEFAUT
+from .projection import COLONNES_PROJECTION
+
+# Taille maximale d'un corps de requête (octets) et nombre maximal de scénarios ou de lots par requête
+TAILLE_MAX_CORPS = 64 * 2 ** 20
+NB_MAX_LIGNES = 1000000
+
+# Bornes acceptées pour chaque paramètre numérique (montants : positifs ou nuls par défaut)
+BORNES = {
+    'duree_projection': (1, 100),
+    'duree_credit': (0, 50),
+    'duree_amortissement': (1, 100),
+    'pourcentage_terrain': (0, 1),
+    'taux_credit': (0, 1),
+    'revalorisation_loyers': (-1, 1),
+    'appreciation_immobilier': (-1, 1),
+    'indexation_charges': (-1, 1),
+    'annee_acquisition': (1, 100),
+    'taux_assurance': (0, 1),
+    'differe_mois': (0, 600),
+    'mois_remboursement_anticipe': (0, 600),
+}
+# Durées entières : une durée de crédit de 20,5 ans serait arrondie au mois par les échéanciers
+ENTIERS = {'duree_projection', 'duree_credit', 'duree_amortissement', 'annee_acquisition', 'differe_mois',
+           'mois_remboursement_anticipe'}
+CHOIX_PRET = {
+    'assurance_sur': ('initial', 'restant'),
+    'type_differe': ('partiel', 'total'),
+    'mode_remboursement_anticipe': ('mensualite', 'duree'),
+}
+NB_MAX_ERREURS = 10
+
+STATUTS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ErreurRequete(Exception):
+    """Requête refusée : statut HTTP, message et, pour la validation, la liste des erreurs"""
+
+    def __init__(self, statut, message, erreurs=None):
+        super().__init__(message)
+        self.statut = statut
+        self.erreurs = erreurs or []
+
+    def corps(self):
+        """Corps JSON de la réponse d'erreur"""
+        return {"erreur": str(self), **({"details": self.erreurs} if self.erreurs else {})}
+
+
+def _verifier_nombre(cle, valeur, erreurs):
+    """Contrôle un paramètre numérique scalaire ; renvoie sa valeur en flottant"""
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or not math.isfinite(valeur):
+        erreurs.append(f"{cle} : nombre attendu")
+        return None
+    minimum, maximum = BORNES.get(cle, (0, math.inf))
+    if not minimum <= valeur <= maximum:
+        erreurs.append(f"{cle} : {valeur} hors de [{minimum}, {maximum}]")
+    elif cle in ENTIERS and valeur != int(valeur):
+        erreurs.append(f"{cle} : entier attendu")
+    return float(valeur)
+
+
+def valider_parametres(params):
+    """Valide le dictionnaire params d'une projection ; renvoie les paramètres normalisés
+
+    Les clés inconnues sont ignorées. Lève ErreurRequete (400) avec la liste
+    des erreurs.
+    """
+    if not isinstance(params, dict):
+        raise ErreurRequete(400, "Le corps doit être un objet JSON de paramètres")
+    propres, erreurs = {}, []
+    for cle in PARAMETRES_SCENARIO:
+        valeur = params.get(cle, PARAMETRES_DEFAUT.get(cle))
+        if valeur is None:
+            erreurs.append(f"{cle} : paramètre manquant")
+        else:
+            propres[cle] = _verifier_nombre(cle, valeur, erreurs)
+    if not erreurs and propres['prix_achat'] <= 0:
+        erreurs.append("prix_achat : doit être strictement positif")
+    for cle, defaut in PARAMETRES_PRET_DEFAUT.items():
+        valeur = params.get(cle, defaut)
+        if cle in CHOIX_PRET:
+            if valeur not in CHOIX_PRET[cle]:
+                erreurs.append(f"{cle} : valeur attendue parmi {', '.join(CHOIX_PRET[cle])}")
+        elif isinstance(defaut, bool):
+            if not isinstance(valeur, bool):
+                erreurs.append(f"{cle} : booléen attendu")
+        else:
+            valeur = _verifier_nombre(cle, valeur, erreurs)
+        propres[cle] = valeur
+    if erreurs:
+        raise ErreurRequete(400, "Paramètres invalides", erreurs[:NB_MAX_ERREURS])
+    return propres
+
+
+def valider_table(table, cles, defauts, nom="scenarios"):
+    """Valide une table (liste d'objets ou objet de colonnes) ; renvoie un dictionnaire de colonnes NumPy
+
+    Les options de structure du prêt présentes dans la table sont validées
+    et renvoyées avec les colonnes cles (valeur par défaut pour les lignes
+    qui ne les donnent pas). Les contrôles sont vectorisés : pour chaque
+    colonne fautive, les premières lignes en erreur sont signalées.
+    """
+    defauts = {**PARAMETRES_PRET_DEFAUT, **defauts}
+    if isinstance(table, list):
+        if not all(isinstance(ligne, dict) for ligne in table):
+            raise ErreurRequete(400, f"{nom} : liste d'objets attendue")
+        nb_lignes = len(table)
+        cles = [*cles, *(cle for cle in PARAMETRES_PRET_DEFAUT if any(cle in ligne for ligne in table))]
+        colonnes = {cle: [ligne.get(cle, defauts.get(cle)) for ligne in table] for cle in cles}
+    elif isinstance(table, dict):
+        cles = [*cles, *(cle for cle in PARAMETRES_PRET_DEFAUT if cle in table)]
+        colonnes = {cle: table.get(cle) for cle in cles}
+        longueurs = {len(valeurs) for valeurs in colonnes.values() if isinstance(valeurs, list)}
+        if len(longueurs) > 1:
+            raise ErreurRequete(400, f"{nom} : colonnes de longueurs différentes")
+        nb_lignes = longueurs.pop() if longueurs else 0
+        colonnes = {cle: valeurs if valeurs is not None else [defauts.get(cle)] * nb_lignes
+                    for cle, valeurs in colonnes.items()}
+    else:
+        raise ErreurRequete(400, f"{nom} : liste d'objets ou objet de colonnes attendu")
+    if nb_lignes == 0:
+        raise ErreurRequete(400, f"{nom} : table vide")
+    if nb_lignes > NB_MAX_LIGNES:
+        raise ErreurRequete(413, f"{nom} : au plus {NB_MAX_LIGNES} lignes par requête")
+
+    tableaux, erreurs = {}, []
+    for cle, valeurs in colonnes.items():
+        defaut = defauts.get(cle)
+        if isinstance(defaut, (bool, str)):
+            # Options non numériques : valeur parmi CHOIX_PRET ou booléen
+            tableau = np.asarray(valeurs, dtype=object)
+            if tableau.shape != (nb_lignes,):
+                erreurs.append(f"{cle} : {nb_lignes} valeurs attendues")
+                continue
+            if isinstance(defaut, str):
+                fautives = np.flatnonzero([valeur not in CHOIX_PRET[cle] for valeur in tableau])
+            else:
+                fautives = np.flatnonzero([not isinstance(valeur, bool) for valeur in tableau])
+                tableau = tableau.astype(bool)
+            if len(fautives):
+                erreurs.append(f"{cle} : valeurs invalides aux lignes {', '.join(map(str, fautives[:5].tolist()))}")
+            tableaux[cle] = tableau
+            continue
+        try:
+            tableau = np.asarray(valeurs, dtype=float)
+        except (TypeError, ValueError):
+            erreurs.append(f"{cle} : nombres attendus (valeur manquante ou non numérique)")
+            continue
+        if tableau.shape != (nb_lignes,):
+            erreurs.append(f"{cle} : {nb_lignes} valeurs attendues")
+            continue
+        minimum, maximum = BORNES.get(cle, (0, math.inf))
+        fautives = np.flatnonzero(~np.isfinite(tableau) | (tableau < minimum) | (tableau > maximum)
+                                  | ((tableau != np.trunc(tableau)) if cle in ENTIERS else False))
+        if cle == 'prix_achat':
+            fautives = np.union1d(fautives, np.flatnonzero(tableau <= 0))
+        if len(fautives):
+            erreurs.append(f"{cle} : valeurs invalides aux lignes {', '.join(map(str, fautives[:5].tolist()))}")
+        tableaux[cle] = tableau
+    if erreurs:
+        raise ErreurRequete(400, f"{nom} invalides", erreurs[:NB_MAX_ERREURS])
+    return tableaux
+
+
+def _colonnes_projection(projection):
+    """Colonnes d'une Projection en listes JSON, arrondies comme Projection.to_dataframe"""
+    colonnes = {}
+    for libelle, attribut, fmt in COLONNES_PROJECTION:
+        valeurs = getattr(projection, attribut)
+        if fmt == "pct":
+            colonnes[libelle] = [round(v, 2) for v in valeurs.tolist()]
+        else:
+            colonnes[libelle] = np.trunc(valeurs).astype(np.int64).tolist()
+    return colonnes
+
+
+def traiter_projection(corps):
+    """POST /projection : projection d'un jeu de paramètres, via le cache de résultats partagé"""
+    params = valider_parametres(corps)
+    try:
+        projection = projeter_en_cache(params)
+    except ValueError as exc:
+        raise ErreurRequete(400, str(exc)) from exc
+    return {"premiere_annee_is": projection.premiere_annee_is, "resultats": _colonnes_projection(projection)}
+
+
+def traiter_lot(corps):
+    """POST /lot : synthèse par scénario d'un lot, options de structure du prêt comprises"""
+    if not isinstance(corps, dict) or 'scenarios' not in corps:
+        raise ErreurRequete(400, "Objet {\"scenarios\": ...} attendu")
+    colonnes = valider_table(corps['scenarios'], PARAMETRES_SCENARIO, PARAMETRES_DEFAUT)
+
+    matrice = np.column_stack([colonnes[cle] for cle in PARAMETRES_SCENARIO])
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    resume = np.empty((len(matrice), len(COLONNES_RESUME)))
+    try:
+        _calculer_blocs(matrice, 0, len(matrice), np.arange(1, int(horizons.max()) + 1), 10000, resume,
+                        options=options_scenarios(colonnes))
+    except ValueError as exc:
+        raise ErreurRequete(400, str(exc)) from exc
+
+    # Montants au centime et pourcentages à 0,01 près : réponse plus courte et plus rapide à encoder
+    resultats = {colonne: np.round(resume[:, j], 2).tolist() for j, colonne in enumerate(COLONNES_RESUME)}
+    resultats["Première année IS"] = [int(annee) or None for annee in resume[:, -1].tolist()]
+    return {"nb_scenarios": len(matrice), "resultats": resultats}
+
+
+def traiter_portefeuille(corps):
+    """POST /portefeuille : projection consolidée d'un portefeuille de lots (IS de la société)"""
+    if not isinstance(corps, dict) or 'lots' not in corps:
+        raise ErreurRequete(400, "Objet {\"lots\": ..., \"societe\": {...}} attendu")
+    lots = valider_table(corps['lots'], PARAMETRES_LOT, PARAMETRES_LOT_DEFAUT, nom="lots")
+    societe = corps.get('societe', {})
+    if not isinstance(societe, dict) or 'duree_projection' not in societe:
+        raise ErreurRequete(400, "societe : objet avec duree_projection attendu")
+    erreurs = []
+    societe = {cle: _verifier_nombre(cle, valeur, erreurs) for cle, valeur in societe.items()
+               if cle in ('duree_projection', 'frais_comptable', 'indexation_charges')}
+    if erreurs:
+        raise ErreurRequete(400, "societe invalide", erreurs)
+
+    try:
+        resultat = projeter_portefeuille(lots, societe)
+    except ValueError as exc:
+        raise ErreurRequete(400, str(exc)) from exc
+    reponse = {"nb_lots": resultat.nb_lots, "premiere_annee_is": resultat.societe.premiere_annee_is,
+               "resultats": _colonnes_projection(resultat.societe)}
+    if corps.get('details'):
+        reponse["detail_lots"] = resultat.detail_lots().to_dict('list')
+    return reponse
+
+
+# Points d'entrée POST : chemin -> traitement (fonction de module, exécutable dans un processus fils)
+TRAITEMENTS = {
+    '/projection': traiter_projection,
+    '/lot': traiter_lot,
+    '/portefeuille': traiter_portefeuille,
+}
+
+
+def _executer(chemin, corps_brut):
+    """Décode, valide et calcule une requête ; renvoie (statut, réponse JSON encodée)"""
+    try:
+        try:
+            corps = json.loads(corps_brut)
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ErreurRequete(400, f"JSON invalide : {exc}") from exc
+        return 200, _encoder(TRAITEMENTS[chemin](corps))
+    except ErreurRequete as exc:
+        return exc.statut, _encoder(exc.corps())
+
+
+def _encoder(objet):
+    return json.dumps(objet, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _reponse(statut, corps, entetes=()):
+    """Réponse HTTP/1.1 complète (en-têtes et corps JSON)"""
+    lignes = [f"HTTP/1.1 {statut} {STATUTS.get(statut, '')}", "Content-Type: application/json; charset=utf-8",
+              f"Content-Length: {len(corps)}", *entetes]
+    return ("\r\n".join(lignes) + "\r\n\r\n").encode('latin-1') + corps
+
+
+class ServiceSimulation:
+    """Serveur HTTP asyncio adossé à un pool borné de processus de calcul
+
+    nb_workers processus calculent les lots et portefeuilles ; au plus
+    file_max d'entre elles attendent un processus libre, les suivantes sont
+    refusées (503). Les statistiques (requêtes, refus, calculs en cours)
+    sont exposées par GET /sante.
+    """
+
+    def __init__(self, nb_workers=None, file_max=16):
+        self.nb_workers = nb_workers or nb_workers_defaut()
+        self.file_max = file_max
+        self.requetes = 0
+        self.refus = 0
+        self.en_cours = 0
+        self._executeur = None
+        self._serveur = None
+        # Calculs confiés au pool et non terminés, annulés à l'arrêt
+        self._calculs = set()
+
+    @property
+    def capacite(self):
+        """Nombre maximal de calculs confiés au pool (en cours ou en attente)"""
+        return self.nb_workers + self.file_max
+
+    async def demarrer(self, hote='127.0.0.1', port=8765):
+        """Démarre le pool (processus préchauffés) puis le serveur ; renvoie l'adresse d'écoute"""
+        self._executeur = ProcessPoolExecutor(max_workers=self.nb_workers, mp_context=_contexte())
+        boucle = asyncio.get_running_loop()
+        await asyncio.gather(*(boucle.run_in_executor(self._executeur, _executer, '/projection', b'null')
+                               for _ in range(self.nb_workers)))
+        self._serveur = await asyncio.start_server(self._connexion, hote, port)
+        return self._serveur.sockets[0].getsockname()[:2]
+
+    async def servir(self):
+        """Sert les requêtes jusqu'à l'annulation de la tâche"""
+        async with self._serveur:
+            await self._serveur.serve_forever()
+
+    async def arreter(self):
+        """Ferme le serveur et le pool de processus"""
+        if self._serveur is not None:
+            self._serveur.close()
+            await self._serveur.wait_closed()
+        if self._executeur is not None:
+            # Annulation explicite des calculs en attente (shutdown(cancel_futures=...) n'existe qu'à partir de 3.9)
+            for calcul in list(self._calculs):
+                calcul.cancel()
+            self._executeur.shutdown(wait=False)
+
+    def sante(self):
+        """Corps de GET /sante"""
+        return {"statut": "ok", "workers": self.nb_workers, "en_cours": self.en_cours, "capacite": self.capacite,
+                "requetes": self.requetes, "refus": self.refus, "cache": instrumentation.statistiques_cache()}
+
+    async def traiter(self, methode, chemin, corps_brut):
+        """Traite une requête ; renvoie (statut, corps JSON encodé, en-têtes supplémentaires)"""
+        if chemin == '/sante':
+            if methode != 'GET':
+                return 405, _encoder({"erreur": "Méthode non autorisée"}), ("Allow: GET",)
+            return 200, _encoder(self.sante()), ()
+        if chemin not in TRAITEMENTS:
+            return 404, _encoder({"erreur": f"Point d'entrée inconnu : {chemin}"}), ()
+        if methode != 'POST':
+            return 405, _encoder({"erreur": "Méthode non autorisée"}), ("Allow: POST",)
+
+        # Projection : calcul court dans la boucle, par le cache partagé
+        if chemin == '/projection':
+            statut, corps = _executer(chemin, corps_brut)
+            return statut, corps, ()
+
+        # Lot ou portefeuille, même petit (la boucle ne doit pas attendre un calcul) : réponse en cache,
+        # sinon calcul dans le pool s'il reste de la place
+        cache = cache_defaut()
+        cle = f"service:{chemin}:{hashlib.blake2b(corps_brut, digest_size=20).hexdigest()}"
+        corps = cache.lire(cle)
+        if corps is not None:
+            return 200, corps, ()
+        if self.en_cours >= self.capacite:
+            self.refus += 1
+            return 503, _encoder({"erreur": "Service saturé, réessayez plus tard"}), ("Retry-After: 1",)
+        self.en_cours += 1
+        try:
+            calcul = self._executeur.submit(_executer, chemin, corps_brut)
+            self._calculs.add(calcul)
+            calcul.add_done_callback(self._calculs.discard)
+            statut, corps = await asyncio.wrap_future(calcul)
+        finally:
+            self.en_cours -= 1
+        if statut == 200:
+            cache.ecrire(cle, corps)
+        return statut, corps, ()
+
+    async def _connexion(self, lecteur, ecrivain):
+        """Sert les requêtes successives d'une connexion (keep-alive HTTP/1.1)"""
+        try:
+            while True:
+                ligne = await lecteur.readline()
+                if not ligne.strip():
+                    break
+                debut = time.perf_counter()
+                try:
+                    methode, cible, version = ligne.decode('latin-1').split()
+                except ValueError:
+                    ecrivain.write(_reponse(400, _encoder({"erreur": "Ligne de requête invalide"}),
+                                            ("Connection: close",)))
+                    break
+                entetes = {}
+                while (entete := await lecteur.readline()) not in (b'\r\n', b'\n', b''):
+                    nom, _, valeur = entete.decode('latin-1').partition(':')
+                    entetes[nom.strip().lower()] = valeur.strip()
+                garder = (version == 'HTTP/1.1') != (entetes.get('connection', '').lower() == 'close')
+                longueur = int(entetes.get('content-length', 0) or 0)
+                if longueur > TAILLE_MAX_CORPS:
+                    ecrivain.write(_reponse(413, _encoder({"erreur": "Corps de requête trop volumineux"}),
+                                            ("Connection: close",)))
+                    break
+                corps_brut = await lecteur.readexactly(longueur) if longueur else b''
+
+                self.requetes += 1
+                try:
+                    statut, corps, supplementaires = await self.traiter(methode, cible.split('?')[0], corps_brut)
+                except Exception as exc:  # pylint: disable=broad-except
+                    instrumentation.LOGGER.exception("Erreur du service sur %s", cible)
+                    statut, corps, supplementaires = 500, _encoder({"erreur": str(exc)}), ()
+                ecrivain.write(_reponse(statut, corps, (*supplementaires,
+                                                        "Connection: keep-alive" if garder else "Connection: close")))
+                await ecrivain.drain()
+                instrumentation.journaliser_evenement("requete", chemin=cible, statut=statut,
+                                                      duree_ms=round((time.perf_counter() - debut) * 1000, 3))
+                if not garder:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            ecrivain.close()
+
+
+def _analyser_arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m sci_previsionnel.service',
+        description="Service HTTP/JSON local de simulation (projection, lot, portefeuille)."
+    )
+    parser.add_argument('--hote', default='127.0.0.1', help="adresse d'écoute (défaut : 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="port d'écoute, 0 pour un port libre (défaut : 8765)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processus de calcul des requêtes volumineuses (défaut : un par cœur)")
+    parser.add_argument('--file-max', type=int, default=16,
+                        help="calculs en attente d'un processus au-delà desquels les requêtes sont refusées (défaut : 16)")
+    return parser.parse_args(argv)
+
+
+async def _servir(args):
+    service = ServiceSimulation(args.workers, args.file_max)
+    hote, port = await service.demarrer(args.hote, args.port)
+    print(f"Service à l'écoute sur http://{hote}:{port} ({service.nb_workers} processus)", flush=True)
+    tache = asyncio.current_task()
+    with contextlib.suppress(NotImplementedError):
+        # SIGTERM : arrêt propre, le pool de processus est fermé avec le service
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, tache.cancel)
+    try:
+        await service.servir()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await service.arreter()
+
+
+def main(argv=None):
+    """Point d'entrée de la ligne de commande"""
+    try:
+        asyncio.run(_servir(_analyser_arguments(argv)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
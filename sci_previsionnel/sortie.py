@@ -0,0 +1,210 @@
+"""Analyse de sortie : revente du bien à chaque année possible de l'horizon
+
+Pour chaque année de revente k (1 à l'horizon), la cession est évaluée à
+partir des colonnes d'une seule projection : l'amortissement cumulé donne
+la valeur comptable, la plus-value est imposée à l'IS avec le résultat de
+l'année, le capital restant dû est remboursé (indemnités de remboursement
+anticipé comprises) et, en option, le boni de liquidation est imposé chez
+les associés. Le TRI des fonds propres de toutes les années de revente est
+ensuite calculé en un appel vectorisé : aucune projection n'est refaite.
+
+Les scénarios sont traités par blocs, comme simuler_lot : classer des
+milliers d'opérations par durée de détention optimale ne coûte qu'une
+projection par scénario.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .instrumentation import etape, instrumente
+from .lot import PARAMETRES_SCENARIO, matrice_scenarios, options_scenarios
+from .objectifs import _colonnes_scenarios
+from .pret import MOIS_INDEMNITES, PLAFOND_INDEMNITES, flux_pret_annuels, flux_pret_general_annuels
+from .projection import _noyau_projection, impot_societes, taux_rendement_interne
+
+# Colonnes du tableau d'une analyse de sortie : (libellé, attribut de ResultatSortie)
+COLONNES_SORTIE = [
+    ("Prix de vente net", "prix_vente"),
+    ("Valeur comptable", "valeur_comptable"),
+    ("Plus-value", "plus_value"),
+    ("IS sur la plus-value", "impot_plus_value"),
+    ("Capital restant dû", "capital_restant"),
+    ("Indemnités de remboursement", "indemnites"),
+    ("Produit net de cession", "produit_net"),
+    ("Impôt sur le boni", "impot_boni"),
+    ("Revenu net des associés", "revenu_associes"),
+    ("Enrichissement", "enrichissement"),
+    ("TRI (%)", "tri"),
+]
+
+# Critères de choix de l'année de revente optimale
+CRITERES_SORTIE = ('tri', 'enrichissement')
+
+
+@dataclass(frozen=True)
+class ResultatSortie:
+    """Bilan de la revente à chaque année, tableaux de forme (scénarios, années)
+
+    Les années au-delà de l'horizon d'un scénario valent NaN. revenu_associes
+    est le montant récupéré par les associés à la revente (produit net, moins
+    l'impôt sur le boni en cas de liquidation) ; enrichissement la somme de
+    tous leurs flux, apport compris.
+    """
+    index: np.ndarray
+    annees: np.ndarray
+    prix_vente: np.ndarray
+    valeur_comptable: np.ndarray
+    plus_value: np.ndarray
+    impot_plus_value: np.ndarray
+    capital_restant: np.ndarray
+    indemnites: np.ndarray
+    produit_net: np.ndarray
+    impot_boni: np.ndarray
+    revenu_associes: np.ndarray
+    enrichissement: np.ndarray
+    tri: np.ndarray
+
+    def annee_optimale(self, critere='tri'):
+        """Année de revente qui maximise le critère, par scénario (0 si le critère n'est jamais défini)"""
+        if critere not in CRITERES_SORTIE:
+            raise ValueError(f"Critère inconnu : {critere} (attendu : {', '.join(CRITERES_SORTIE)})")
+        valeurs = getattr(self, critere)
+        defini = ~np.isnan(valeurs)
+        meilleure = np.where(defini, valeurs, -np.inf).argmax(axis=1)
+        return np.where(defini.any(axis=1), self.annees[meilleure], 0)
+
+    def classement(self, critere='tri'):
+        """Scénarios classés du meilleur au moins bon, chacun à son année de revente optimale"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        annees = self.annee_optimale(critere)
+        lignes = np.arange(len(annees))
+        colonne = np.maximum(annees - 1, 0)
+
+        def a_l_optimum(valeurs):
+            return np.where(annees > 0, valeurs[lignes, colonne], np.nan)
+
+        tableau = pd.DataFrame({
+            "Année de revente optimale": pd.array(annees, dtype="Int64"),
+            "TRI (%)": a_l_optimum(self.tri),
+            "Enrichissement": a_l_optimum(self.enrichissement),
+            "Revenu net des associés": a_l_optimum(self.revenu_associes),
+        }, index=self.index)
+        tableau["Année de revente optimale"] = tableau["Année de revente optimale"].replace(0, pd.NA)
+        libelle = "TRI (%)" if critere == 'tri' else "Enrichissement"
+        return tableau.sort_values(libelle, ascending=False, kind='stable', na_position='last')
+
+    def to_dataframe(self, scenario=0):
+        """Tableau de la revente année par année pour un scénario (position dans le lot)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        colonnes = {"Année de revente": self.annees}
+        for libelle, attribut in COLONNES_SORTIE:
+            colonnes[libelle] = getattr(self, attribut)[scenario]
+        return pd.DataFrame(colonnes).dropna(subset=["Produit net de cession"])
+
+
+def _flux_prets(matrice, nb_annees, options):
+    """Échéances, intérêts, capital et frais annuels des prêts d'un bloc de scénarios (options : celles du bloc)"""
+    montant, taux, duree = (matrice[:, PARAMETRES_SCENARIO.index(cle)]
+                            for cle in ('emprunt', 'taux_credit', 'duree_credit'))
+    if options:
+        return flux_pret_general_annuels(montant, taux, duree, nb_annees, **options)
+    return (*flux_pret_annuels(montant[:, None], taux[:, None], duree[:, None], nb_annees), 0.0)
+
+
+def _sortie_bloc(matrice, frais_notaire, annees, options, hypotheses):
+    """Bilan de la revente d'un bloc de scénarios à chaque année : {attribut: tableau (S, années)}
+
+    Le TRI n'est calculé que pour les années de revente comprises dans
+    l'horizon de chaque scénario (NaN au-delà).
+    """
+    frais_vente, indemnites, taux_boni = hypotheses
+    params_bloc = {cle: matrice[:, j, None] for j, cle in enumerate(PARAMETRES_SCENARIO)}
+    credit, interets, capital, frais = _flux_prets(matrice, len(annees), options)
+    projection = _noyau_projection(params_bloc, annees, credit, interets, capital, frais_pret=frais)
+
+    # Plus-value sur la valeur comptable (coût d'acquisition moins les amortissements cumulés),
+    # imposée à l'IS avec le résultat de l'année de la revente
+    prix_vente = projection.valeur_bien * (1 - frais_vente)
+    cout_acquisition = params_bloc['prix_achat'] + params_bloc['travaux'] + frais_notaire[:, None]
+    valeur_comptable = cout_acquisition - np.cumsum(projection.amortissement, axis=1)
+    plus_value = prix_vente - valeur_comptable
+    impot_plus_value = impot_societes(projection.resultat_fiscal + plus_value) - projection.impot
+
+    # Remboursement du capital restant dû, avec les indemnités légales (6 mois d'intérêts, au plus 3 %)
+    capital_restant = np.maximum(projection.capital_restant, 0.0)
+    frais_anticipe = np.zeros_like(capital_restant)
+    if indemnites:
+        frais_anticipe = np.minimum(capital_restant * params_bloc['taux_credit'] / 12 * MOIS_INDEMNITES,
+                                    capital_restant * PLAFOND_INDEMNITES)
+    produit_net = prix_vente - impot_plus_value - capital_restant - frais_anticipe
+
+    # Boni de liquidation : ce que les associés récupèrent au-delà de leur apport
+    impot_boni = np.zeros_like(produit_net)
+    if taux_boni is not None:
+        impot_boni = np.maximum(produit_net - params_bloc['apport'], 0.0) * taux_boni
+    revenu_associes = produit_net - impot_boni
+
+    # Flux des associés pour chaque année de revente k (axe 1) : apport, cashflows jusqu'à k, revente en k
+    nb_scenarios, nb_annees = projection.cashflow.shape
+    detenu = annees[None, :] <= annees[:, None]
+    flux = np.zeros((nb_scenarios, nb_annees, nb_annees + 1))
+    flux[:, :, 0] = -params_bloc['apport']
+    flux[:, :, 1:] = np.where(detenu, projection.cashflow[:, None, :], 0.0)
+    flux[:, np.arange(nb_annees), annees] += revenu_associes
+    dans_horizon = annees[None, :] <= params_bloc['duree_projection']
+    tri = np.full((nb_scenarios, nb_annees), np.nan)
+    with etape('tri_sorties', scenarios=nb_scenarios, annees=nb_annees):
+        tri[dans_horizon] = taux_rendement_interne(flux[dans_horizon]) * 100
+
+    return {
+        'prix_vente': prix_vente,
+        'valeur_comptable': valeur_comptable,
+        'plus_value': plus_value,
+        'impot_plus_value': impot_plus_value,
+        'capital_restant': capital_restant,
+        'indemnites': frais_anticipe,
+        'produit_net': produit_net,
+        'impot_boni': impot_boni,
+        'revenu_associes': revenu_associes,
+        'enrichissement': projection.cashflow_cumule + revenu_associes - params_bloc['apport'],
+        'tri': tri,
+    }
+
+
+@instrumente()
+def analyser_sortie(scenarios, frais_vente=0.0, indemnites=True, taux_boni=None, taille_bloc=1000) -> ResultatSortie:
+    """Évalue la revente à chaque année de l'horizon, pour un ou plusieurs scénarios
+
+    scenarios est une table de scénarios (DataFrame ou dictionnaire de
+    colonnes, comme pour simuler_lot) ou un dictionnaire params ; les
+    options de structure du prêt sont prises en compte dans les deux cas
+    (colonnes d'une valeur par scénario pour une table). Une colonne
+    'frais_notaire' facultative entre dans le coût d'acquisition.
+    frais_vente est la part du prix de vente perdue en frais (agence...),
+    indemnites applique les indemnités de remboursement anticipé et
+    taux_boni, s'il est donné, le taux d'imposition du boni de liquidation
+    chez les associés (0,30 pour le prélèvement forfaitaire unique).
+    """
+    colonnes = _colonnes_scenarios(scenarios)
+    matrice = matrice_scenarios(colonnes)
+    nb_scenarios = len(matrice)
+    frais_notaire = np.broadcast_to(np.asarray(scenarios['frais_notaire'] if 'frais_notaire' in scenarios else 0.0,
+                                               dtype=float), (nb_scenarios,))
+    options = options_scenarios(colonnes)
+    horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+    annees = np.arange(1, int(horizons.max()) + 1)
+
+    resultats = {attribut: np.empty((nb_scenarios, len(annees))) for _, attribut in COLONNES_SORTIE}
+    for debut in range(0, nb_scenarios, taille_bloc):
+        bloc = slice(debut, debut + taille_bloc)
+        options_bloc = {cle: valeurs[bloc] for cle, valeurs in options.items()}
+        for attribut, valeurs in _sortie_bloc(matrice[bloc], frais_notaire[bloc], annees, options_bloc,
+                                              (frais_vente, indemnites, taux_boni)).items():
+            resultats[attribut][bloc] = valeurs
+    # Années au-delà de l'horizon de chaque scénario
+    hors_horizon = annees[None, :] > horizons[:, None]
+    for valeurs in resultats.values():
+        valeurs[hors_horizon] = np.nan
+
+    index = np.asarray(scenarios.index) if hasattr(scenarios, 'columns') else np.arange(nb_scenarios)
+    return ResultatSortie(index=index, annees=annees, **resultats)
@@ -0,0 +1,291 @@
+"""Base SQLite des simulations enregistrées, indexée sur les indicateurs clés
+
+Chaque scénario enregistré garde ses paramètres (colonnes de
+PARAMETRES_SCENARIO, plus le dictionnaire complet en JSON), la saisie
+d'origine (input_params de l'application) et ses indicateurs de synthèse,
+dont les principaux sont indexés : filtrer et trier des milliers de
+scénarios n'est qu'une requête SQL. Le détail année par année est stocké à
+part, compressé, et n'est décompressé qu'à la demande (consultation d'un
+scénario ou comparaison de quelques-uns).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .lot import (
+    PARAMETRES_DEFAUT, PARAMETRES_SCENARIO, _projeter_bloc, _resume_bloc, matrice_scenarios, options_scenarios
+)
+from .projection import COLONNES_PROJECTION, Projection, projeter
+from .sensibilite import tri_fonds_propres
+
+# Indicateurs de synthèse enregistrés : colonne SQL -> libellé (ceux de COLONNES_RESUME, plus le TRI)
+INDICATEURS_STOCKES = {
+    'cashflow_annee_1': "Cashflow année 1",
+    'cashflow_cumule': "Cashflow cumulé",
+    'valeur_bien': "Valeur du bien",
+    'valeur_nette': "Valeur nette",
+    'cashflow_moyen': "Cashflow moyen",
+    'rendement_fonds_propres_moyen': "Rendement / fonds propres moyen (%)",
+    'rendement_brut_moyen': "Rendement brut moyen (%)",
+    'premiere_annee_is': "Première année IS",
+    'tri': "TRI (%)",
+}
+# Indicateurs indexés : filtres et tris sans parcours de la table
+INDICATEURS_INDEXES = ['cashflow_annee_1', 'cashflow_cumule', 'valeur_nette', 'premiere_annee_is', 'tri']
+# Colonnes du détail annuel compressé, dans l'ordre du tableau de résultats (les années s'en déduisent)
+COLONNES_DETAIL = [attribut for _, attribut, _ in COLONNES_PROJECTION[1:]]
+# Niveau de compression zlib du détail annuel : les niveaux supérieurs ne gagnent presque rien sur ces flottants
+NIVEAU_COMPRESSION = 1
+# Nombre maximal de paramètres d'une requête SQLite (limite historique : 999)
+TAILLE_REQUETE = 900
+
+
+def _json_defaut(valeur):
+    """Sérialise les scalaires NumPy de la saisie"""
+    if isinstance(valeur, np.generic):
+        return valeur.item()
+    raise TypeError(f"Valeur non sérialisable en JSON : {valeur!r}")
+
+
+def _compresser(projection, ligne=0, nb_annees=None):
+    """Détail annuel d'une ligne d'une projection 2-D, compressé : (nb_annees, données)"""
+    detail = np.stack([getattr(projection, attribut)[ligne, :nb_annees] for attribut in COLONNES_DETAIL])
+    return detail.shape[1], zlib.compress(detail.astype(np.float64).tobytes(), NIVEAU_COMPRESSION)
+
+
+def _decompresser(donnees, nb_annees):
+    return np.frombuffer(zlib.decompress(donnees), dtype=np.float64).reshape(len(COLONNES_DETAIL), nb_annees)
+
+
+def _indicateurs(projection, horizons, apport):
+    """Indicateurs de synthèse d'un bloc (projection 2-D) : {colonne SQL: tableau (S,)}"""
+    resume = _resume_bloc(projection, horizons)
+    indicateurs = {cle: resume[libelle] for cle, libelle in INDICATEURS_STOCKES.items() if libelle in resume}
+    indicateurs['tri'] = tri_fonds_propres(projection, apport, horizons)
+    return indicateurs
+
+
+class BaseScenarios:
+    """Scénarios enregistrés dans une base SQLite (mode WAL, partageable entre processus)"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._verrou = threading.RLock()
+        self._base = sqlite3.connect(chemin, timeout=30, check_same_thread=False, isolation_level=None)
+        self._base.execute("PRAGMA journal_mode=WAL")
+        self._base.execute("PRAGMA synchronous=NORMAL")
+        self._base.execute("PRAGMA foreign_keys=ON")
+        colonnes = [f"{cle} REAL" for cle in PARAMETRES_SCENARIO]
+        colonnes += [f"{cle} {'INTEGER' if cle == 'premiere_annee_is' else 'REAL'}" for cle in INDICATEURS_STOCKES]
+        self._base.execute(
+            "CREATE TABLE IF NOT EXISTS scenarios (id INTEGER PRIMARY KEY, nom TEXT, cree REAL NOT NULL, "
+            f"parametres TEXT NOT NULL, saisie TEXT, {', '.join(colonnes)})"
+        )
+        self._base.execute(
+            "CREATE TABLE IF NOT EXISTS details (scenario_id INTEGER PRIMARY KEY "
+            "REFERENCES scenarios (id) ON DELETE CASCADE, nb_annees INTEGER NOT NULL, donnees BLOB NOT NULL)"
+        )
+        for cle in INDICATEURS_INDEXES + ['cree']:
+            self._base.execute(f"CREATE INDEX IF NOT EXISTS scenarios_{cle} ON scenarios ({cle})")
+
+    def __len__(self):
+        return self._base.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0]
+
+    def _inserer(self, lignes, details):
+        """Insère les lignes (nom, parametres, saisie, paramètres..., indicateurs...) en une transaction"""
+        colonnes = ['id', 'nom', 'cree', 'parametres', 'saisie', *PARAMETRES_SCENARIO, *INDICATEURS_STOCKES]
+        requete = f"INSERT INTO scenarios ({', '.join(colonnes)}) VALUES ({', '.join('?' * len(colonnes))})"
+        with self._verrou:
+            self._base.execute("BEGIN IMMEDIATE")
+            try:
+                premier = self._base.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM scenarios").fetchone()[0]
+                ids = np.arange(premier, premier + len(lignes))
+                self._base.executemany(requete, ((int(i), *ligne) for i, ligne in zip(ids, lignes)))
+                if details is not None:
+                    self._base.executemany("INSERT INTO details (scenario_id, nb_annees, donnees) VALUES (?, ?, ?)",
+                                           ((int(i), *detail) for i, detail in zip(ids, details)))
+                self._base.execute("COMMIT")
+            except BaseException:
+                self._base.execute("ROLLBACK")
+                raise
+        return ids
+
+    def enregistrer(self, params, projection=None, nom=None, saisie=None):
+        """Enregistre une simulation et renvoie son identifiant
+
+        params est le dictionnaire params de la simulation (options du prêt
+        comprises) ; projection est recalculée si elle n'est pas fournie.
+        saisie est, s'il est donné, le dictionnaire input_params de
+        l'application, conservé tel quel pour les exports.
+        """
+        if projection is None:
+            projection = projeter(params)
+        projection_2d = Projection(annees=projection.annees, **{
+            attribut: np.asarray(getattr(projection, attribut))[None, :] for attribut in COLONNES_DETAIL
+        })
+        indicateurs = _indicateurs(projection_2d, np.array([len(projection.annees)]), float(params['apport']))
+        valeurs = [float(params.get(cle, PARAMETRES_DEFAUT.get(cle))) for cle in PARAMETRES_SCENARIO]
+        ligne = (nom, time.time(), json.dumps(params, default=_json_defaut),
+                 None if saisie is None else json.dumps(saisie, default=_json_defaut, ensure_ascii=False),
+                 *valeurs, *self._valeurs_indicateurs(indicateurs, 0))
+        return int(self._inserer([ligne], [_compresser(projection_2d)])[0])
+
+    @staticmethod
+    def _valeurs_indicateurs(indicateurs, ligne):
+        valeurs = []
+        for cle in INDICATEURS_STOCKES:
+            valeur = float(indicateurs[cle][ligne])
+            if cle == 'premiere_annee_is':
+                valeur = int(valeur) or None
+            valeurs.append(None if valeur is not None and np.isnan(valeur) else valeur)
+        return valeurs
+
+    def enregistrer_lot(self, scenarios, noms=None, details=True, taille_bloc=10000):
+        """Enregistre un lot de scénarios (table comme pour simuler_lot) ; renvoie leurs identifiants
+
+        Le lot est projeté par blocs avec le noyau de calcul par lot et
+        inséré en une transaction ; details=False n'enregistre que les
+        paramètres et les indicateurs. Les options de structure du prêt (une
+        colonne par option) sont prises en compte et enregistrées avec les
+        paramètres.
+        """
+        matrice = matrice_scenarios(scenarios)
+        options = options_scenarios(scenarios)
+        horizons = matrice[:, PARAMETRES_SCENARIO.index('duree_projection')].astype(np.int64)
+        annees = np.arange(1, int(horizons.max(initial=1)) + 1)
+        if noms is None and hasattr(scenarios, 'columns'):
+            noms = [str(nom) for nom in scenarios.index]
+        maintenant = time.time()
+        lignes = []
+        compresses = [] if details else None
+        for debut in range(0, len(matrice), taille_bloc):
+            bloc = matrice[debut:debut + taille_bloc]
+            options_bloc = {cle: valeurs[debut:debut + taille_bloc] for cle, valeurs in options.items()}
+            projection = _projeter_bloc(bloc, annees, options_bloc)
+            indicateurs = _indicateurs(projection, horizons[debut:debut + taille_bloc],
+                                       bloc[:, PARAMETRES_SCENARIO.index('apport')])
+            options_lignes = [dict(zip(options_bloc, ligne))
+                              for ligne in zip(*(valeurs.tolist() for valeurs in options_bloc.values()))]
+            for i, valeurs in enumerate(bloc.tolist()):
+                params = dict(zip(PARAMETRES_SCENARIO, valeurs))
+                if options_lignes:
+                    params.update(options_lignes[i])
+                lignes.append((None if noms is None else noms[debut + i], maintenant, json.dumps(params), None,
+                               *valeurs, *self._valeurs_indicateurs(indicateurs, i)))
+                if details:
+                    compresses.append(_compresser(projection, i, int(horizons[debut + i])))
+        return self._inserer(lignes, compresses)
+
+    def rechercher(self, filtres=None, ordre=None, decroissant=True, limite=None):
+        """Scénarios enregistrés, sans leur détail annuel, en DataFrame indexé par identifiant
+
+        filtres associe à une colonne (paramètre ou indicateur) un couple
+        (minimum, maximum), None pour une borne ouverte ; ordre est la colonne
+        de tri. Les filtres et tris sur les indicateurs indexés ne parcourent
+        pas la table.
+        """
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        colonnes_connues = {'id', 'nom', 'cree', *PARAMETRES_SCENARIO, *INDICATEURS_STOCKES}
+        conditions, arguments = [], []
+        for colonne, (minimum, maximum) in (filtres or {}).items():
+            if colonne not in colonnes_connues:
+                raise ValueError(f"Colonne inconnue : {colonne}")
+            if minimum is not None:
+                conditions.append(f"{colonne} >= ?")
+                arguments.append(float(minimum))
+            if maximum is not None:
+                conditions.append(f"{colonne} <= ?")
+                arguments.append(float(maximum))
+        requete = f"SELECT id, nom, cree, {', '.join([*INDICATEURS_STOCKES, *PARAMETRES_SCENARIO])} FROM scenarios"
+        if conditions:
+            requete += " WHERE " + " AND ".join(conditions)
+        if ordre is not None:
+            if ordre not in colonnes_connues:
+                raise ValueError(f"Colonne inconnue : {ordre}")
+            requete += f" ORDER BY {ordre} IS NULL, {ordre} {'DESC' if decroissant else 'ASC'}"
+        if limite is not None:
+            requete += " LIMIT ?"
+            arguments.append(int(limite))
+        with self._verrou:
+            curseur = self._base.execute(requete, arguments)
+            tableau = pd.DataFrame(curseur.fetchall(), columns=[description[0] for description in curseur.description])
+        tableau['cree'] = pd.to_datetime(tableau['cree'], unit='s')
+        tableau['premiere_annee_is'] = tableau['premiere_annee_is'].astype("Int64")
+        return tableau.set_index('id')
+
+    def parametres(self, identifiant):
+        """Dictionnaire params et saisie (None si absente) d'un scénario enregistré"""
+        ligne = self._base.execute("SELECT parametres, saisie FROM scenarios WHERE id = ?",
+                                   (int(identifiant),)).fetchone()
+        if ligne is None:
+            raise KeyError(identifiant)
+        return json.loads(ligne[0]), None if ligne[1] is None else json.loads(ligne[1])
+
+    def _details(self, identifiants):
+        """Détails annuels décompressés {identifiant: tableau (colonnes, années)}"""
+        identifiants = [int(identifiant) for identifiant in identifiants]
+        details = {}
+        with self._verrou:
+            for debut in range(0, len(identifiants), TAILLE_REQUETE):
+                partie = identifiants[debut:debut + TAILLE_REQUETE]
+                for identifiant, nb_annees, donnees in self._base.execute(
+                        f"SELECT scenario_id, nb_annees, donnees FROM details "
+                        f"WHERE scenario_id IN ({', '.join('?' * len(partie))})", partie):
+                    details[identifiant] = _decompresser(donnees, nb_annees)
+        manquants = [identifiant for identifiant in identifiants if identifiant not in details]
+        if manquants:
+            raise KeyError(f"Détail annuel absent pour les scénarios {manquants}")
+        return details
+
+    def charger_projection(self, identifiant):
+        """Projection complète d'un scénario enregistré, décompressée à la demande"""
+        detail = self._details([identifiant])[int(identifiant)]
+        return Projection(annees=np.arange(1, detail.shape[1] + 1),
+                          **{attribut: ligne for attribut, ligne in zip(COLONNES_DETAIL, detail)})
+
+    def comparer(self, identifiants, attribut='cashflow_cumule'):
+        """Une colonne de la projection pour plusieurs scénarios : DataFrame (années × scénarios)"""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        if attribut not in COLONNES_DETAIL:
+            raise ValueError(f"Colonne inconnue : {attribut}")
+        identifiants = [int(identifiant) for identifiant in identifiants]
+        details = self._details(identifiants)
+        rang = COLONNES_DETAIL.index(attribut)
+        nb_annees = max([detail.shape[1] for detail in details.values()], default=0)
+        # Colonnes dans l'ordre demandé (la requête renvoie les détails dans l'ordre de la table)
+        valeurs = np.full((nb_annees, len(identifiants)), np.nan)
+        for j, identifiant in enumerate(identifiants):
+            valeurs[:details[identifiant].shape[1], j] = details[identifiant][rang]
+        return pd.DataFrame(valeurs, index=pd.RangeIndex(1, nb_annees + 1, name="Année"),
+                            columns=pd.Index(identifiants, name="Scénario"))
+
+    def supprimer(self, identifiants):
+        """Supprime des scénarios enregistrés (et leur détail annuel)"""
+        identifiants = [int(identifiant) for identifiant in identifiants]
+        with self._verrou:
+            for debut in range(0, len(identifiants), TAILLE_REQUETE):
+                partie = identifiants[debut:debut + TAILLE_REQUETE]
+                self._base.execute(f"DELETE FROM scenarios WHERE id IN ({', '.join('?' * len(partie))})", partie)
+
+    def fermer(self):
+        """Ferme la base SQLite"""
+        with self._verrou:
+            if self._base is not None:
+                self._base.close()
+                self._base = None
+
+
+_BASE_DEFAUT = None
+
+
+def base_defaut():
+    """Base de scénarios du processus, dans le fichier SCI_BASE_SCENARIOS (scenarios.sqlite par défaut)"""
+    global _BASE_DEFAUT  # pylint: disable=global-statement
+    if _BASE_DEFAUT is None:
+        _BASE_DEFAUT = BaseScenarios(os.environ.get('SCI_BASE_SCENARIOS') or 'scenarios.sqlite')
+    return _BASE_DEFAUT
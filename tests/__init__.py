@@ -0,0 +1 @@
+"""Tests de non-régression du moteur de calcul : python -m pytest tests"""
@@ -0,0 +1,213 @@
+"""Équivalences numériques du moteur : chaque chemin rapide contre sa référence
+
+    python -m pytest tests
+
+Les références sont l'échéancier mensuel de l'application d'origine
+(numpy_financial.pmt puis boucle sur les mois), projeter() pour les calculs
+par lot, portefeuille et recherche d'objectif, le calcul en série pour les
+versions multi-processus et numpy_financial.irr pour le TRI. Les tests qui
+comparent à numpy_financial sont ignorés s'il n'est pas installé.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sci_previsionnel.demarrage import PARAMETRES_PRECHAUFFAGE
+from sci_previsionnel.lot import simuler_lot
+from sci_previsionnel.monte_carlo import ConfigMonteCarlo, Loi, simuler_monte_carlo
+from sci_previsionnel.objectifs import STATUT_ATTEINT, resoudre_objectif
+from sci_previsionnel.parallele import executer_lot, executer_monte_carlo
+from sci_previsionnel.portefeuille import projeter_portefeuille
+from sci_previsionnel.pret import echeancier_pret
+from sci_previsionnel.projection import projeter, taux_rendement_interne
+
+PARAMETRES = dict(PARAMETRES_PRECHAUFFAGE)
+
+# Une combinaison par famille d'options de structure du prêt
+OPTIONS_PRET = [
+    {},
+    {'taux_assurance': 0.0036, 'assurance_sur': 'restant'},
+    {'in_fine': True},
+    {'differe_mois': 12, 'type_differe': 'total'},
+    {'differe_mois': 6, 'type_differe': 'partiel', 'taux_assurance': 0.003},
+    {'mois_remboursement_anticipe': 60, 'montant_remboursement_anticipe': 50000.0,
+     'mode_remboursement_anticipe': 'duree'},
+    {'mois_remboursement_anticipe': 84, 'montant_remboursement_anticipe': 30000.0,
+     'mode_remboursement_anticipe': 'mensualite'},
+]
+
+ATTRIBUTS_COMPARES = ('credit', 'interets', 'capital', 'charges', 'impot', 'cashflow', 'cashflow_cumule',
+                      'capital_restant', 'valeur_nette')
+
+
+def _scenarios(nb_scenarios, graine=0, **fixes):
+    """Table de scénarios variés autour des paramètres par défaut (durées de 10 à 30 ans)"""
+    rng = np.random.default_rng(graine)
+    colonnes = {cle: np.full(nb_scenarios, valeur, dtype=float) for cle, valeur in PARAMETRES.items()}
+    colonnes['prix_achat'] = rng.uniform(80000, 400000, nb_scenarios)
+    colonnes['emprunt'] = colonnes['prix_achat'] * rng.uniform(0.5, 1.1, nb_scenarios)
+    colonnes['loyers_mensuels'] = colonnes['prix_achat'] * rng.uniform(0.004, 0.008, nb_scenarios)
+    colonnes['taux_credit'] = rng.uniform(0.0, 0.06, nb_scenarios)
+    colonnes['duree_credit'] = rng.integers(10, 31, nb_scenarios).astype(float)
+    colonnes['duree_projection'] = rng.integers(10, 31, nb_scenarios).astype(float)
+    for cle, valeur in fixes.items():
+        colonnes[cle] = np.full(nb_scenarios, valeur)
+    return pd.DataFrame(colonnes)
+
+
+def _params(scenarios, ligne):
+    """Dictionnaire params de la ligne d'une table de scénarios"""
+    params = scenarios.iloc[ligne].to_dict()
+    for cle in ('duree_credit', 'duree_projection', 'duree_amortissement'):
+        params[cle] = int(params[cle])
+    return params
+
+
+def _echeancier_reference(montant, taux_annuel, duree_annees):
+    """Échéancier de l'application d'origine : mensualité numpy_financial, puis un mois après l'autre"""
+    npf = pytest.importorskip('numpy_financial')
+    mensualite = npf.pmt(taux_annuel / 12, duree_annees * 12, -montant)
+    interets, capital, restants = [], [], []
+    reste_a_payer = montant
+    for _ in range(duree_annees * 12):
+        interet_mois = reste_a_payer * (taux_annuel / 12)
+        capital_mois = mensualite - interet_mois
+        reste_a_payer -= capital_mois
+        interets.append(interet_mois)
+        capital.append(capital_mois)
+        restants.append(max(0, reste_a_payer))
+    return mensualite, np.array(interets), np.array(capital), np.array(restants)
+
+
+@pytest.mark.parametrize('montant, taux_annuel, duree_annees', [
+    (215000, 0.025, 20), (100000, 0.0, 15), (350000, 0.0485, 25), (50000, 0.001, 5), (1000000, 0.12, 30),
+])
+def test_echeancier_identique_a_numpy_financial(montant, taux_annuel, duree_annees):
+    """Échéancier en formule fermée contre la boucle mensuelle d'origine, au centime près"""
+    mensualite, interets, capital, restants = _echeancier_reference(montant, taux_annuel, duree_annees)
+    echeancier = echeancier_pret(montant, taux_annuel, duree_annees)
+    assert echeancier.mensualite == pytest.approx(mensualite, abs=0.005)
+    np.testing.assert_allclose(echeancier.interets, interets, rtol=0, atol=0.005)
+    np.testing.assert_allclose(echeancier.capital, capital, rtol=0, atol=0.005)
+    np.testing.assert_allclose(echeancier.capital_restant, restants, rtol=0, atol=0.005)
+
+
+def test_duree_non_entiere_identique_dans_tous_les_moteurs():
+    """20,5 ans : 246 mensualités, par annuités constantes, échéancier général ou calcul par lot"""
+    params = dict(PARAMETRES, duree_credit=20.5, duree_projection=25)
+    simple = projeter(params)
+    generale = projeter(dict(params, taux_assurance=1e-15))
+    lot = simuler_lot(pd.DataFrame([params]), details=True)
+    assert simple.capital.sum() == pytest.approx(params['emprunt'])
+    mensualite = echeancier_pret(params['emprunt'], params['taux_credit'], 20.5).mensualite
+    assert simple.credit[20] == pytest.approx(6 * mensualite)
+    np.testing.assert_allclose(generale.cashflow, simple.cashflow, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(lot.projection.cashflow[0], simple.cashflow, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize('options', OPTIONS_PRET)
+def test_lot_identique_a_projeter(options):
+    """Calcul par lot, par blocs, contre projeter() scénario par scénario, pour chaque famille d'options"""
+    scenarios = _scenarios(40, **options)
+    lot = simuler_lot(scenarios, details=True, taille_bloc=16)
+    for ligne in range(len(scenarios)):
+        params = _params(scenarios, ligne)
+        projection = projeter(params)
+        horizon = params['duree_projection']
+        for attribut in ATTRIBUTS_COMPARES:
+            np.testing.assert_allclose(getattr(lot.projection, attribut)[ligne, :horizon],
+                                       getattr(projection, attribut), rtol=1e-9, atol=1e-6, err_msg=attribut)
+        assert lot.resume["Cashflow cumulé"].iloc[ligne] == pytest.approx(projection.cashflow_cumule[-1])
+
+
+def test_lot_options_differentes_par_scenario():
+    """Options différentes d'un scénario à l'autre dans un même lot (colonnes absentes : valeurs par défaut)"""
+    scenarios = pd.concat([_scenarios(5, graine=i, **options) for i, options in enumerate(OPTIONS_PRET)],
+                          ignore_index=True)
+    lot = simuler_lot(scenarios, details=True, taille_bloc=7)
+    for ligne in range(len(scenarios)):
+        params = {cle: valeur for cle, valeur in _params(scenarios, ligne).items()
+                  if not (isinstance(valeur, float) and np.isnan(valeur))}
+        projection = projeter(params)
+        np.testing.assert_allclose(lot.projection.cashflow[ligne, :params['duree_projection']],
+                                   projection.cashflow, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize('options', [{}, OPTIONS_PRET[1], OPTIONS_PRET[5]])
+def test_lot_multi_processus_identique_au_lot(options):
+    """executer_lot sur deux processus contre simuler_lot, à l'identique"""
+    scenarios = _scenarios(300, **options)
+    serie = simuler_lot(scenarios, details=True, taille_bloc=64)
+    parallele = executer_lot(scenarios, nb_workers=2, details=True, taille_bloc=64, seuil_parallele=0)
+    pd.testing.assert_frame_equal(parallele.resume, serie.resume)
+    for attribut in ATTRIBUTS_COMPARES:
+        np.testing.assert_array_equal(getattr(parallele.projection, attribut), getattr(serie.projection, attribut))
+
+
+@pytest.mark.parametrize('variation_taux', [None, Loi('normale', 0.0, 0.002)])
+def test_monte_carlo_multi_processus_identique_au_calcul_en_serie(variation_taux):
+    """executer_monte_carlo sur deux processus contre simuler_monte_carlo : mêmes graines, mêmes quantiles"""
+    config = ConfigMonteCarlo(
+        revalorisation_loyers=Loi('normale', 0.015, 0.01),
+        appreciation_immobilier=Loi('normale', 0.01, 0.03),
+        indexation_charges=Loi('triangulaire', 0.02, minimum=0.0, maximum=0.04),
+        vacance_locative=Loi('uniforme', minimum=0.0, maximum=0.1),
+        variation_taux=variation_taux, nb_chemins=5000, taille_bloc=1000, graine=42
+    )
+    serie = simuler_monte_carlo(PARAMETRES, config)
+    parallele = executer_monte_carlo(PARAMETRES, config, nb_workers=2, seuil_parallele=0)
+    for attribut in ('cashflow_cumule', 'valeur_nette', 'proba_cashflow_negatif'):
+        np.testing.assert_array_equal(getattr(parallele, attribut), getattr(serie, attribut))
+    assert parallele.proba_cashflow_cumule_negatif == serie.proba_cashflow_cumule_negatif
+
+
+@pytest.mark.parametrize('variable, indicateur, cible', [
+    ('loyers_mensuels', 'cashflow_annee_1', 0.0),
+    ('loyers_mensuels', 'rendement_fonds_propres_moyen', 5.0),
+    ('prix_achat', 'cashflow_minimal', 0.0),
+    ('taux_credit', 'cashflow_cumule', -80000.0),
+])
+@pytest.mark.parametrize('options', [{}, OPTIONS_PRET[1], OPTIONS_PRET[3]])
+def test_objectif_retrouve_par_projeter(variable, indicateur, cible, options):
+    """La valeur trouvée, reportée dans params, redonne l'indicateur et la cible par projeter()"""
+    params = dict(PARAMETRES, **options)
+    resultat = resoudre_objectif(params, variable, indicateur, cible=cible)
+    assert resultat.statuts[0] == STATUT_ATTEINT
+    solution = dict(params, **{variable: float(resultat.valeurs[0])})
+    if variable == 'prix_achat':
+        solution['emprunt'] = params['emprunt'] + solution['prix_achat'] - params['prix_achat']
+    projection = projeter(solution)
+    valeurs = {
+        'cashflow_annee_1': projection.cashflow[0],
+        'rendement_fonds_propres_moyen': projection.rendement_fonds_propres.mean(),
+        'cashflow_minimal': projection.cashflow.min(),
+        'cashflow_cumule': projection.cashflow_cumule[-1],
+    }
+    assert valeurs[indicateur] == pytest.approx(resultat.indicateurs[0], rel=1e-9, abs=1e-6)
+    assert valeurs[indicateur] == pytest.approx(cible, abs=max(1.0, abs(cible) * 1e-3))
+
+
+def test_portefeuille_d_un_lot_identique_a_projeter():
+    """Un portefeuille d'un seul lot, acquis l'année 1, redonne la projection du bien"""
+    societe = {'duree_projection': PARAMETRES['duree_projection'], 'frais_comptable': PARAMETRES['frais_comptable'],
+               'indexation_charges': PARAMETRES['indexation_charges']}
+    for options in OPTIONS_PRET:
+        params = dict(PARAMETRES, **options)
+        lots = pd.DataFrame([{cle: valeur for cle, valeur in params.items()
+                              if cle not in ('frais_comptable', 'frais_notaire', 'duree_projection')}])
+        societe_projetee = projeter_portefeuille(lots, societe).societe
+        projection = projeter(params)
+        for attribut in ATTRIBUTS_COMPARES:
+            np.testing.assert_allclose(getattr(societe_projetee, attribut), getattr(projection, attribut),
+                                       rtol=1e-9, atol=1e-6, err_msg=f"{attribut} {options}")
+
+
+def test_tri_identique_a_numpy_financial():
+    """TRI vectorisé contre numpy_financial.irr sur des flux à racine unique"""
+    npf = pytest.importorskip('numpy_financial')
+    rng = np.random.default_rng(7)
+    # Un apport puis des flux positifs : une seule racine
+    flux = np.column_stack([-rng.uniform(10000, 100000, 200), rng.uniform(0, 20000, (200, 25))])
+    tri = taux_rendement_interne(flux)
+    reference = np.array([npf.irr(ligne) for ligne in flux])
+    np.testing.assert_allclose(tri, reference, rtol=1e-8, atol=1e-10)